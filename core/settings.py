@@ -52,6 +52,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'course.instrumentation.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,6 +75,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'social_django.context_processors.backends',
                 'django.contrib.messages.context_processors.messages',
+                'course.context_processors.cache_versions',
             ],
         },
     },
@@ -174,22 +176,114 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
-    )
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'course.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
 }
+API_MAX_PAGE_SIZE = 100
+# Most operations accepted by one modules/lessons batch request.
+BATCH_MAX_OPERATIONS = 500
+COURSE_COMMENTS_PAGE_SIZE = 10
 
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        'BACKEND': 'course.cache_backends.FallbackRedisCache',
         'LOCATION': 'redis://127.0.0.1:6379/1', 
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'SOCKET_CONNECT_TIMEOUT': 0.5,
+            'SOCKET_TIMEOUT': 0.5,
         }
     }
 }
 
+# How long to stay on the local-memory fallback before trying Redis again.
+CACHE_FALLBACK_RETRY_SECONDS = 30
+PAGE_CACHE_TIMEOUT = 300
+
+# Seconds to coalesce stale-course recomputes before they run in the background.
+# 0 recomputes synchronously once the marking transaction commits.
+COURSE_AGGREGATE_RECOMPUTE_DELAY = 2.0
+
+# Lesson uploads are probed for their duration by a small local worker pool.
+VIDEO_PROBE_WORKERS = 2
+VIDEO_PROBE_QUEUE_SIZE = 50
+VIDEO_PROBE_TIMEOUT = 30
+
+# Cold-start budget for `manage.py bench_startup`, and modules (with their
+# submodules) that must stay off the startup path; they are imported
+# lazily where needed. The bare `drf_yasg` package is loaded through
+# INSTALLED_APPS and is empty; its schema machinery is what is heavy.
+STARTUP_TIME_BUDGET_MS = 1500
+STARTUP_FORBIDDEN_MODULES = [
+    'moviepy', 'numpy', 'imageio', 'imageio_ffmpeg',
+    'drf_yasg.views', 'drf_yasg.generators', 'drf_yasg.inspectors',
+]
+
+# HLS ladder built by `manage.py package_hls` (bitrates in kbit/s).
+HLS_LADDER = [
+    {'name': '360p', 'height': 360, 'video_bitrate': 800, 'audio_bitrate': 96},
+    {'name': '720p', 'height': 720, 'video_bitrate': 2800, 'audio_bitrate': 128},
+    {'name': '1080p', 'height': 1080, 'video_bitrate': 5000, 'audio_bitrate': 192},
+]
+HLS_SEGMENT_SECONDS = 6
+HLS_WORKERS = 2
+HLS_TIMEOUT = 3600
+
+# Resized WebP/AVIF copies of uploaded images, kept in an LRU disk cache.
+IMAGE_PRESETS = {
+    'card': [320, 480, 640, 960],
+    'tile': [240, 360, 480],
+}
+IMAGE_SOURCE_DIRS = ('images/', 'category_images/', 'teachers/')
+IMAGE_CACHE_ROOT = os.path.join(MEDIA_ROOT, 'cache')
+IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Bayesian prior for the course leaderboard score.
+LEADERBOARD_PRIOR_MEAN = 3.5
+LEADERBOARD_PRIOR_WEIGHT = 5
+LEADERBOARD_MAX_LIMIT = 50
+
+# Full-text course search (`course.search`). The Postgres text search
+# config; 'simple' does no stemming, so Uzbek and English match alike.
+SEARCH_CONFIG = 'simple'
+SEARCH_MAX_RESULTS = 50
+
+# Search-as-you-type prefix index (`course.autocomplete`), held in each
+# process and checked against the cache versions at most this often.
+AUTOCOMPLETE_REFRESH_SECONDS = 5
+AUTOCOMPLETE_MAX_RESULTS = 10
+
+# Request instrumentation (Server-Timing header + JSON lines on "course.perf")
+PERF_INSTRUMENTATION = True
+PERF_SAMPLE_RATE = 0.1
+PERF_MIN_SAMPLE_RATE = 0.001
+PERF_OVERHEAD_BUDGET = 0.02  # fraction of sampled wall time
+PERF_SERVER_TIMING_HEADER = True
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'course.perf': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'azimjonovislomjon77@gmail.com'
-EMAIL_HOST_PASSWORD = 'ayci qbmm jcin teap'
\ No newline at end of file
+EMAIL_HOST_PASSWORD = 'ayci qbmm jcin teap'
+
+# Emails are queued in users.OutgoingEmail and sent by a background
+# sender (see users/outbox.py), one backend connection per batch.
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+# Backoff after the first failure, doubled after each further one.
+EMAIL_OUTBOX_RETRY_SECONDS = 30
+EMAIL_OUTBOX_POLL_SECONDS = 30
+EMAIL_OUTBOX_STUCK_SECONDS = 300
\ No newline at end of file
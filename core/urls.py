@@ -14,27 +14,41 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from functools import cache
+
 from django.contrib import admin
 from django.urls import include, path
-from django.conf.urls.static import static
-from core import settings
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Exam7 API",
-      default_version='v1',
-      description="API documentation for Exam7 project",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@exam7.com"),
-      license=openapi.License(name="MIT License"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
+
+from course.streaming import public_media_urlpatterns
+
+
+@cache
+def get_docs_view(renderer):
+    # drf_yasg pulls in a large inspector/codec stack; build the schema view
+    # on the first docs request instead of in every worker at startup.
+    from drf_yasg.views import get_schema_view
+    from drf_yasg import openapi
+
+    schema_view = get_schema_view(
+       openapi.Info(
+          title="Exam7 API",
+          default_version='v1',
+          description="API documentation for Exam7 project",
+          terms_of_service="https://www.google.com/policies/terms/",
+          contact=openapi.Contact(email="contact@exam7.com"),
+          license=openapi.License(name="MIT License"),
+       ),
+       public=True,
+       permission_classes=(permissions.AllowAny,),
+    )
+    return schema_view.with_ui(renderer, cache_timeout=0)
+
+
+def docs_view(request, renderer):
+    return get_docs_view(renderer)(request)
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -43,10 +57,10 @@ urlpatterns = [
     path('social-auth/', include('social_django.urls', namespace='social')),
 
     # Swagger Docs
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='swagger-docs'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='redoc-docs'),
+    path('swagger/', docs_view, {'renderer': 'swagger'}, name='swagger-docs'),
+    path('redoc/', docs_view, {'renderer': 'redoc'}, name='redoc-docs'),
 
     # Token auth
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+] + public_media_urlpatterns()
\ No newline at end of file
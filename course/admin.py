@@ -1,6 +1,7 @@
 from django.contrib import admin
-from django.db import models
-from .models import Course, Teachers, Category, Module, Lesson, CourseView, Comment
+from . import search
+from .aggregates import mark_stale
+from .models import Course, Teachers, Category, Module, Lesson, CourseView, Comment, VideoProbeJob
 
 
 
@@ -11,7 +12,13 @@ class CourseAdmin(admin.ModelAdmin):
     ordering = ('-rating',)
     prepopulated_fields = {'slug': ('title',)}
 
-    readonly_fields = ('duration', 'lesson_count', 'module_count', 'students_count') 
+    readonly_fields = ('students_count', *Course.AGGREGATE_FIELDS)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        ids = list(search.search(search_term, limit=1000).values_list('pk', flat=True))
+        return queryset.filter(pk__in=ids), False
 
     fieldsets = (
         (None, {
@@ -35,7 +42,7 @@ class TeacherAdmin(admin.ModelAdmin):
 class CourseInline(admin.TabularInline):
     model = Course
     extra = 0
-    readonly_fields = ('duration', 'lesson_count', 'module_count', 'students_count')
+    readonly_fields = Course.AGGREGATE_FIELDS
 
 
 @admin.register(Category)
@@ -58,6 +65,11 @@ class ModuleAdmin(admin.ModelAdmin):
     list_display = ('title', 'course')
     inlines = [LessonInline]
 
+    def delete_queryset(self, request, queryset):
+        course_ids = set(queryset.values_list('course_id', flat=True))
+        super().delete_queryset(request, queryset)
+        mark_stale(course_ids)
+
 
 
 @admin.register(Lesson)
@@ -65,23 +77,10 @@ class LessonAdmin(admin.ModelAdmin):
     list_display = ('title', 'module', 'duration')
     readonly_fields = ('duration',)
 
-    def save_model(self, request, obj, form, change):
-        super().save_model(request, obj, form, change)
-
-        course = obj.module.course
-
-        total_duration = sum(
-            (lesson.duration for module in course.modules.all() for lesson in module.lessons.all() if lesson.duration),
-            models.DurationField().to_python("0:0:0")
-        )
-
-        lesson_count = sum(module.lessons.count() for module in course.modules.all())
-        module_count = course.modules.count()
-
-        course.duration = total_duration
-        course.lesson_count = lesson_count
-        course.module_count = module_count
-        course.save(update_fields=['duration', 'lesson_count', 'module_count', 'students_count'])
+    def delete_queryset(self, request, queryset):
+        course_ids = set(queryset.values_list('module__course_id', flat=True))
+        super().delete_queryset(request, queryset)
+        mark_stale(course_ids)
 
 
 @admin.register(CourseView)
@@ -96,4 +95,11 @@ class CourseViewAdmin(admin.ModelAdmin):
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('user', 'course', 'rating', 'created_at')
     list_filter = ('rating', 'created_at')
-    search_fields = ('user__username', 'course__title', 'text')
\ No newline at end of file
+    search_fields = ('user__username', 'course__title', 'text')
+
+
+@admin.register(VideoProbeJob)
+class VideoProbeJobAdmin(admin.ModelAdmin):
+    list_display = ('lesson', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('lesson', 'attempts', 'error', 'created_at', 'started_at', 'finished_at')
@@ -0,0 +1,80 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import Course
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = set()
+_timer = None
+
+
+def mark_stale(course_ids):
+    """Flag courses whose stored aggregates can no longer be patched with a
+    delta (bulk deletes from the admin) and queue a recompute.
+
+    Several writes to the same course inside the debounce window collapse
+    into a single UPDATE.
+    """
+    course_ids = {pk for pk in course_ids if pk is not None}
+    if not course_ids:
+        return
+    Course.objects.filter(pk__in=course_ids).update(aggregates_stale=True)
+    transaction.on_commit(lambda: _schedule(course_ids))
+
+
+def recompute_stale(course_ids):
+    """Recompute the courses among ``course_ids`` that are still flagged.
+
+    The rows are locked first, so a concurrent ``Course.apply_delta``
+    either committed before the recompute reads the totals or waits and
+    lands on top of them. The UPDATE itself only touches flagged rows and
+    clears the flag in the same statement.
+    """
+    with transaction.atomic():
+        stale = list(
+            Course.objects.select_for_update()
+            .filter(pk__in=course_ids, aggregates_stale=True)
+            .values_list('pk', flat=True)
+        )
+        if not stale:
+            return 0
+        return Course.recompute(pk__in=stale, aggregates_stale=True)
+
+
+def _schedule(course_ids):
+    global _timer
+    delay = getattr(settings, 'COURSE_AGGREGATE_RECOMPUTE_DELAY', 2.0)
+    if not delay:
+        recompute_stale(course_ids)
+        return
+
+    with _lock:
+        _pending.update(course_ids)
+        if _timer is None:
+            _timer = threading.Timer(delay, _flush)
+            _timer.daemon = True
+            _timer.start()
+
+
+def _flush():
+    global _timer
+    with _lock:
+        course_ids = set(_pending)
+        _pending.clear()
+        _timer = None
+    if not course_ids:
+        return
+
+    close_old_connections()
+    try:
+        recompute_stale(course_ids)
+    except Exception:
+        # The rows stay flagged, so `manage.py recompute_courses` picks them up.
+        logger.exception("Course aggregate recompute failed for %s", sorted(course_ids))
+    finally:
+        close_old_connections()
@@ -0,0 +1,173 @@
+"""Per-process prefix index over course and category titles for
+search-as-you-type.
+
+Every word of every title is kept in one sorted array, so a lookup is a
+bisect per query word plus a set intersection and never touches the
+database.
+The index is loaded with a single query on first use. After that, at
+most every ``AUTOCOMPLETE_REFRESH_SECONDS`` it compares the cache
+versions of the ``course`` and ``category`` namespaces and, for the kind
+whose version moved, reads only the rows updated since the last load.
+One thread builds the new snapshot while lookups keep using the old one.
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, FloatField, Value
+
+from .caching import get_versions
+from .search import TOKEN_RE
+
+KINDS = ('course', 'category')
+
+Entry = namedtuple('Entry', 'kind pk title slug score words')
+
+# Uzbek Latin spells o', g' and the glottal stop with any of these; drop
+# them so "ma'lumot", "maʼlumot" and "malumot" all index alike.
+APOSTROPHES = dict.fromkeys(map(ord, "'`\u2018\u2019\u02bb\u02bc"))
+
+# Rows updated this long before the watermark are read again, so a
+# transaction that committed late is not skipped.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text.casefold().translate(APOSTROPHES))
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def words(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.entries = {kind: {} for kind in KINDS}
+        # Latest updated_at read per kind.
+        self.watermarks = dict.fromkeys(KINDS)
+        # (entries best first, sorted words, rank of each word's entry),
+        # swapped in whole so lookups never need the lock.
+        self.snapshot = None
+        self.versions = None
+        self.checked = 0.0
+
+    def lookup(self, query, limit=None):
+        limit = limit or settings.AUTOCOMPLETE_MAX_RESULTS
+        terms = words(query)
+        if not terms:
+            return []
+        self.refresh()
+        ranked, keys, ranks = self.snapshot
+
+        # Each term is a slice of the sorted words; an entry matches when
+        # every term's slice holds one of its words.
+        matches = None
+        for term in sorted(set(terms), key=len, reverse=True):
+            start, end = bisect_left(keys, term), bisect_left(keys, term + '\uffff')
+            found = set(ranks[start:end])
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        return [ranked[rank] for rank in heapq.nsmallest(limit, matches)]
+
+    def fresh(self):
+        return self.snapshot is not None and time.monotonic() - self.checked < settings.AUTOCOMPLETE_REFRESH_SECONDS
+
+    def refresh(self):
+        if self.fresh():
+            return
+        # One thread rebuilds while the others keep serving the current
+        # snapshot; only the very first load makes lookups wait.
+        if not self.lock.acquire(blocking=self.snapshot is None):
+            return
+        try:
+            if self.fresh():
+                return
+            # Read the versions before the rows: a write that lands in
+            # between is picked up by the next refresh.
+            versions = get_versions(*KINDS)
+            if self.versions is None:
+                self.load(*KINDS)
+            else:
+                changed = [kind for kind in KINDS if versions[kind] != self.versions[kind]]
+                if changed:
+                    self.load(*changed, incremental=True)
+            self.versions = versions
+            self.checked = time.monotonic()
+        finally:
+            self.lock.release()
+
+    def load(self, *kinds, incremental=False):
+        entries = {kind: dict(self.entries[kind]) if incremental or kind not in kinds else {} for kind in KINDS}
+        watermarks = dict(self.watermarks)
+        self.read(entries, watermarks, kinds, incremental)
+        if incremental:
+            # Deleted rows never show up as updated: a kind whose row count
+            # no longer matches is read again in full.
+            counts = self.counts(kinds)
+            stale = [kind for kind in kinds if counts.get(kind, 0) != len(entries[kind])]
+            if stale:
+                entries.update((kind, {}) for kind in stale)
+                self.read(entries, watermarks, stale, incremental=False)
+
+        # Categories first, then courses by leaderboard score.
+        ranked = sorted(
+            (entry for by_pk in entries.values() for entry in by_pk.values()),
+            key=lambda entry: (entry.kind != 'category', -entry.score, entry.title),
+        )
+        pairs = sorted((word, rank) for rank, entry in enumerate(ranked) for word in entry.words)
+        self.entries, self.watermarks = entries, watermarks
+        self.snapshot = (ranked, [word for word, _ in pairs], [rank for _, rank in pairs])
+
+    def read(self, entries, watermarks, kinds, incremental):
+        from .models import Category, Course
+
+        querysets = {
+            'course': Course.objects.annotate(kind=Value('course')).values_list(
+                'kind', 'pk', 'title', 'slug', 'score', 'updated_at',
+            ),
+            'category': Category.objects.annotate(kind=Value('category'), score=Value(0.0, FloatField())).values_list(
+                'kind', 'pk', 'name', 'slug', 'score', 'updated_at',
+            ),
+        }
+        selected = []
+        for kind in kinds:
+            queryset = querysets[kind].order_by()
+            if incremental and watermarks[kind] is not None:
+                queryset = queryset.filter(updated_at__gte=watermarks[kind] - WATERMARK_OVERLAP)
+            selected.append(queryset)
+        queryset, *rest = selected
+        if rest:
+            queryset = queryset.union(*rest, all=True)
+
+        for kind, pk, title, slug, score, updated_at in queryset:
+            entries[kind][pk] = Entry(kind, pk, title, slug, score, tuple(dict.fromkeys(words(title))))
+            if watermarks[kind] is None or updated_at > watermarks[kind]:
+                watermarks[kind] = updated_at
+
+    @staticmethod
+    def counts(kinds):
+        from .models import Category, Course
+
+        models = {'course': Course, 'category': Category}
+        queryset, *rest = (
+            models[kind].objects.annotate(kind=Value(kind)).values('kind').annotate(n=Count('pk')).values_list('kind', 'n')
+            .order_by()
+            for kind in kinds
+        )
+        if rest:
+            queryset = queryset.union(*rest, all=True)
+        return dict(queryset)
+
+
+index = PrefixIndex()
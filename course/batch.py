@@ -0,0 +1,248 @@
+"""Create, update, reorder and delete many modules or lessons at once.
+
+Every operation is validated before anything is written. The related rows
+an operation points at are fetched once for the whole batch. Writes are
+bulk queries, and each affected course gets a single ``Course.recompute``
+at the end. Call ``validate()`` and ``save()`` inside one transaction: the
+target and parent rows are locked while they are read, so nothing can move
+or delete them between the checks and the writes.
+"""
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from rest_framework import serializers
+
+from . import search
+from .models import Course, Lesson, Module, VideoProbeJob
+
+OPERATIONS = ('create', 'update', 'reorder', 'delete')
+
+
+def as_pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class BatchRelatedField(serializers.PrimaryKeyRelatedField):
+    """Resolves the pk from the rows the batch prefetched instead of running
+    one query per operation."""
+
+    def to_internal_value(self, data):
+        obj = self.context['related'].get(as_pk(data))
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
+
+class BatchModuleSerializer(serializers.ModelSerializer):
+    course = BatchRelatedField(queryset=Course.objects.all())
+
+    class Meta:
+        model = Module
+        fields = ['course', 'title', 'position']
+
+
+class BatchLessonSerializer(serializers.ModelSerializer):
+    module = BatchRelatedField(queryset=Module.objects.all())
+    # Batches are JSON, so videos are referenced by their storage name
+    # (uploaded beforehand) rather than sent inline.
+    video = serializers.CharField(max_length=100)
+
+    class Meta:
+        model = Lesson
+        fields = ['module', 'title', 'video', 'duration', 'position']
+
+    def validate_video(self, value):
+        if not default_storage.exists(value):
+            raise serializers.ValidationError("Fayl topilmadi.")
+        return value
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    operations = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_operations(self, value):
+        limit = settings.BATCH_MAX_OPERATIONS
+        if len(value) > limit:
+            raise serializers.ValidationError(f"Bir so'rovda {limit} tadan ortiq amal bo'lishi mumkin emas.")
+        return value
+
+
+class BatchWriter:
+    model = None
+    serializer_class = None
+    parent_field = None
+    parent_model = None
+
+    def __init__(self, operations):
+        self.operations = operations
+        self.results = [{'index': i, 'op': op.get('op')} for i, op in enumerate(operations)]
+        self.creates, self.updates, self.reorders, self.deletes = [], [], [], []
+        self.update_fields = set()
+
+    def targets(self, ids):
+        return self.model.objects.select_for_update().in_bulk(ids)
+
+    def course_id(self, obj):
+        raise NotImplementedError
+
+    def validate(self):
+        """Return True when every operation is valid; nothing is written."""
+        ids, parent_ids = set(), set()
+        for op in self.operations:
+            listed = op.get('ids') if isinstance(op.get('ids'), list) else []
+            ids.update(pk for pk in map(as_pk, [op.get('id'), *listed]) if pk is not None)
+            data = op.get('data')
+            if isinstance(data, dict):
+                parent_ids.add(as_pk(data.get(self.parent_field)))
+        self.existing = self.targets(ids)
+        related = self.parent_model.objects.select_for_update().in_bulk(parent_ids - {None})
+        # Course ids before the batch, so rows moved away still refresh
+        # the course they left.
+        self.affected = {self.course_id(obj) for obj in self.existing.values()}
+
+        claimed = set()
+        for op, result in zip(self.operations, self.results):
+            errors = self.validate_operation(op, related, claimed)
+            if errors:
+                result.update(status='error', errors=errors)
+        valid = not any('errors' in result for result in self.results)
+        if not valid:
+            for result in self.results:
+                result.setdefault('status', 'skipped')
+        return valid
+
+    def validate_operation(self, op, related, claimed):
+        kind = op.get('op')
+        if kind not in OPERATIONS:
+            return {'op': [f"Quyidagilardan biri bo'lishi kerak: {', '.join(OPERATIONS)}."]}
+
+        if kind == 'reorder':
+            ids = op.get('ids')
+            if not isinstance(ids, list) or not ids:
+                return {'ids': ["Bo'sh bo'lmagan ro'yxat bo'lishi kerak."]}
+            pks = [as_pk(pk) for pk in ids]
+            errors = self.claim(pks, claimed)
+            if not errors:
+                self.reorders.append(pks)
+            return errors
+
+        if kind == 'create':
+            instance = None
+        else:
+            pk = as_pk(op.get('id'))
+            errors = self.claim([pk], claimed)
+            if errors:
+                return errors
+            instance = self.existing[pk]
+            if kind == 'delete':
+                self.deletes.append(pk)
+                return None
+
+        serializer = self.serializer_class(
+            instance, data=op.get('data') or {}, partial=instance is not None, context={'related': related},
+        )
+        if not serializer.is_valid():
+            return serializer.errors
+        if instance is None:
+            self.creates.append(self.model(**serializer.validated_data))
+        else:
+            self.update_fields.update(self.apply(instance, serializer.validated_data))
+            self.updates.append(instance)
+        return None
+
+    def apply(self, instance, data):
+        for field, value in data.items():
+            setattr(instance, field, value)
+        return data.keys()
+
+    def claim(self, pks, claimed):
+        # An object may appear in one operation per batch, so the outcome
+        # never depends on the order operations are applied in.
+        missing = [pk for pk in pks if pk not in self.existing]
+        if missing:
+            return {'id': [f"Topilmadi: {', '.join(map(str, missing))}."]}
+        if len(set(pks)) != len(pks) or claimed.intersection(pks):
+            return {'id': ["Bir obyekt bitta so'rovda faqat bir marta ishlatilishi mumkin."]}
+        claimed.update(pks)
+        return None
+
+    @transaction.atomic(savepoint=False)
+    def save(self):
+        created = self.model.objects.bulk_create(self.creates)
+        if self.updates:
+            self.model.objects.bulk_update(self.updates, sorted(self.update_fields))
+        moved = [
+            self.model(pk=pk, position=position)
+            for pks in self.reorders for position, pk in enumerate(pks)
+        ]
+        if moved:
+            self.model.objects.bulk_update(moved, ['position'])
+        if self.deletes:
+            self.model.objects.filter(pk__in=self.deletes).delete()
+
+        self.affected.update(self.course_id(obj) for obj in [*created, *self.updates])
+        Course.recompute(pk__in=self.affected)
+        search.schedule(course_ids=self.affected)
+        self.after_save(created)
+
+        ids = iter(obj.pk for obj in created)
+        statuses = {'create': 'created', 'update': 'updated', 'reorder': 'reordered', 'delete': 'deleted'}
+        for op, result in zip(self.operations, self.results):
+            result['status'] = statuses[op['op']]
+            if op['op'] == 'create':
+                result['id'] = next(ids)
+            elif op['op'] != 'reorder':
+                result['id'] = as_pk(op['id'])
+        return self.results
+
+    def after_save(self, created):
+        pass
+
+
+class ModuleBatchWriter(BatchWriter):
+    model = Module
+    serializer_class = BatchModuleSerializer
+    parent_field = 'course'
+    parent_model = Course
+
+    def course_id(self, module):
+        return module.course_id
+
+
+class LessonBatchWriter(BatchWriter):
+    model = Lesson
+    serializer_class = BatchLessonSerializer
+    parent_field = 'module'
+    parent_model = Module
+
+    def __init__(self, operations):
+        super().__init__(operations)
+        self.new_videos = []
+
+    def targets(self, ids):
+        return self.model.objects.select_related('module').select_for_update(of=('self',)).in_bulk(ids)
+
+    def course_id(self, lesson):
+        return lesson.module.course_id
+
+    def apply(self, instance, data):
+        fields = set(super().apply(instance, data))
+        if 'video' in data and 'duration' not in data:
+            # A new video, as in Lesson.save(): the background probe fills
+            # the duration in and `manage.py package_hls` rebuilds the ladder.
+            instance.duration = None
+            instance.hls_playlist = ''
+            instance.hls_renditions = []
+            fields.update(['duration', 'hls_playlist', 'hls_renditions'])
+            self.new_videos.append(instance)
+        return fields
+
+    def after_save(self, created):
+        # Only new videos: an unrelated edit of a lesson still being probed
+        # must not queue a second probe of the same file.
+        probe = [lesson for lesson in created if lesson.duration is None] + self.new_videos
+        if probe:
+            VideoProbeJob.enqueue_many(probe)
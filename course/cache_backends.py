@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache.backends.base import BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django_redis.cache import RedisCache
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+from .instrumentation import record_cache
+
+logger = logging.getLogger(__name__)
+
+REDIS_ERRORS = (ConnectionInterrupted, RedisConnectionError, RedisTimeoutError)
+MISSING = object()
+
+
+class CacheStats:
+    """Per-process hit/miss counters keyed by the part of a cache key
+    before the first ``:``; ``{% cache %}`` fragments are grouped by name."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def record(self, key, hit):
+        prefix = str(key).split(':', 1)[0]
+        if prefix.startswith('template.cache.'):
+            prefix = prefix.rsplit('.', 1)[0]
+        with self.lock:
+            (self.hits if hit else self.misses)[prefix] += 1
+        record_cache(hit)
+
+    def snapshot(self):
+        with self.lock:
+            prefixes = sorted(set(self.hits) | set(self.misses))
+            return {
+                prefix: {'hits': self.hits[prefix], 'misses': self.misses[prefix]}
+                for prefix in prefixes
+            }
+
+
+stats = CacheStats()
+
+
+class FallbackRedisCache(RedisCache):
+    """django-redis backend that degrades to a per-process LocMemCache when
+    Redis is unreachable, and retries Redis after CACHE_FALLBACK_RETRY_SECONDS.
+
+    Version bumps made during an outage only reach local memory, so the
+    first retry bumps every namespace in Redis before serving from it.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self.fallback = LocMemCache(f'fallback:{server}', {'TIMEOUT': params.get('TIMEOUT', 300)})
+        self.redis_down_until = 0.0
+        self.degraded = False
+
+    def _call(self, method, *args, **kwargs):
+        if self.redis_available():
+            try:
+                return getattr(RedisCache, method)(self, *args, **kwargs)
+            except REDIS_ERRORS as e:
+                logger.warning("Redis cache unavailable, using local memory: %s", e)
+                self.degraded = True
+                self.redis_down_until = time.monotonic() + settings.CACHE_FALLBACK_RETRY_SECONDS
+        return getattr(self.fallback, method)(*args, **kwargs)
+
+    def redis_available(self):
+        if time.monotonic() < self.redis_down_until:
+            return False
+        if self.degraded:
+            from .caching import bump_all
+
+            # Goes through _call again; a failure marks Redis down anew.
+            self.degraded = False
+            bump_all()
+            if not self.degraded:
+                self.fallback.clear()
+        return time.monotonic() >= self.redis_down_until
+
+    def get(self, key, default=None, version=None, **kwargs):
+        value = self._call('get', key, MISSING, version=version)
+        stats.record(key, value is not MISSING)
+        return default if value is MISSING else value
+
+    def get_many(self, keys, version=None, **kwargs):
+        values = self._call('get_many', keys, version=version)
+        for key in keys:
+            stats.record(key, key in values)
+        return values
+
+    get_or_set = BaseCache.get_or_set
+
+    def set(self, *args, **kwargs):
+        return self._call('set', *args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        return self._call('add', *args, **kwargs)
+
+    def set_many(self, *args, **kwargs):
+        return self._call('set_many', *args, **kwargs)
+
+    def touch(self, *args, **kwargs):
+        return self._call('touch', *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._call('delete', *args, **kwargs)
+
+    def delete_many(self, *args, **kwargs):
+        return self._call('delete_many', *args, **kwargs)
+
+    def has_key(self, *args, **kwargs):
+        return self._call('has_key', *args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        return self._call('incr', *args, **kwargs)
+
+    def decr(self, *args, **kwargs):
+        return self._call('decr', *args, **kwargs)
+
+    def clear(self):
+        return self._call('clear')
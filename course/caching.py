@@ -0,0 +1,168 @@
+"""Version-keyed caching for catalog pages and template fragments.
+
+Each namespace has a counter in the cache that is bumped whenever one of
+its rows changes. Cache keys embed the counters they depend on, so a bump
+makes every dependent entry unreachable without having to find and delete
+it; the old entries simply expire.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+NAMESPACES = ('course', 'category', 'comment', 'teacher')
+# Enrollments only move the student counters, so they are left out of
+# the page cache keys (a purchase would flush every page) but still feed
+# the conditional-GET validators.
+ENROLLMENT = 'enrollment'
+# Part of every per-course key. Bumped when per-course counters may have
+# missed writes: after a cache outage or a recompute over arbitrary rows.
+EPOCH = 'epoch'
+
+
+def version_key(namespace):
+    return f'version:{namespace}'
+
+
+def modified_key(namespace):
+    return f'modified:{namespace}'
+
+
+def course_namespace(pk):
+    """Counter for content built from a single course, its modules and
+    lessons, so a write to one course leaves the others cached."""
+    return f'course:{pk}'
+
+
+def get_versions(*namespaces):
+    keys = {version_key(ns): ns for ns in namespaces}
+    found = cache.get_many(list(keys))
+    versions = {}
+    for key, namespace in keys.items():
+        if key not in found:
+            # Seed from the clock so a counter lost to eviction or a Redis
+            # restart never comes back with a value that was used before.
+            cache.add(key, time.time_ns() // 1000, timeout=None)
+            found[key] = cache.get(key)
+        versions[namespace] = found[key]
+    return versions
+
+
+def bump(*namespaces):
+    for namespace in namespaces:
+        key = version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns() // 1000, timeout=None)
+    now = time.time()
+    cache.set_many({modified_key(namespace): now for namespace in namespaces}, timeout=None)
+
+
+def bump_all():
+    """Invalidate everything keyed on a version, e.g. after bumps were lost."""
+    bump(*NAMESPACES, ENROLLMENT, EPOCH)
+
+
+def fingerprint(*namespaces, extra=''):
+    """Return ``(etag, last_modified)`` for content built from
+    ``namespaces`` in one cache round trip and without touching the
+    database. ``extra`` is whatever else the content varies on."""
+    keys = [modified_key(ns) for ns in namespaces]
+    found = cache.get_many([*map(version_key, namespaces), *keys])
+    if any(version_key(ns) not in found for ns in namespaces):
+        found.update((version_key(ns), version) for ns, version in get_versions(*namespaces).items())
+    for key in keys:
+        if key not in found:
+            # Unknown (never bumped or evicted): claiming "now" can only
+            # cost a refetch, never a stale 304.
+            cache.add(key, time.time(), timeout=None)
+            found[key] = cache.get(key, time.time())
+
+    versions = ':'.join(str(found[version_key(ns)]) for ns in namespaces)
+    etag = hashlib.md5(f'{versions}:{extra}'.encode()).hexdigest()
+    return etag, max(found[key] for key in keys)
+
+
+def bump_on_commit(*namespaces):
+    transaction.on_commit(lambda: bump(*namespaces))
+
+
+class CacheVersions:
+    """Lazy ``{{ cache_versions.course }}`` lookup for ``{% cache %}`` tags;
+    reads every counter in one round trip on first use."""
+
+    def __init__(self):
+        self.versions = None
+
+    def __getitem__(self, namespace):
+        if self.versions is None:
+            self.versions = get_versions(*NAMESPACES)
+        return self.versions[namespace]
+
+
+class ConditionalGetMixin:
+    """Answer ``If-None-Match``/``If-Modified-Since`` with a 304 from the
+    cache versions alone, before the view body or serializer runs."""
+    conditional_namespaces = NAMESPACES + (ENROLLMENT,)
+    # Template pages show who is logged in; API payloads do not.
+    conditional_per_user = True
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not self.conditional_namespaces:
+            return super().dispatch(request, *args, **kwargs)
+        user = ''
+        if self.conditional_per_user:
+            # Pending flash messages are only shown by a full render.
+            if len(get_messages(request)):
+                return super().dispatch(request, *args, **kwargs)
+            user = request.user.pk if request.user.is_authenticated else ''
+
+        extra = f"{request.get_full_path()}:{request.headers.get('Accept', '')}:{user}"
+        etag, last_modified = fingerprint(*self.conditional_namespaces, extra=extra)
+        # Weak: CSRF tokens make two renders of the same page differ in bytes.
+        etag = f'W/{quote_etag(etag)}'
+        response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+        # Always revalidate; the validators make that nearly free.
+        patch_cache_control(response, no_cache=True, **({'private': True} if user else {}))
+        return response
+
+
+class CachedPageMixin:
+    """Serve whole rendered pages to anonymous visitors from the cache."""
+    page_cache_namespaces = NAMESPACES
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+
+        versions = get_versions(*self.page_cache_namespaces)
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        key = f"page:{path}:" + ':'.join(str(versions[ns]) for ns in self.page_cache_namespaces)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            def store(response):
+                cache.set(key, (response.content, response['Content-Type']), settings.PAGE_CACHE_TIMEOUT)
+
+            if hasattr(response, 'add_post_render_callback') and not response.is_rendered:
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+        return response
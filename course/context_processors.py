@@ -0,0 +1,5 @@
+from .caching import CacheVersions
+
+
+def cache_versions(request):
+    return {'cache_versions': CacheVersions()}
@@ -0,0 +1,36 @@
+"""``?fields=`` / ``?exclude=`` sparse fieldsets for the read API.
+
+The serializer drops the fields that were not asked for; the view's
+queryset optimizer then loads only the columns the rest read.
+"""
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def requested_fields(request):
+    """Return ``(fields, exclude)`` from the query string; ``fields`` is
+    None when every field is wanted."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None, set()
+
+    def names(param):
+        value = request.query_params.get(param, '')
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    return names('fields') or None, names('exclude')
+
+
+class SparseFieldsMixin:
+    def get_fields(self):
+        fields = super().get_fields()
+        # Only the top-level object (or each item of a top-level list).
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return fields
+        only, exclude = requested_fields(self.context.get('request'))
+        return {
+            name: field for name, field in fields.items()
+            if (only is None or name in only) and name not in exclude
+        }
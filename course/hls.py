@@ -0,0 +1,173 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+
+from .caching import bump_on_commit, course_namespace
+
+RESOLUTION_RE = re.compile(rb"Stream #.*Video:.*?, (\d{2,5})x(\d{2,5})")
+FRAME_RATE_RE = re.compile(rb"Stream #.*Video:.*?, (\d+(?:\.\d+)?) (?:fps|tbr)")
+MASTER_PLAYLIST = 'master.m3u8'
+# H.264 (level_idc, max macroblocks per frame, max macroblocks per second).
+H264_LEVELS = (
+    (30, 1620, 40500),
+    (31, 3600, 108000),
+    (32, 5120, 216000),
+    (40, 8192, 245760),
+    (42, 8704, 522240),
+    (50, 22080, 589824),
+    (51, 36864, 983040),
+)
+
+
+class PackagingError(Exception):
+    pass
+
+
+def ffmpeg_exe():
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def source_resolution(source, timeout):
+    """Width, height and frame rate of the first video stream."""
+    try:
+        result = subprocess.run(
+            [ffmpeg_exe(), '-hide_banner', '-nostdin', '-i', source],
+            capture_output=True, timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        raise PackagingError(f"{source}: ffmpeg did not finish within {timeout}s")
+    match = RESOLUTION_RE.search(result.stderr)
+    if not match:
+        raise PackagingError(f"no video stream found in {source}")
+    frame_rate = FRAME_RATE_RE.search(result.stderr)
+    return int(match.group(1)), int(match.group(2)), float(frame_rate.group(1)) if frame_rate else 30.0
+
+
+def h264_level(width, height, frame_rate):
+    """The lowest H.264 level whose frame size and macroblock rate fit."""
+    macroblocks = -(-width // 16) * -(-height // 16)
+    for level, max_frame, max_rate in H264_LEVELS:
+        if macroblocks <= max_frame and macroblocks * frame_rate <= max_rate:
+            return level
+    return H264_LEVELS[-1][0]
+
+
+def codecs(rendition):
+    # libx264 Main sets constraint_set1 (0x40); AAC-LC audio.
+    return f"avc1.4d40{rendition['level']:02x},mp4a.40.2"
+
+
+def encode_rendition(source, out_dir, rendition, segment_seconds, timeout):
+    """Encode one rung of the ladder into ``out_dir/index.m3u8`` + segments.
+
+    Runs inside a pool worker and never touches the database. Keyframes are
+    forced on segment boundaries so every rendition switches cleanly.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    video_bitrate = rendition['video_bitrate']
+    command = [
+        ffmpeg_exe(), '-nostdin', '-v', 'error', '-y', '-i', source,
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-vf', f"scale=-2:{rendition['height']}",
+        '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main', '-level:v', str(rendition['level'] / 10),
+        '-pix_fmt', 'yuv420p',
+        '-b:v', f'{video_bitrate}k', '-maxrate', f'{int(video_bitrate * 1.07)}k', '-bufsize', f'{video_bitrate * 3 // 2}k',
+        '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})', '-sc_threshold', '0',
+        '-c:a', 'aac', '-b:a', f"{rendition['audio_bitrate']}k", '-ac', '2',
+        '-f', 'hls', '-hls_time', str(segment_seconds), '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', os.path.join(out_dir, 'seg_%05d.ts'),
+        os.path.join(out_dir, 'index.m3u8'),
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise PackagingError(f"{rendition['name']}: ffmpeg did not finish within {timeout}s")
+    if result.returncode:
+        raise PackagingError(f"{rendition['name']}: {result.stderr.decode(errors='replace').strip()}")
+    return rendition['name']
+
+
+def package_lesson(lesson, executor):
+    """Build the HLS ladder for ``lesson`` and record it on the row."""
+    source = lesson.video.path
+    timeout = settings.HLS_TIMEOUT
+    width, height, frame_rate = source_resolution(source, timeout)
+
+    # Never upscale; a source smaller than every rung still gets the lowest one.
+    ladder = []
+    for r in [r for r in settings.HLS_LADDER if r['height'] <= height] or settings.HLS_LADDER[:1]:
+        rendition_height = min(r['height'], height)
+        rendition_width = round(width * rendition_height / height / 2) * 2
+        ladder.append(dict(
+            r, height=rendition_height, width=rendition_width,
+            level=h264_level(rendition_width, rendition_height, frame_rate),
+        ))
+
+    relative_dir = Path('hls') / str(lesson.pk)
+    out_dir = Path(settings.MEDIA_ROOT) / relative_dir
+    # Encode next to the published ladder so a failed run leaves it playable.
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    build_dir = Path(tempfile.mkdtemp(prefix=f'.{lesson.pk}-', dir=out_dir.parent))
+    old_dir = build_dir.with_name(f'{build_dir.name}-old')
+    try:
+        build_dir.chmod(0o755)  # mkdtemp creates it private to this user
+        renditions = build_ladder(source, build_dir, ladder, timeout, executor)
+        if out_dir.exists():
+            os.replace(out_dir, old_dir)
+        os.replace(build_dir, out_dir)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    lesson.hls_playlist = str(relative_dir / MASTER_PLAYLIST)
+    lesson.hls_renditions = renditions
+    updated = type(lesson).objects.filter(pk=lesson.pk, video=lesson.video.name).update(
+        hls_playlist=lesson.hls_playlist, hls_renditions=renditions,
+    )
+    if updated:
+        # The curriculum and course pages embed the playlist.
+        bump_on_commit('course', course_namespace(lesson.module.course_id))
+    return renditions
+
+
+def build_ladder(source, out_dir, ladder, timeout, executor):
+    """Encode every rendition into ``out_dir`` and write the master playlist."""
+    futures = [
+        executor.submit(
+            encode_rendition, source, str(out_dir / r['name']), r, settings.HLS_SEGMENT_SECONDS, timeout,
+        )
+        for r in ladder
+    ]
+    for future in futures:
+        future.result()
+
+    renditions = []
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for r in ladder:
+        bandwidth = (r['video_bitrate'] + r['audio_bitrate']) * 1100
+        playlist = f"{r['name']}/index.m3u8"
+        lines.append(
+            f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={r["width"]}x{r["height"]},'
+            f'CODECS="{codecs(r)}"'
+        )
+        lines.append(playlist)
+        renditions.append({
+            'name': r['name'],
+            'width': r['width'],
+            'height': r['height'],
+            'bandwidth': bandwidth,
+            'playlist': playlist,
+        })
+    (out_dir / MASTER_PLAYLIST).write_text('\n'.join(lines) + '\n')
+    return renditions
+
+
+def get_executor(workers=None):
+    return ProcessPoolExecutor(max_workers=workers or settings.HLS_WORKERS)
@@ -0,0 +1,153 @@
+"""On-demand resized/re-encoded copies of uploaded images.
+
+Derivatives live in a content-addressed disk cache: the key hashes the
+source's name, size and mtime together with the target width and format,
+so replacing an upload (or pointing the field at another file) yields new
+keys and the stale files simply age out of the LRU.
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from functools import cache
+
+from django.conf import settings
+from django.urls import reverse
+
+from .instrumentation import section
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'avif': ('AVIF', 'image/avif', {'quality': 60}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+@cache
+def format_supported(fmt):
+    from PIL import features
+
+    return fmt in FORMATS and (fmt == 'jpeg' or bool(features.check(fmt)))
+
+
+@cache
+def allowed_widths():
+    return {width for widths in settings.IMAGE_PRESETS.values() for width in widths}
+
+
+def source_version(path):
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns:x}{stat.st_size:x}"
+
+
+def derivative_url(field_file, width, fmt):
+    version = source_version(field_file.path)
+    url = reverse('course:image_derivative', kwargs={'width': width, 'fmt': fmt, 'name': field_file.name})
+    return f"{url}?v={version}"
+
+
+def build_srcset(field_file, preset, fmt='webp'):
+    if not field_file or not format_supported(fmt):
+        return ''
+    try:
+        return ', '.join(
+            f"{derivative_url(field_file, width, fmt)} {width}w" for width in settings.IMAGE_PRESETS[preset]
+        )
+    except OSError:
+        return ''
+
+
+def render_derivative(source_path, width, fmt):
+    from PIL import Image, ImageOps
+
+    pil_format, _, options = FORMATS[fmt]
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            image.thumbnail((width, image.height), Image.Resampling.LANCZOS)
+        if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+class DerivativeCache:
+    """Files under ``root/ab/<key>.<fmt>``.
+
+    atime is set explicitly on every hit and drives LRU eviction; mtime is
+    left alone so the served ETag/Last-Modified stay stable.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.size = None
+
+    def path(self, key, fmt):
+        return os.path.join(self.root, key[:2], f"{key}.{fmt}")
+
+    def get_or_create(self, source_path, width, fmt):
+        identity = f"{os.path.realpath(source_path)}:{source_version(source_path)}:{width}:{fmt}"
+        key = hashlib.sha256(identity.encode()).hexdigest()
+        path = self.path(key, fmt)
+        try:
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+            return path
+        except FileNotFoundError:
+            pass
+
+        with section('image_render'):
+            data = render_derivative(source_path, width, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self.lock:
+            if self.size is None:
+                self.size = self.scan_size()
+            else:
+                self.size += len(data)
+            if self.size > self.max_bytes:
+                self.evict()
+        return path
+
+    def entries(self):
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_atime, stat.st_size, path
+
+    def scan_size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        # Drop least recently used files until we are at 90% of the budget,
+        # so a full cache does not rescan the directory on every write.
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.size = total
+
+
+@cache
+def get_cache():
+    return DerivativeCache(settings.IMAGE_CACHE_ROOT, settings.IMAGE_CACHE_MAX_BYTES)
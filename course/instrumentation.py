@@ -0,0 +1,166 @@
+"""Per-request timing: DB, cache, templates and named hot sections.
+
+Sampled requests get a ``Server-Timing`` header and one JSON log line on
+the ``course.perf`` logger. Unsampled requests only pay for a random()
+call. The sample rate adapts so the bookkeeping itself stays under
+PERF_OVERHEAD_BUDGET of the sampled requests' wall time.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('course.perf')
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+        self.sections = defaultdict(float)
+        self.overhead = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            end = time.perf_counter()
+            self.db_queries += 1
+            self.db_time += end - start
+            self.overhead += time.perf_counter() - end
+
+
+def record_cache(hit):
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+
+@contextmanager
+def section(name):
+    """Attribute the enclosed block to ``name`` in the current request's
+    timings; free when the request is not sampled or there is no request."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.sections[name] += time.perf_counter() - start
+
+
+class SampleRate:
+    """Halve the sample rate while the measured overhead is over budget and
+    creep back towards PERF_SAMPLE_RATE once it is comfortably under."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rate = None
+        self.ratio = 0.0
+
+    def sampled(self):
+        if self.rate is None:
+            self.rate = settings.PERF_SAMPLE_RATE
+        return random.random() < self.rate
+
+    def observe(self, overhead, wall):
+        budget = settings.PERF_OVERHEAD_BUDGET
+        with self.lock:
+            self.ratio = 0.9 * self.ratio + 0.1 * (overhead / wall if wall else 0.0)
+            if self.ratio > budget:
+                self.rate = max(self.rate / 2, settings.PERF_MIN_SAMPLE_RATE)
+            elif self.ratio < budget / 2:
+                self.rate = min(self.rate * 1.25, settings.PERF_SAMPLE_RATE)
+
+
+sample_rate = SampleRate()
+
+
+class ServerTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PERF_INSTRUMENTATION or not sample_rate.sampled():
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                metrics.overhead += time.perf_counter() - metrics.start
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        wall = time.perf_counter() - metrics.start
+        start = time.perf_counter()
+        if settings.PERF_SERVER_TIMING_HEADER:
+            response['Server-Timing'] = self.server_timing(metrics, wall)
+        logger.info(json.dumps(self.log_record(request, response, metrics, wall), separators=(',', ':')))
+        metrics.overhead += time.perf_counter() - start
+        sample_rate.observe(metrics.overhead, wall)
+        return response
+
+    def process_template_response(self, request, response):
+        metrics = _current.get()
+        if metrics is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                metrics.template_time += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def server_timing(metrics, wall):
+        entries = [
+            f'total;dur={wall * 1000:.1f}',
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.db_queries} queries"',
+            f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+        ]
+        if metrics.template_time:
+            entries.append(f'template;dur={metrics.template_time * 1000:.1f}')
+        entries.extend(f'{name};dur={seconds * 1000:.1f}' for name, seconds in metrics.sections.items())
+        return ', '.join(entries)
+
+    @staticmethod
+    def log_record(request, response, metrics, wall):
+        match = request.resolver_match
+        return {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'wall_ms': round(wall * 1000, 2),
+            'db_queries': metrics.db_queries,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            'template_ms': round(metrics.template_time * 1000, 2),
+            'sections_ms': {name: round(seconds * 1000, 2) for name, seconds in metrics.sections.items()},
+            'sample_rate': sample_rate.rate,
+        }
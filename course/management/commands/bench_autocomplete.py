@@ -0,0 +1,73 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.test import Client
+from django.urls import reverse
+
+from course.autocomplete import index, words
+from course.models import Category, Course
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare search-as-you-type lookups in the in-process prefix index with the equivalent icontains "
+        "queries, over keystroke prefixes of existing course titles. Also times the autocomplete endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200, help="Keystroke prefixes to sample.")
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        titles = list(Course.objects.values_list('title', flat=True))
+        if not titles:
+            raise CommandError("No courses; run `manage.py generate_data` first.")
+        rng = random.Random(options['seed'])
+        queries = []
+        for title in rng.choices(titles, k=options['queries']):
+            word = rng.choice(words(title) or [title])
+            queries.append(word[:rng.randint(1, len(word))])
+        limit = options['limit']
+
+        index.lookup(queries[0])
+        url = reverse('course:course-autocomplete')
+        client = Client()
+        client.get(url, {'q': queries[0]})
+
+        results = {
+            'prefix index': self.measure(queries, lambda q: index.lookup(q, limit)),
+            'icontains': self.measure(queries, lambda q: self.icontains(q, limit)),
+            'endpoint': self.measure(queries, lambda q: client.get(url, {'q': q, 'limit': limit})),
+        }
+        for name, timings in results.items():
+            self.stdout.write(
+                f"{name:<14} p50={statistics.median(timings):8.1f}us "
+                f"p95={self.percentile(timings, 95):8.1f}us max={max(timings):8.1f}us"
+            )
+
+    @staticmethod
+    def icontains(query, limit):
+        categories = list(Category.objects.filter(name__icontains=query).values_list('pk', 'name', 'slug')[:limit])
+        courses = list(
+            Course.objects.filter(Q(title__icontains=query))
+            .order_by('-score', 'title').values_list('pk', 'title', 'slug')[:limit]
+        )
+        return (categories + courses)[:limit]
+
+    @staticmethod
+    def measure(queries, lookup):
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            lookup(query)
+            timings.append((time.perf_counter() - start) * 1_000_000)
+        return timings
+
+    @staticmethod
+    def percentile(values, pct):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
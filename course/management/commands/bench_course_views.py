@@ -0,0 +1,71 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from course.models import Category, Course, CourseView, Lesson, Module
+
+
+class Command(BaseCommand):
+    help = "Measure query count and latency of the course detail and video pages on a throwaway course."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modules', type=int, default=40)
+        parser.add_argument('--lessons', type=int, default=5, help="Lessons per module.")
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            course, user = self.seed(options['modules'], options['lessons'])
+            client = Client()
+            client.force_login(user)
+
+            for name in ('course:course_detail', 'course:course_video'):
+                url = reverse(name, kwargs={'slug': course.slug})
+                queries, timings = self.measure(client, url, options['requests'])
+                self.stdout.write(
+                    f"{name:<22} queries={queries:<4} "
+                    f"p50={statistics.median(timings):.2f}ms "
+                    f"p95={self.percentile(timings, 95):.2f}ms"
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, module_count, lessons_per_module):
+        category = Category.objects.create(name="Bench", slug="bench-course-views")
+        course = Course.objects.create(title="Bench", slug="bench-course-views", price=0, category=category)
+        modules = Module.objects.bulk_create(
+            Module(course=course, title=f"Module {i}") for i in range(module_count)
+        )
+        Lesson.objects.bulk_create(
+            Lesson(module=module, title=f"Lesson {j}", video='videos/bench.mp4', duration=timedelta(minutes=5))
+            for module in modules for j in range(lessons_per_module)
+        )
+        Course.recompute(pk=course.pk)
+
+        user = get_user_model().objects.create_user(email="bench-course-views@example.com", password="bench")
+        CourseView.objects.create(user=user, course=course)
+        return course, user
+
+    def measure(self, client, url, requests):
+        client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            client.get(url)
+        queries = len(ctx)
+
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        return queries, timings
+
+    @staticmethod
+    def percentile(values, pct):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
@@ -0,0 +1,216 @@
+import json
+import logging
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from course.models import Category, Course, CourseView
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the main HTML views and REST endpoints with concurrent clients and write throughput and "
+        "latency percentiles to a JSON file. Runs in-process through the test client by default (one DB "
+        "connection per client thread, so the GIL caps throughput); pass --base-url to load a running server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200, help="Requests per target.")
+        parser.add_argument('--warmup', type=int, default=10, help="Unmeasured requests per target.")
+        parser.add_argument('--targets', nargs='+', help="Only run these targets.")
+        parser.add_argument('--base-url', help="e.g. http://127.0.0.1:8000; anonymous targets only.")
+        parser.add_argument('--output', default='bench-load.json')
+        parser.add_argument('--compare', help="A previous --output file to diff against.")
+
+    def handle(self, *args, **options):
+        # Keep sampled requests' Server-Timing log lines out of the report.
+        logging.getLogger('course.perf').setLevel(logging.WARNING)
+        targets = self.targets()
+        if options['targets']:
+            unknown = set(options['targets']) - {name for name, _, _ in targets}
+            if unknown:
+                raise CommandError(f"Unknown targets: {', '.join(sorted(unknown))}")
+            targets = [t for t in targets if t[0] in options['targets']]
+
+        self.base_url = options['base_url']
+        self.user = None
+        if any(auth for _, _, auth in targets) and not self.base_url:
+            enrollment = CourseView.objects.filter(course__slug=self.course.slug).select_related('user').first()
+            self.user = enrollment.user if enrollment else get_user_model().objects.first()
+
+        results = {}
+        self.stdout.write(f"{'target':<22} {'rps':>8} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8}  status")
+        for name, url, auth in targets:
+            if auth and (self.base_url or self.user is None):
+                self.stdout.write(f"{name:<22} skipped (needs a logged-in in-process client)")
+                continue
+            result = self.run_target(url, auth, options['concurrency'], options['requests'], options['warmup'])
+            results[name] = result
+            self.stdout.write(
+                f"{name:<22} {result['rps']:>8.1f} "
+                + ' '.join(f"{result[f'p{pct}_ms']:>7.1f}ms" for pct in PERCENTILES)
+                + f"  {result['status']}"
+            )
+
+        report = {
+            'meta': {
+                'commit': self.git_commit(),
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'mode': 'http' if self.base_url else 'in-process',
+                'database': connection.vendor,
+                'concurrency': options['concurrency'],
+                'requests': options['requests'],
+                'courses': Course.objects.count(),
+            },
+            'targets': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+        if options['compare']:
+            self.compare(options['compare'], report)
+
+    def targets(self):
+        self.course = Course.ranked().first()
+        category = Category.objects.filter(courses__isnull=False).first()
+        if self.course is None or category is None:
+            raise CommandError("No courses to benchmark; run `manage.py generate_data` first.")
+        slug = self.course.slug
+        return [
+            ('index', reverse('course:index'), False),
+            ('course_list', reverse('course:course_list'), False),
+            ('category_detail', reverse('course:category_detail', args=[category.slug]), False),
+            ('course_detail', reverse('course:course_detail', args=[slug]), True),
+            ('course_video', reverse('course:course_video', args=[slug]), True),
+            ('course_comments', reverse('course:course_comments', args=[slug]), False),
+            ('api_courses', reverse('course:course-list'), False),
+            ('api_courses_deep', self.deep_page_url(reverse('course:course-list'), 20), False),
+            ('api_comments', reverse('course:comment-list-create'), False),
+            ('api_leaderboard', reverse('course:course-leaderboard'), False),
+            ('api_categories', reverse('course:category-list'), False),
+        ]
+
+    @staticmethod
+    def deep_page_url(url, pages):
+        # Follow `next` links so the deep-page target exercises a real cursor.
+        client = Client()
+        for _ in range(pages):
+            next_url = client.get(url).json().get('next')
+            if not next_url:
+                break
+            parts = urlsplit(next_url)
+            url = f"{parts.path}?{parts.query}"
+        return url
+
+    def run_target(self, url, auth, concurrency, requests, warmup):
+        local = threading.local()
+        lock = threading.Lock()
+        remaining = [warmup]
+        timings = []
+        statuses = Counter()
+
+        def take():
+            with lock:
+                if remaining[0] <= 0:
+                    return False
+                remaining[0] -= 1
+                return True
+
+        def worker(record):
+            if not hasattr(local, 'client') and not self.base_url:
+                local.client = Client(raise_request_exception=False)
+                if auth:
+                    local.client.force_login(self.user)
+            try:
+                while take():
+                    start = time.perf_counter()
+                    status = self.fetch(local, url)
+                    elapsed = (time.perf_counter() - start) * 1000
+                    if record:
+                        with lock:
+                            timings.append(elapsed)
+                            statuses[status] += 1
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, [False] * concurrency))
+            remaining[0] = requests
+            start = time.perf_counter()
+            list(pool.map(worker, [True] * concurrency))
+            wall = time.perf_counter() - start
+
+        ordered = sorted(timings)
+        result = {
+            'url': url,
+            'requests': len(timings),
+            'errors': sum(count for status, count in statuses.items() if status >= 500 or status == 0),
+            'status': dict(sorted(statuses.items())),
+            'rps': round(len(timings) / wall, 2),
+            'mean_ms': round(statistics.fmean(ordered), 3),
+            'max_ms': round(ordered[-1], 3),
+        }
+        for pct in PERCENTILES:
+            result[f'p{pct}_ms'] = round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 3)
+        return result
+
+    def fetch(self, local, url):
+        if not self.base_url:
+            response = local.client.get(url)
+            response.close()
+            return response.status_code
+        try:
+            with urllib.request.urlopen(self.base_url.rstrip('/') + url, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except OSError:
+            return 0
+
+    def compare(self, path, report):
+        with open(path) as f:
+            baseline = json.load(f)
+        self.stdout.write(f"\nvs {path} ({baseline['meta'].get('commit') or 'unknown commit'})")
+        self.stdout.write(f"{'target':<22} {'rps':>16} {'p50':>18} {'p95':>18}")
+        for name, now in report['targets'].items():
+            before = baseline['targets'].get(name)
+            if before is None:
+                continue
+            self.stdout.write(
+                f"{name:<22} {self.delta(before['rps'], now['rps'])} "
+                f"{self.delta(before['p50_ms'], now['p50_ms'])} {self.delta(before['p95_ms'], now['p95_ms'])}"
+            )
+
+    @staticmethod
+    def delta(before, now):
+        change = (now - before) / before * 100 if before else 0.0
+        return f"{before:>7.1f}->{now:<7.1f}{change:+5.0f}%"
+
+    @staticmethod
+    def git_commit():
+        try:
+            result = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR,
+            )
+        except OSError:
+            return None
+        return result.stdout.strip() or None
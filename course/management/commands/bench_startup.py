@@ -0,0 +1,93 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+STARTUP_SCRIPT = """
+import os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', {settings_module!r})
+from core.wsgi import application
+{extra}
+"""
+
+# Everything a worker has loaded once it can route its first request;
+# -X importtime alone misses modules imported before it starts logging.
+MODULES_SCRIPT = STARTUP_SCRIPT + """
+import importlib, json, sys
+from django.conf import settings
+importlib.import_module(settings.ROOT_URLCONF)
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+class Command(BaseCommand):
+    help = "Measure cold-start import time of core.wsgi.application in fresh interpreters and enforce a budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=20, help="How many of the slowest imports to list.")
+        parser.add_argument('--budget', type=float, default=settings.STARTUP_TIME_BUDGET_MS, help="Milliseconds.")
+        parser.add_argument('--with-urls', action='store_true', help="Also import the URLconf, as the first request does.")
+
+    def handle(self, *args, **options):
+        extra = "import importlib; importlib.import_module(os.environ.get('ROOT_URLCONF', 'core.urls'))" if options['with_urls'] else ""
+        script = STARTUP_SCRIPT.format(settings_module=os.environ['DJANGO_SETTINGS_MODULE'], extra=extra)
+
+        wall_times = []
+        imports = None
+        for _ in range(options['runs']):
+            start = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', script],
+                capture_output=True, text=True, cwd=settings.BASE_DIR,
+            )
+            wall_times.append((time.perf_counter() - start) * 1000)
+            if result.returncode:
+                raise CommandError(result.stderr.strip().splitlines()[-1])
+            imports = self.parse_importtime(result.stderr)
+
+        self.stdout.write(f"{'self ms':>9} {'cumulative ms':>14}  module")
+        for module, self_us, cumulative_us in sorted(imports, key=lambda row: row[2], reverse=True)[:options['top']]:
+            self.stdout.write(f"{self_us / 1000:>9.1f} {cumulative_us / 1000:>14.1f}  {module}")
+
+        forbidden = self.forbidden_modules(self.loaded_modules())
+
+        cold_start = statistics.median(wall_times)
+        self.stdout.write(
+            f"\ncold start median {cold_start:.0f}ms over {options['runs']} runs "
+            f"(budget {options['budget']:.0f}ms, {len(imports)} modules imported)"
+        )
+        if forbidden:
+            raise CommandError(f"Heavy modules imported at startup: {', '.join(forbidden)}")
+        if cold_start > options['budget']:
+            raise CommandError(f"Cold start {cold_start:.0f}ms is over the {options['budget']:.0f}ms budget")
+
+    @staticmethod
+    def loaded_modules():
+        script = MODULES_SCRIPT.format(settings_module=os.environ['DJANGO_SETTINGS_MODULE'], extra='')
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, cwd=settings.BASE_DIR)
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    @staticmethod
+    def forbidden_modules(loaded):
+        return sorted(
+            forbidden for forbidden in settings.STARTUP_FORBIDDEN_MODULES
+            if any(module == forbidden or module.startswith(forbidden + '.') for module in loaded)
+        )
+
+    @staticmethod
+    def parse_importtime(output):
+        rows = []
+        for line in output.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, module = line[len('import time:'):].split('|')
+            rows.append((module.rstrip(), int(self_us), int(cumulative_us)))
+        return rows
@@ -0,0 +1,96 @@
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from course.media_info import UnsupportedFormat, read_duration
+from course.probe import probe_duration
+
+CORPUS = [
+    ('mp4', ['-c:v', 'libx264', '-c:a', 'aac']),
+    ('faststart.mp4', ['-c:v', 'libx264', '-c:a', 'aac', '-movflags', '+faststart']),
+    ('fragmented.mp4', ['-c:v', 'libx264', '-c:a', 'aac', '-movflags', 'frag_keyframe+empty_moov']),
+    ('mov', ['-c:v', 'libx264', '-c:a', 'aac']),
+    ('webm', ['-c:v', 'libvpx', '-b:v', '200k', '-c:a', 'libvorbis']),
+    ('mkv', ['-c:v', 'libx264', '-c:a', 'aac']),
+    ('avi', ['-c:v', 'mpeg4', '-c:a', 'aac']),
+]
+
+
+class Command(BaseCommand):
+    help = "Compare the header-only duration reader with moviepy's VideoFileClip on generated videos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=int, nargs='+', default=[5, 60])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        import imageio_ffmpeg
+
+        ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+        with tempfile.TemporaryDirectory() as tmp:
+            files = []
+            for seconds in options['seconds']:
+                for suffix, codec_args in CORPUS:
+                    path = Path(tmp) / f"{seconds}s.{suffix}"
+                    subprocess.run(
+                        [ffmpeg, '-v', 'error', '-y',
+                         '-f', 'lavfi', '-i', f'testsrc=duration={seconds}:size=320x240:rate=25',
+                         '-f', 'lavfi', '-i', f'sine=duration={seconds}',
+                         '-shortest', *codec_args, str(path)],
+                        check=True,
+                    )
+                    files.append((path, seconds))
+
+            self.stdout.write(f"{'file':<22} {'size':>9} {'header':>10} {'probe':>10} {'moviepy':>10}  durations")
+            totals = {'header': [], 'probe': [], 'moviepy': []}
+            for path, seconds in files:
+                header, header_ms = self.time(lambda: self.header(path), options['repeat'])
+                probed, probe_ms = self.time(lambda: probe_duration(str(path)).total_seconds(), options['repeat'])
+                clip, moviepy_ms = self.time(lambda: self.moviepy(path), options['repeat'])
+                totals['header'].append(header_ms)
+                totals['probe'].append(probe_ms)
+                totals['moviepy'].append(moviepy_ms)
+                self.stdout.write(
+                    f"{path.name:<22} {path.stat().st_size:>9} "
+                    f"{self.fmt(header_ms if header is not None else None)} {self.fmt(probe_ms)} {self.fmt(moviepy_ms)}  "
+                    f"header={header} probe={probed} moviepy={clip}"
+                )
+
+            self.stdout.write(
+                "median ms  " + "  ".join(f"{name}={statistics.median(values):.3f}" for name, values in totals.items())
+            )
+
+    @staticmethod
+    def header(path):
+        try:
+            return round(read_duration(str(path)), 2)
+        except UnsupportedFormat:
+            return None
+
+    @staticmethod
+    def moviepy(path):
+        from moviepy.editor import VideoFileClip
+
+        clip = VideoFileClip(str(path))
+        duration = clip.duration
+        clip.reader.close()
+        if clip.audio:
+            clip.audio.reader.close_proc()
+        return duration
+
+    @staticmethod
+    def time(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return result, statistics.median(timings)
+
+    @staticmethod
+    def fmt(ms):
+        return f"{ms:>8.3f}ms" if ms is not None else f"{'n/a':>10}"
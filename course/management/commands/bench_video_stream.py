@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import Client
+from django.urls import reverse
+
+from course.models import Category, Course, CourseView, Lesson, Module
+
+BENCH_SLUG = 'bench-video-stream'
+
+
+class Command(BaseCommand):
+    help = "Random-seek workload against the lesson streaming view vs. plain MEDIA serving."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=64, help="Size of the generated video file.")
+        parser.add_argument('--chunk-kb', type=int, default=512, help="Bytes requested per seek.")
+        parser.add_argument('--clients', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=400)
+
+    def handle(self, *args, **options):
+        video = Path(settings.MEDIA_ROOT) / 'videos' / f'{BENCH_SLUG}.mp4'
+        video.parent.mkdir(parents=True, exist_ok=True)
+        with open(video, 'wb') as f:
+            for _ in range(options['size_mb']):
+                f.write(random.randbytes(1024 * 1024))
+
+        course, lesson, user = self.seed(f'videos/{video.name}')
+        try:
+            login = Client()
+            login.force_login(user)
+            cookies = login.cookies
+
+            size = video.stat().st_size
+            chunk = options['chunk_kb'] * 1024
+            workloads = {
+                'lesson_video (Range)': reverse('course:lesson_video', kwargs={'slug': course.slug, 'pk': lesson.pk}),
+            }
+            if settings.DEBUG:
+                workloads['static media (no Range)'] = settings.MEDIA_URL + lesson.video.name
+
+            for name, url in workloads.items():
+                def fetch(_):
+                    client = Client()
+                    client.cookies = cookies
+                    start = random.randrange(0, size - chunk)
+                    began = time.perf_counter()
+                    response = client.get(url, HTTP_RANGE=f'bytes={start}-{start + chunk - 1}')
+                    assert response.status_code in (200, 206), f"{url} returned {response.status_code}"
+                    received = sum(len(part) for part in response.streaming_content)
+                    response.close()
+                    close_old_connections()
+                    return received, (time.perf_counter() - began) * 1000
+
+                began = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['clients']) as executor:
+                    results = list(executor.map(fetch, range(options['requests'])))
+                elapsed = time.perf_counter() - began
+
+                received = sum(r[0] for r in results)
+                latencies = sorted(r[1] for r in results)
+                self.stdout.write(
+                    f"{name:<26} {len(results) / elapsed:>8.1f} req/s {received / elapsed / 2**20:>9.1f} MB/s "
+                    f"p50={statistics.median(latencies):.2f}ms p95={latencies[int(len(latencies) * 0.95)]:.2f}ms "
+                    f"bytes/request={received // len(results)}"
+                )
+        finally:
+            Course.objects.filter(slug=BENCH_SLUG).delete()
+            Category.objects.filter(slug=BENCH_SLUG).delete()
+            user.delete()
+            video.unlink(missing_ok=True)
+
+    def seed(self, video_name):
+        category = Category.objects.create(name="Bench", slug=BENCH_SLUG)
+        course = Course.objects.create(title="Bench", slug=BENCH_SLUG, price=0, category=category)
+        module = Module.objects.create(course=course, title="Bench")
+        lesson = Lesson.objects.create(module=module, title="Bench", video=video_name, duration=timedelta(minutes=10))
+        user = get_user_model().objects.create_user(email=f"{BENCH_SLUG}@example.com", password="bench")
+        CourseView.objects.create(user=user, course=course)
+        return course, lesson, user
@@ -0,0 +1,177 @@
+import os
+import random
+import subprocess
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from course import search
+from course.models import Category, Comment, Course, CourseView, Lesson, Module
+
+PLACEHOLDER_VIDEO = 'videos/placeholder.mp4'
+PLACEHOLDER_IMAGE = 'images/placeholder.jpg'
+COMMENT_TEXTS = [
+    "Juda foydali kurs!", "Tushuntirishlar aniq va tushunarli.", "Ko'proq amaliyot bo'lsa yaxshi bo'lardi.",
+    "O'qituvchi zo'r!", "Boshlovchilar uchun ajoyib.", "Ba'zi darslar tez o'tib ketdi.",
+]
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic catalog (categories, courses, modules, lessons, users, enrollments, comments) "
+        "in the configured database. Rows are streamed in fixed-size bulk inserts, so memory stays flat."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='gen', help="Slug/email prefix marking generated rows.")
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--courses', type=int, default=50, help="Courses per category.")
+        parser.add_argument('--modules', type=int, default=6, help="Modules per course.")
+        parser.add_argument('--lessons', type=int, default=8, help="Lessons per module.")
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--enrollments', type=int, default=5, help="Courses per user.")
+        parser.add_argument('--comments', type=int, default=20, help="Comments per course.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--flush', action='store_true', help="Delete previously generated rows with this prefix first.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.prefix = prefix = options['prefix']
+        self.batch_size = options['batch_size']
+        User = get_user_model()
+
+        if options['flush']:
+            self.flush(prefix)
+
+        video = self.placeholder_video()
+        image = self.placeholder_image()
+        self.insert(Category, (
+            Category(name=f"{prefix.title()} kategoriya {i}", slug=f'{prefix}-category-{i}', image=image)
+            for i in range(options['categories'])
+        ))
+        categories = Category.objects.filter(slug__startswith=f'{prefix}-category-')
+
+        self.insert(Course, (
+            Course(
+                title=f"{prefix.title()} kurs {category_id}-{i}",
+                slug=f'{prefix}-course-{category_id}-{i}',
+                category_id=category_id,
+                image=image,
+                price=self.rng.choice([0, 49, 99, 149, 199]),
+                description="Sintetik ma'lumotlar bilan yaratilgan kurs.",
+            )
+            for category_id in self.pks(categories)
+            for i in range(options['courses'])
+        ))
+        courses = Course.objects.filter(slug__startswith=f'{prefix}-course-')
+
+        self.insert(Module, (
+            Module(course_id=course_id, title=f"Modul {i + 1}")
+            for course_id in self.pks(courses)
+            for i in range(options['modules'])
+        ))
+        self.insert(Lesson, (
+            Lesson(
+                module_id=module_id, title=f"Dars {i + 1}", video=video,
+                duration=timedelta(seconds=self.rng.randint(3 * 60, 20 * 60)),
+            )
+            for module_id in self.pks(Module.objects.filter(course__in=courses))
+            for i in range(options['lessons'])
+        ))
+
+        password = make_password(f'{prefix}-password')
+        self.insert(User, (
+            User(email=f'{prefix}-user{i}@example.com', password=password)
+            for i in range(options['users'])
+        ))
+        users = User.objects.filter(email__startswith=f'{prefix}-user')
+        user_ids = list(self.pks(users))
+        course_ids = list(self.pks(courses))
+
+        enrollments = min(options['enrollments'], len(course_ids))
+        self.insert(CourseView, (
+            CourseView(user_id=user_id, course_id=course_id)
+            for user_id in user_ids
+            for course_id in self.rng.sample(course_ids, enrollments)
+        ))
+        if user_ids:
+            self.insert(Comment, (
+                Comment(
+                    course_id=course_id, user_id=self.rng.choice(user_ids),
+                    text=self.rng.choice(COMMENT_TEXTS), rating=self.rng.choices(range(1, 6), [1, 1, 3, 6, 8])[0],
+                )
+                for course_id in course_ids
+                for _ in range(options['comments'])
+            ))
+
+        Course.recompute(slug__startswith=f'{prefix}-course-')
+        Course.recompute_ratings(slug__startswith=f'{prefix}-course-')
+        search.index_courses(course_ids)
+        self.stdout.write(self.style.SUCCESS(f"Generated data under prefix {prefix!r}."))
+
+    def insert(self, model, objects):
+        total = 0
+        for batch in batched(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+            total += len(batch)
+        self.stdout.write(f"{model.__name__:<12} {total:>9}")
+
+    def pks(self, queryset):
+        return queryset.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=self.batch_size)
+
+    def flush(self, prefix):
+        User = get_user_model()
+        courses = {'course__slug__startswith': f'{prefix}-course-'}
+        # Children first and in pk batches: models with delete signals or
+        # overrides can't be fast-deleted, so every cascade is collected in
+        # memory.
+        deleted = 0
+        for model, filters in (
+            (Comment, courses),
+            (CourseView, courses),
+            (Lesson, {'module__course__slug__startswith': f'{prefix}-course-'}),
+            (Module, courses),
+            (Course, {'slug__startswith': f'{prefix}-course-'}),
+            (Category, {'slug__startswith': f'{prefix}-category-'}),
+            (User, {'email__startswith': f'{prefix}-user'}),
+        ):
+            queryset = model.objects.filter(**filters).order_by('pk').values_list('pk', flat=True)
+            while batch := list(queryset[:self.batch_size]):
+                deleted += model.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(f"Deleted {deleted} previously generated rows.")
+
+    def placeholder_video(self):
+        path = os.path.join(settings.MEDIA_ROOT, PLACEHOLDER_VIDEO)
+        if not os.path.exists(path):
+            import imageio_ffmpeg
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            subprocess.run(
+                [imageio_ffmpeg.get_ffmpeg_exe(), '-v', 'error', '-y',
+                 '-f', 'lavfi', '-i', 'testsrc=duration=2:size=160x90:rate=10',
+                 '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-movflags', '+faststart', path],
+                check=True,
+            )
+        return PLACEHOLDER_VIDEO
+
+    def placeholder_image(self):
+        path = os.path.join(settings.MEDIA_ROOT, PLACEHOLDER_IMAGE)
+        if not os.path.exists(path):
+            from PIL import Image
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            Image.new('RGB', (960, 540), (52, 120, 200)).save(path, 'JPEG', quality=80)
+        return PLACEHOLDER_IMAGE
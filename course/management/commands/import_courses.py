@@ -0,0 +1,224 @@
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from course import search
+from course.caching import bump_on_commit
+from course.models import Category, Course, Lesson, Module, VideoProbeJob
+
+CSV_COLUMNS = ('category_slug', 'course_slug', 'course_title', 'module', 'lesson', 'video')
+
+
+def probe(path):
+    # Runs in a worker process; errors travel back as text so one broken
+    # file does not take the whole pool down.
+    from course.probe import probe_duration
+
+    try:
+        return probe_duration(path), ''
+    except Exception as e:
+        return None, str(e) or e.__class__.__name__
+
+
+class Command(BaseCommand):
+    help = (
+        "Import categories, courses, modules and lessons from a JSON or CSV manifest. Videos are probed in a "
+        "process pool, rows are bulk-inserted one chunk of courses per transaction and each course's aggregates "
+        "are recomputed once. Courses whose slug already exists are skipped, so an interrupted import can simply "
+        "be run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifest', help="A .json or .csv manifest.")
+        parser.add_argument('--video-dir', help="Where manifest video/image paths are resolved (default: next to the manifest).")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Probe processes.")
+        parser.add_argument('--chunk-size', type=int, default=20, help="Courses per transaction.")
+
+    def handle(self, *args, **options):
+        manifest = options['manifest']
+        self.video_dir = options['video_dir'] or os.path.dirname(os.path.abspath(manifest))
+        courses = self.load(manifest)
+
+        existing = set(Course.objects.filter(slug__in=[c['slug'] for c in courses]).values_list('slug', flat=True))
+        pending = [course for course in courses if course['slug'] not in existing]
+        if existing:
+            self.stdout.write(f"Skipping {len(existing)} course(s) imported earlier.")
+        for course in pending:
+            if course.get('image'):
+                self.source(course['image'])
+            for module in course['modules']:
+                for lesson in module['lessons']:
+                    lesson['path'] = self.source(lesson['video'])
+
+        categories = self.categories(pending)
+        imported = lessons = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            for start in range(0, len(pending), options['chunk_size']):
+                chunk = pending[start:start + options['chunk_size']]
+                paths = [lesson['path'] for course in chunk for module in course['modules'] for lesson in module['lessons']]
+                probes = dict(zip(paths, pool.map(probe, paths)))
+                failed += sum(1 for _, error in probes.values() if error)
+                lessons += self.insert(chunk, categories, probes)
+                imported += len(chunk)
+                self.stdout.write(f"{imported}/{len(pending)} course(s), {lessons} lesson(s)")
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} course(s) and {lessons} lesson(s)."))
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f"{failed} video(s) could not be probed; see `run_video_probes --retry-failed`."
+            ))
+
+    def load(self, path):
+        try:
+            with open(path, newline='') as f:
+                if path.endswith('.csv'):
+                    courses = self.from_csv(csv.DictReader(f))
+                else:
+                    data = json.load(f)
+                    courses = data['courses'] if isinstance(data, dict) else data
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Cannot read manifest {path}: {e}")
+
+        # Everything is checked before the first file is copied or row written.
+        if not isinstance(courses, list):
+            raise CommandError("The manifest must hold a list of courses.")
+        slugs = set()
+        for number, course in enumerate(courses, 1):
+            self.require(course, ('slug', 'title', 'category'), f"Course #{number}")
+            label = f"Course {course['slug']!r}"
+            if course['slug'] in slugs:
+                raise CommandError(f"{label} appears twice.")
+            slugs.add(course['slug'])
+            if not isinstance(course['category'], str):
+                self.require(course['category'], ('slug',), f"{label} category")
+            # Videos are stored as videos/<slug>/<file name>, see store().
+            videos = {}
+            for m, module in enumerate(self.items(course, 'modules', label), 1):
+                self.require(module, ('title',), f"{label} module #{m}")
+                for n, lesson in enumerate(self.items(module, 'lessons', f"{label} module #{m}"), 1):
+                    self.require(lesson, ('title', 'video'), f"{label} module #{m} lesson #{n}")
+                    video = os.path.normpath(lesson['video'])
+                    other = videos.setdefault(os.path.basename(video), video)
+                    if other != video:
+                        raise CommandError(f"{label}: videos {other!r} and {video!r} have the same file name.")
+        return courses
+
+    @staticmethod
+    def require(item, keys, label):
+        if not isinstance(item, dict):
+            raise CommandError(f"{label} must be an object.")
+        missing = [key for key in keys if not item.get(key)]
+        if missing:
+            raise CommandError(f"{label} is missing {', '.join(missing)}.")
+
+    @staticmethod
+    def items(parent, key, label):
+        items = parent.setdefault(key, [])
+        if not isinstance(items, list):
+            raise CommandError(f"{label}: {key} must be a list.")
+        return items
+
+    @staticmethod
+    def from_csv(rows):
+        # One row per lesson; course and category columns are read from the
+        # first row of each course.
+        missing = set(CSV_COLUMNS) - set(rows.fieldnames or ())
+        if missing:
+            raise ValueError(f"missing columns {', '.join(sorted(missing))}")
+        courses = {}
+        for row in rows:
+            course = courses.get(row['course_slug'])
+            if course is None:
+                course = courses[row['course_slug']] = {
+                    'slug': row['course_slug'],
+                    'title': row['course_title'],
+                    'category': {'slug': row['category_slug'], 'name': row.get('category_name') or row['category_slug']},
+                    'price': row.get('price') or 0,
+                    'description': row.get('description', ''),
+                    'image': row.get('image', ''),
+                    'modules': [],
+                }
+            modules = course['modules']
+            if not modules or modules[-1]['title'] != row['module']:
+                modules.append({'title': row['module'], 'lessons': []})
+            modules[-1]['lessons'].append({'title': row['lesson'], 'video': row['video']})
+        return list(courses.values())
+
+    def source(self, name):
+        path = os.path.join(self.video_dir, name)
+        if not os.path.isfile(path):
+            raise CommandError(f"File not found: {path}")
+        return path
+
+    def categories(self, courses):
+        wanted = {}
+        for course in courses:
+            category = course['category']
+            if isinstance(category, str):
+                category = course['category'] = {'slug': category, 'name': category}
+            wanted.setdefault(category['slug'], category.get('name') or category['slug'])
+        with transaction.atomic():
+            Category.objects.bulk_create(
+                [Category(slug=slug, name=name) for slug, name in wanted.items()], ignore_conflicts=True,
+            )
+            bump_on_commit('category')
+        return dict(Category.objects.filter(slug__in=wanted).values_list('slug', 'pk'))
+
+    def store(self, upload_to, slug, path):
+        # Stable names: a rerun after an interruption reuses files that were
+        # already copied instead of piling up suffixed duplicates.
+        name = f'{upload_to}{slug}/{os.path.basename(path)}'
+        if not default_storage.exists(name) or default_storage.size(name) != os.path.getsize(path):
+            with open(path, 'rb') as f:
+                name = default_storage.save(name, File(f))
+        return name
+
+    @transaction.atomic
+    def insert(self, chunk, categories, probes):
+        courses = Course.objects.bulk_create([
+            Course(
+                slug=course['slug'],
+                title=course['title'],
+                category_id=categories[course['category']['slug']],
+                price=course.get('price') or 0,
+                description=course.get('description', ''),
+                image=self.store('images/', course['slug'], self.source(course['image'])) if course.get('image') else None,
+                # What Course.save() gives a course with no reviews yet.
+                score=settings.LEADERBOARD_PRIOR_MEAN,
+            )
+            for course in chunk
+        ])
+
+        modules, module_rows = [], []
+        for course, row in zip(chunk, courses):
+            for position, module in enumerate(course['modules']):
+                modules.append(module)
+                module_rows.append(Module(course=row, title=module['title'], position=position))
+        Module.objects.bulk_create(module_rows)
+
+        lessons, failures = [], []
+        for module, row in zip(modules, module_rows):
+            for position, lesson in enumerate(module['lessons']):
+                duration, error = probes[lesson['path']]
+                lessons.append(Lesson(
+                    module=row, title=lesson['title'], duration=duration, position=position,
+                    video=self.store('videos/', row.course.slug, lesson['path']),
+                ))
+                failures.append(error)
+        Lesson.objects.bulk_create(lessons)
+        VideoProbeJob.objects.bulk_create([
+            VideoProbeJob(lesson=lesson, status=VideoProbeJob.FAILED, error=error)
+            for lesson, error in zip(lessons, failures) if error
+        ])
+
+        Course.recompute(pk__in=[course.pk for course in courses])
+        search.schedule(course_ids=[course.pk for course in courses])
+        return len(lessons)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from course.hls import PackagingError, get_executor, package_lesson
+from course.models import Lesson
+
+
+class Command(BaseCommand):
+    help = "Package lesson videos into HLS renditions with a master playlist."
+
+    def add_arguments(self, parser):
+        parser.add_argument('lesson_ids', nargs='*', type=int, help="Only these lessons.")
+        parser.add_argument('--force', action='store_true', help="Repackage lessons that already have a playlist.")
+        parser.add_argument('--workers', type=int, default=None, help="Parallel ffmpeg encodes.")
+
+    def handle(self, *args, **options):
+        lessons = Lesson.objects.select_related('module').exclude(video='')
+        if options['lesson_ids']:
+            lessons = lessons.filter(pk__in=options['lesson_ids'])
+        if not options['force']:
+            lessons = lessons.filter(hls_playlist='')
+
+        packaged = failed = 0
+        with get_executor(options['workers']) as executor:
+            for lesson in lessons.iterator():
+                try:
+                    renditions = package_lesson(lesson, executor)
+                except (PackagingError, OSError) as e:
+                    failed += 1
+                    self.stderr.write(f"Lesson {lesson.pk}: {e}")
+                    continue
+                packaged += 1
+                self.stdout.write(f"Lesson {lesson.pk}: {', '.join(r['name'] for r in renditions)}")
+
+        self.stdout.write(self.style.SUCCESS(f"Packaged {packaged} lesson(s), {failed} failed."))
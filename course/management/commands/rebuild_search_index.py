@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from course import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search documents of every course."
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} course(s)."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from course.models import Course
+
+
+class Command(BaseCommand):
+    help = "Recompute student/lesson/module counts and duration for courses flagged as stale."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Recompute every course, not only stale ones.")
+
+    def handle(self, *args, **options):
+        filters = {} if options['all'] else {'aggregates_stale': True}
+        updated = Course.recompute(**filters)
+        self.stdout.write(self.style.SUCCESS(f"Recomputed {updated} course(s)."))
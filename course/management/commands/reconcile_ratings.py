@@ -0,0 +1,62 @@
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Abs, Cast, Coalesce, NullIf
+
+from course.models import Course
+
+AGGREGATES = {
+    'rating_sum': Coalesce(Sum('comments__rating'), 0),
+    'num_reviews': Count('comments'),
+    **{f'stars_{n}': Count('comments', filter=Q(comments__rating=n)) for n in range(1, 6)},
+}
+# Derived from the counters above; compared with a tolerance.
+AVERAGES = ('rating', 'score')
+TOLERANCE = 1e-9
+
+
+def with_actual_values(courses):
+    courses = courses.annotate(**{f'actual_{name}': aggregate for name, aggregate in AGGREGATES.items()})
+    rating_sum, num_reviews = F('actual_rating_sum'), F('actual_num_reviews')
+    return courses.annotate(
+        actual_rating=Coalesce(Cast(rating_sum, FloatField()) / NullIf(num_reviews, 0), 0.0),
+        actual_score=Course.score_expression(rating_sum, num_reviews),
+        **{f'{name}_error': Abs(F(name) - F(f'actual_{name}')) for name in AVERAGES},
+    )
+
+
+class Command(BaseCommand):
+    help = "Find courses whose stored rating aggregates drifted from their comments, report and repair them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report drifted courses.")
+
+    def handle(self, *args, **options):
+        fields = [*AGGREGATES, *AVERAGES]
+        drifted = with_actual_values(Course.objects).filter(reduce(or_, [
+            *(~Q(**{name: F(f'actual_{name}')}) for name in AGGREGATES),
+            *(Q(**{f'{name}_error__gt': TOLERANCE}) for name in AVERAGES),
+        ])).order_by('pk').values('pk', 'title', *fields, *(f'actual_{name}' for name in fields))
+
+        course_ids = []
+        for row in drifted:
+            course_ids.append(row['pk'])
+            changes = ', '.join(
+                f"{name} {self.format(row[name])} -> {self.format(row[f'actual_{name}'])}"
+                for name in fields if self.differs(name, row[name], row[f'actual_{name}'])
+            )
+            self.stdout.write(f"Course {row['pk']} ({row['title']}): {changes}")
+        self.stdout.write(f"{len(course_ids)} course(s) drifted.")
+        if course_ids and not options['dry_run']:
+            Course.recompute_ratings(pk__in=course_ids)
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(course_ids)} course(s)."))
+
+    @staticmethod
+    def differs(name, stored, actual):
+        return abs(stored - actual) > TOLERANCE if name in AVERAGES else stored != actual
+
+    @staticmethod
+    def format(value):
+        return f'{value:.4f}' if isinstance(value, float) else str(value)
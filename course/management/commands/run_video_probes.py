@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from course.models import VideoProbeJob
+from course.probe import run_job
+
+
+class Command(BaseCommand):
+    help = "Probe lesson videos whose duration is still pending."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.VIDEO_PROBE_WORKERS)
+        parser.add_argument('--retry-failed', action='store_true', help="Also retry jobs that failed before.")
+
+    def handle(self, *args, **options):
+        # Jobs left "running" well past the timeout belong to a worker that died.
+        stuck_before = timezone.now() - timedelta(seconds=settings.VIDEO_PROBE_TIMEOUT * 2)
+        VideoProbeJob.objects.filter(status=VideoProbeJob.RUNNING, started_at__lt=stuck_before).update(
+            status=VideoProbeJob.PENDING,
+        )
+        if options['retry_failed']:
+            VideoProbeJob.objects.filter(status=VideoProbeJob.FAILED).update(status=VideoProbeJob.PENDING)
+
+        job_ids = list(VideoProbeJob.objects.filter(status=VideoProbeJob.PENDING).values_list('pk', flat=True))
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            list(executor.map(self.run, job_ids))
+
+        done = VideoProbeJob.objects.filter(pk__in=job_ids, status=VideoProbeJob.DONE).count()
+        self.stdout.write(self.style.SUCCESS(f"Probed {done}/{len(job_ids)} video(s)."))
+
+    @staticmethod
+    def run(job_id):
+        close_old_connections()
+        try:
+            run_job(job_id)
+        finally:
+            close_old_connections()
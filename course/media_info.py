@@ -0,0 +1,146 @@
+"""Read a video's duration straight from its container headers.
+
+MP4/MOV keep it in ``moov/mvhd`` and WebM/Matroska in the Segment ``Info``
+element, so only a few KB of the file are ever touched: the file is
+memory-mapped and boxes/elements we do not need are skipped by size.
+"""
+import mmap
+import struct
+
+MP4_CONTAINERS = {b'moov', b'mvex'}
+
+EBML_HEADER = 0x1A45DFA3
+EBML_SEGMENT = 0x18538067
+EBML_INFO = 0x1549A966
+EBML_TIMECODE_SCALE = 0x2AD7B1
+EBML_DURATION = 0x4489
+EBML_CLUSTER = 0x1F43B675
+
+
+class UnsupportedFormat(Exception):
+    pass
+
+
+def read_duration(path):
+    """Return the duration in seconds, or raise ``UnsupportedFormat``."""
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise UnsupportedFormat("empty file")
+        with data:
+            try:
+                if data[:4] == struct.pack('>I', EBML_HEADER):
+                    return _webm_duration(data)
+                if data[4:8] in (b'ftyp', b'moov', b'free', b'wide', b'mdat', b'skip'):
+                    return _mp4_duration(data)
+            except (struct.error, IndexError):
+                raise UnsupportedFormat("truncated file")
+    raise UnsupportedFormat("not an MP4/MOV or WebM/Matroska file")
+
+
+def _mp4_boxes(data, start, end):
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            raise UnsupportedFormat(f"corrupt {kind!r} box")
+        if offset + size > end:
+            raise UnsupportedFormat(f"truncated {kind!r} box")
+        yield kind, offset + header, offset + size
+        offset += size
+
+
+def _mp4_duration(data):
+    for kind, start, end in _mp4_boxes(data, 0, len(data)):
+        if kind == b'moov':
+            return _moov_duration(data, start, end)
+    raise UnsupportedFormat("no moov box")
+
+
+def _moov_duration(data, start, end):
+    timescale = duration = fragment_duration = None
+    for kind, box_start, box_end in _mp4_boxes(data, start, end):
+        if kind == b'mvhd':
+            version = data[box_start]
+            if version == 1:
+                timescale, duration = struct.unpack_from('>IQ', data, box_start + 20)
+            else:
+                timescale, duration = struct.unpack_from('>II', data, box_start + 12)
+        elif kind == b'mvex':
+            for child, child_start, _ in _mp4_boxes(data, box_start, box_end):
+                if child == b'mehd':
+                    fmt = '>Q' if data[child_start] == 1 else '>I'
+                    fragment_duration = struct.unpack_from(fmt, data, child_start + 4)[0]
+
+    # Fragmented files leave mvhd empty and carry the total in mvex/mehd.
+    duration = duration or fragment_duration
+    if not timescale or not duration or duration in (0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+        raise UnsupportedFormat("moov has no usable duration")
+    return duration / timescale
+
+
+def _ebml_vint(data, offset, keep_marker=False):
+    first = data[offset]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise UnsupportedFormat("invalid EBML variable-length integer")
+    value = first if keep_marker else first & (mask - 1)
+    unknown = value == mask - 1
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+        unknown = unknown and byte == 0xFF
+    return value, length, unknown
+
+
+def _ebml_elements(data, start, end):
+    offset = start
+    while offset < end:
+        element_id, id_length, _ = _ebml_vint(data, offset, keep_marker=True)
+        size, size_length, unknown = _ebml_vint(data, offset + id_length)
+        body = offset + id_length + size_length
+        body_end = end if unknown else min(body + size, end)
+        yield element_id, body, body_end, unknown
+        offset = body_end
+
+
+def _webm_duration(data):
+    for element_id, start, end, _ in _ebml_elements(data, 0, len(data)):
+        if element_id == EBML_SEGMENT:
+            return _segment_duration(data, start, end)
+    raise UnsupportedFormat("no Segment element")
+
+
+def _segment_duration(data, start, end):
+    for element_id, body, body_end, unknown in _ebml_elements(data, start, end):
+        if element_id == EBML_INFO:
+            return _info_duration(data, body, body_end)
+        if element_id == EBML_CLUSTER or unknown:
+            # Info always precedes the media data; past here we would be
+            # walking the whole file.
+            break
+    raise UnsupportedFormat("no Segment Info before the first Cluster")
+
+
+def _info_duration(data, start, end):
+    scale = 1000000
+    duration = None
+    for element_id, body, body_end, _ in _ebml_elements(data, start, end):
+        if element_id == EBML_TIMECODE_SCALE:
+            scale = int.from_bytes(data[body:body_end], 'big')
+        elif element_id == EBML_DURATION:
+            fmt = '>f' if body_end - body == 4 else '>d'
+            duration = struct.unpack_from(fmt, data, body)[0]
+    if not duration:
+        raise UnsupportedFormat("Segment Info has no Duration")
+    return duration * scale / 1e9
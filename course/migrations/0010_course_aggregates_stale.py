@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0009_comment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='aggregates_stale',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
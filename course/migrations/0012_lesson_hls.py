@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0011_videoprobejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='hls_playlist',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='hls_renditions',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-18 17:26
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    Course = apps.get_model('course', 'Course')
+    courses = Course.objects.annotate(
+        total=Sum('comments__rating'),
+        count=Count('comments'),
+        **{f'count_{n}': Count('comments', filter=Q(comments__rating=n)) for n in range(1, 6)},
+    )
+    for course in courses.iterator():
+        course.rating_sum = course.total or 0
+        course.num_reviews = course.count
+        course.rating = course.rating_sum / course.count if course.count else 0.0
+        for n in range(1, 6):
+            setattr(course, f'stars_{n}', getattr(course, f'count_{n}'))
+        course.save(update_fields=['rating_sum', 'num_reviews', 'rating', *(f'stars_{n}' for n in range(1, 6))])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0012_lesson_hls'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='stars_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='stars_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='stars_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='stars_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='stars_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 17:27
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+
+def backfill_scores(apps, schema_editor):
+    Course = apps.get_model('course', 'Course')
+    weight = settings.LEADERBOARD_PRIOR_WEIGHT
+    Course.objects.update(
+        score=(Cast(F('rating_sum'), FloatField()) + weight * settings.LEADERBOARD_PRIOR_MEAN) / (F('num_reviews') + weight),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0013_course_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='score',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-score', 'id'], name='course_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['category', '-score', 'id'], name='course_category_score_idx'),
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 18:05
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def backfill_students(apps, schema_editor):
+    Course = apps.get_model('course', 'Course')
+    for course in Course.objects.annotate(count=Count('courseview')).iterator():
+        if course.students != course.count:
+            course.students = course.count
+            course.save(update_fields=['students'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0016_comment_course_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_students, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0017_backfill_course_students'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='lesson',
+            options={'ordering': ['position', 'id']},
+        ),
+        migrations.AlterModelOptions(
+            name='module',
+            options={'ordering': ['position', 'id']},
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
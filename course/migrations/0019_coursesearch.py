@@ -0,0 +1,57 @@
+# Generated by Django 5.2 on 2026-10-18 18:05
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+from course import search
+
+
+class PostgresOnlyAddIndex(migrations.AddIndex):
+    """GIN indexes exist only on Postgres; elsewhere the state still
+    records the index but no SQL runs."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def create_fts_table(apps, schema_editor):
+    search.create_fts_table(schema_editor)
+
+
+def drop_fts_table(apps, schema_editor):
+    search.drop_fts_table(schema_editor)
+
+
+def backfill_search(apps, schema_editor):
+    models = {name: apps.get_model('course', name) for name in ('Course', 'CourseSearch', 'Lesson')}
+    search.index_courses(models['Course'].objects.values_list('pk', flat=True), models=models)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0018_module_lesson_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseSearch',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search', serialize=False, to='course.course')),
+                ('vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+            ],
+        ),
+        PostgresOnlyAddIndex(
+            model_name='coursesearch',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['vector'], name='course_search_vector_idx'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+        migrations.RunPython(backfill_search, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,21 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, DurationField, F, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf
 from datetime import timedelta
 from django.conf import settings
-from moviepy.editor import VideoFileClip
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
+
+from .caching import EPOCH, bump_on_commit, course_namespace
+from .instrumentation import section
 
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     image = models.ImageField(upload_to='category_images/', blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -26,12 +34,40 @@ class Course(models.Model):
     slug = models.SlugField(unique=True, null=True, blank=True)
     lesson_count = models.PositiveIntegerField(default=0)
     module_count = models.PositiveIntegerField(default=0)
+    aggregates_stale = models.BooleanField(default=False, db_index=True)
+    rating_sum = models.PositiveIntegerField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    score = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    # Maintained from lesson, module, enrollment and comment writes; never
+    # set directly through forms or the API.
+    AGGREGATE_FIELDS = (
+        'students', 'duration', 'lesson_count', 'module_count', 'aggregates_stale',
+        'rating', 'num_reviews', 'rating_sum', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5', 'score',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', 'id'], name='course_score_idx'),
+            models.Index(fields=['category', '-score', 'id'], name='course_category_score_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            weight = settings.LEADERBOARD_PRIOR_WEIGHT
+            self.score = (self.rating_sum + weight * settings.LEADERBOARD_PRIOR_MEAN) / (self.num_reviews + weight)
+        super().save(*args, **kwargs)
+
     def students_count(self):
-        return self.courseview_set.count()
+        return self.students
 
     def get_duration_parts(self):
         total_seconds = int(self.duration.total_seconds())
@@ -39,18 +75,112 @@ class Course(models.Model):
         minutes = (total_seconds % 3600) // 60
         return {'hours': hours, 'minutes': minutes}
 
-    def update_course_info(self):
-        self.lesson_count = sum(module.lessons.count() for module in self.modules.all())
-        self.module_count = self.modules.count()
-
-        total_duration = timedelta()
-        for module in self.modules.all():
-            for lesson in module.lessons.all():
-                if lesson.duration:
-                    total_duration += lesson.duration
+    def rating_histogram(self):
+        return {stars: getattr(self, f'stars_{stars}') for stars in range(1, 6)}
 
-        self.duration = total_duration
-        self.save(update_fields=['duration', 'lesson_count', 'module_count'])
+    def update_course_info(self):
+        Course.recompute(pk=self.pk)
+        self.refresh_from_db(fields=['duration', 'lesson_count', 'module_count'])
+
+    @classmethod
+    def recompute(cls, **filters):
+        # One UPDATE with correlated subqueries, so the totals are computed
+        # and written atomically no matter how many modules a course has.
+        bump_on_commit('course', *cls.version_namespaces(filters))
+        modules = Module.objects.filter(course=OuterRef('pk')).order_by().values('course')
+        lessons = Lesson.objects.filter(module__course=OuterRef('pk')).order_by().values('module__course')
+        views = CourseView.objects.filter(course=OuterRef('pk')).order_by().values('course')
+        with section('recompute'):
+            return cls.objects.filter(**filters).update(
+                students=Coalesce(Subquery(views.annotate(n=Count('pk')).values('n')), 0),
+                module_count=Coalesce(Subquery(modules.annotate(n=Count('pk')).values('n')), 0),
+                lesson_count=Coalesce(Subquery(lessons.annotate(n=Count('pk')).values('n')), 0),
+                duration=Coalesce(
+                    Subquery(lessons.annotate(total=Sum('duration')).values('total'), output_field=DurationField()),
+                    Value(timedelta()),
+                ),
+                aggregates_stale=False,
+            )
+
+    @staticmethod
+    def version_namespaces(filters):
+        """Per-course namespaces an update over ``filters`` touches; any
+        filter other than a pk invalidates every course."""
+        if 'pk' in filters:
+            return [course_namespace(filters['pk'])]
+        if 'pk__in' in filters:
+            return [course_namespace(pk) for pk in filters['pk__in']]
+        return [EPOCH]
+
+    @staticmethod
+    def score_expression(rating_sum, num_reviews):
+        # Bayesian average: every course starts with LEADERBOARD_PRIOR_WEIGHT
+        # virtual reviews at LEADERBOARD_PRIOR_MEAN, so one 5-star review
+        # does not outrank a hundred 4.8s. The prior is a fixed setting,
+        # which keeps each update local to the course being reviewed.
+        weight = settings.LEADERBOARD_PRIOR_WEIGHT
+        prior = weight * settings.LEADERBOARD_PRIOR_MEAN
+        return (Cast(rating_sum, FloatField()) + prior) / (num_reviews + weight)
+
+    @classmethod
+    def ranked(cls, category=None):
+        courses = cls.objects.order_by('-score', 'id')
+        if category is not None:
+            courses = courses.filter(category=category)
+        return courses
+
+    @classmethod
+    def recompute_ratings(cls, **filters):
+        bump_on_commit('comment')
+        comments = Comment.objects.filter(course=OuterRef('pk')).order_by().values('course')
+
+        def comment_total(aggregate):
+            return Coalesce(Subquery(comments.annotate(value=aggregate).values('value')), 0)
+
+        rating_sum = comment_total(Sum('rating'))
+        num_reviews = comment_total(Count('pk'))
+        with section('recompute_ratings'):
+            return cls.objects.filter(**filters).update(
+                rating_sum=rating_sum,
+                num_reviews=num_reviews,
+                rating=Coalesce(Cast(rating_sum, FloatField()) / NullIf(num_reviews, 0), 0.0),
+                score=cls.score_expression(rating_sum, num_reviews),
+                **{f'stars_{stars}': comment_total(Count('pk', filter=Q(rating=stars))) for stars in range(1, 6)},
+            )
+
+    @classmethod
+    def apply_rating_delta(cls, course_id, rating, count):
+        # Every right-hand side below reads the pre-update row, so the
+        # average is derived from the same sum/count being written.
+        rating_sum = F('rating_sum') + rating * count
+        num_reviews = F('num_reviews') + count
+        cls.objects.filter(pk=course_id).update(
+            rating_sum=rating_sum,
+            num_reviews=num_reviews,
+            rating=Coalesce(Cast(rating_sum, FloatField()) / NullIf(num_reviews, 0), 0.0),
+            score=cls.score_expression(rating_sum, num_reviews),
+            **{f'stars_{rating}': F(f'stars_{rating}') + count},
+        )
+
+    @classmethod
+    def apply_delta(cls, course_id, lessons=0, modules=0, duration=None, students=0):
+        changes = {}
+        if students:
+            changes['students'] = Greatest(F('students') + students, 0)
+        if lessons:
+            changes['lesson_count'] = Greatest(F('lesson_count') + lessons, 0)
+        if modules:
+            changes['module_count'] = Greatest(F('module_count') + modules, 0)
+        if duration:
+            changes['duration'] = F('duration') + duration
+        if changes:
+            cls.objects.filter(pk=course_id).update(**changes)
+
+
+def writes(save_kwargs, field):
+    """Whether a ``save(**save_kwargs)`` call writes ``field``."""
+    update_fields = save_kwargs.get('update_fields')
+    return update_fields is None or field in update_fields
 
 
 class Teachers(models.Model):
@@ -65,14 +195,51 @@ class Teachers(models.Model):
 class Module(models.Model):
     course = models.ForeignKey('Course', on_delete=models.CASCADE, related_name='modules')
     title = models.CharField(max_length=255)
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['position', 'id']
 
     def __str__(self):
         return self.title
 
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        old_course_id = None
+        if self.pk:
+            # Locked so a concurrent move cannot apply the same delta twice.
+            old_course_id = (
+                Module.objects.select_for_update(of=('self',))
+                .filter(pk=self.pk).values_list('course_id', flat=True).first()
+            )
+        super().save(*args, **kwargs)
+        bump_on_commit(*{course_namespace(pk) for pk in (self.course_id, old_course_id) if pk})
+
+        if old_course_id is None:
+            Course.apply_delta(self.course_id, modules=1)
+        elif old_course_id != self.course_id and writes(kwargs, 'course'):
+            totals = self.lesson_totals()
+            Course.apply_delta(old_course_id, modules=-1, lessons=-totals['count'], duration=-totals['duration'])
+            Course.apply_delta(self.course_id, modules=1, lessons=totals['count'], duration=totals['duration'])
+
+    @transaction.atomic
     def delete(self, *args, **kwargs):
-        course = self.course
-        super().delete(*args, **kwargs)
-        course.update_course_info()
+        # The module row blocks lessons being added or moved in, the lesson
+        # rows block edits and moves out, until the totals are subtracted.
+        course_id = Module.objects.select_for_update().filter(pk=self.pk).values_list('course_id', flat=True).first()
+        if course_id is None:
+            return 0, {}
+        self.course_id = course_id
+        list(self.lessons.select_for_update().values_list('pk', flat=True))
+        totals = self.lesson_totals()
+        result = super().delete(*args, **kwargs)
+        bump_on_commit(course_namespace(course_id))
+        Course.apply_delta(course_id, modules=-1, lessons=-totals['count'], duration=-totals['duration'])
+        return result
+
+    def lesson_totals(self):
+        totals = self.lessons.aggregate(count=Count('pk'), duration=Sum('duration'))
+        return {'count': totals['count'], 'duration': totals['duration'] or timedelta()}
 
 
 class Lesson(models.Model):
@@ -80,33 +247,156 @@ class Lesson(models.Model):
     title = models.CharField(max_length=200)
     video = models.FileField(upload_to='videos/')
     duration = models.DurationField(blank=True, null=True)
+    hls_playlist = models.CharField(max_length=255, blank=True)
+    hls_renditions = models.JSONField(default=list, blank=True)
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['position', 'id']
 
     def __str__(self):
         return self.title
 
+    @transaction.atomic
     def save(self, *args, **kwargs):
+        old = self.stored_state() if self.pk else None
+        if self.video and not self.video._committed:
+            # A fresh upload: the background probe fills the duration in and
+            # `manage.py package_hls` rebuilds the stream ladder.
+            self.duration = None
+            self.hls_playlist = ''
+            self.hls_renditions = []
+        elif old is not None and self.duration is None:
+            # Same video: a duration the probe stored since this instance
+            # was loaded must not be overwritten with the stale None.
+            self.duration = old['duration']
         super().save(*args, **kwargs)
 
-        if self.video:
-            try:
-                clip = VideoFileClip(self.video.path)
-                self.duration = timedelta(seconds=int(clip.duration))
-
-                clip.reader.close()
-                if clip.audio:
-                    clip.audio.reader.close_proc()
-
-                super().save(update_fields=['duration'])
-
-            except Exception as e:
-                print(f"Xatolik video duration olishda: {e}")
+        course_id = self.module.course_id
+        bump_on_commit(*{course_namespace(pk) for pk in (course_id, old and old['module__course_id']) if pk})
+        old_duration = (old['duration'] or timedelta()) if old else timedelta()
+        duration = (self.duration or timedelta()) if writes(kwargs, 'duration') else old_duration
+        if old is None:
+            Course.apply_delta(course_id, lessons=1, duration=duration)
+        elif old['module__course_id'] != course_id and writes(kwargs, 'module'):
+            Course.apply_delta(old['module__course_id'], lessons=-1, duration=-old_duration)
+            Course.apply_delta(course_id, lessons=1, duration=duration)
+        else:
+            Course.apply_delta(old['module__course_id'], duration=duration - old_duration)
+
+        if self.video and self.duration is None:
+            VideoProbeJob.enqueue(self)
+
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        old = self.stored_state()
+        result = super().delete(*args, **kwargs)
+        if old is not None:
+            bump_on_commit(course_namespace(old['module__course_id']))
+            Course.apply_delta(old['module__course_id'], lessons=-1, duration=-(old['duration'] or timedelta()))
+        return result
+
+    def stored_state(self):
+        # Locked like `set_duration`, so a probe finishing concurrently is
+        # either fully before or fully after this write.
+        return (
+            Lesson.objects.select_for_update(of=('self',))
+            .filter(pk=self.pk).values('module__course_id', 'duration').first()
+        )
+
+    @transaction.atomic
+    def set_duration(self, duration):
+        old = (
+            Lesson.objects.select_for_update(of=('self',))
+            .filter(pk=self.pk)
+            .values('module__course_id', 'duration')
+            .first()
+        )
+        if old is None:
+            return
+        Lesson.objects.filter(pk=self.pk).update(duration=duration)
+        bump_on_commit('course', course_namespace(old['module__course_id']))
+        Course.apply_delta(old['module__course_id'], duration=(duration or timedelta()) - (old['duration'] or timedelta()))
+        self.duration = duration
+
+
+class VideoProbeJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    lesson = models.OneToOneField(Lesson, on_delete=models.CASCADE, related_name='probe_job')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
 
-        self.module.course.update_course_info()
+    def __str__(self):
+        return f"{self.lesson} - {self.status}"
+
+    @classmethod
+    def enqueue(cls, lesson):
+        job, created = cls.objects.get_or_create(lesson=lesson)
+        if not created:
+            # A running probe is left alone: flipping it back to pending
+            # would let a second worker claim the same video.
+            requeued = cls.objects.filter(pk=job.pk).exclude(status=cls.RUNNING).update(
+                status=cls.PENDING, error='', started_at=None, finished_at=None,
+            )
+            if not requeued:
+                return job
+        from .probe import submit
+        transaction.on_commit(lambda: submit(job.pk))
+        return job
+
+    @classmethod
+    def enqueue_many(cls, lessons):
+        """``enqueue`` for a batch of lessons, in a fixed number of queries."""
+        lesson_ids = [lesson.pk for lesson in lessons]
+        cls.objects.bulk_create([cls(lesson_id=pk) for pk in lesson_ids], ignore_conflicts=True)
+        # Locked, so a worker cannot claim a job between the read and the
+        # requeue; running probes are left alone as in `enqueue`.
+        job_ids = list(
+            cls.objects.select_for_update().filter(lesson_id__in=lesson_ids)
+            .exclude(status=cls.RUNNING).values_list('pk', flat=True)
+        )
+        cls.objects.filter(pk__in=job_ids).update(status=cls.PENDING, error='', started_at=None, finished_at=None)
+        from .probe import submit
+        for pk in job_ids:
+            transaction.on_commit(lambda pk=pk: submit(pk))
+        return job_ids
+
+    def claim(self):
+        claimed = VideoProbeJob.objects.filter(pk=self.pk, status=self.PENDING).update(
+            status=self.RUNNING, attempts=F('attempts') + 1, started_at=timezone.now(),
+        )
+        return bool(claimed)
+
+    def finish(self, error=''):
+        self.status = self.FAILED if error else self.DONE
+        self.error = error
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'error', 'finished_at'])
+
+
+class CourseSearch(models.Model):
+    """Postgres search document for a course, kept out of `course_course`
+    so catalog queries never load it. SQLite uses an FTS5 table instead
+    (see `course.search`)."""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='search')
+    vector = SearchVectorField(null=True)
 
-    def delete(self, *args, **kwargs):
-        course = self.module.course
-        super().delete(*args, **kwargs)
-        course.update_course_info()
+    class Meta:
+        indexes = [GinIndex(fields=['vector'], name='course_search_vector_idx')]
 
 
 class CourseView(models.Model):
@@ -116,10 +406,35 @@ class CourseView(models.Model):
 
     class Meta:
         unique_together = ('user', 'course')
+        indexes = [
+            models.Index(fields=['-viewed_at', '-id'], name='courseview_viewed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} viewed {self.course}"
 
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        old_course_id = self.stored_course_id() if self.pk else None
+        super().save(*args, **kwargs)
+        if old_course_id != self.course_id:
+            if old_course_id is not None:
+                Course.apply_delta(old_course_id, students=-1)
+            Course.apply_delta(self.course_id, students=1)
+
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        # The post_delete receiver takes the student off, for cascades and
+        # queryset deletes too; it must see the stored course.
+        self.course_id = self.stored_course_id()
+        if self.course_id is None:
+            return 0, {}
+        return super().delete(*args, **kwargs)
+
+    def stored_course_id(self):
+        # Locked so two concurrent writes cannot both move the same row.
+        return CourseView.objects.select_for_update().filter(pk=self.pk).values_list('course_id', flat=True).first()
+
 
 class Comment(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='comments')
@@ -128,5 +443,35 @@ class Comment(models.Model):
     rating = models.PositiveSmallIntegerField(choices=[(i, i) for i in range(1, 6)])
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='comment_created_idx'),
+            models.Index(fields=['course', '-created_at', '-id'], name='comment_course_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user} - {self.rating}⭐"
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        old = self.stored_state() if self.pk else None
+        super().save(*args, **kwargs)
+
+        if old != {'course_id': self.course_id, 'rating': int(self.rating)}:
+            if old is not None:
+                Course.apply_rating_delta(old['course_id'], old['rating'], -1)
+            Course.apply_rating_delta(self.course_id, int(self.rating), 1)
+
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        # The post_delete receiver takes the rating off, for cascades and
+        # queryset deletes too; it must see the stored values.
+        old = self.stored_state()
+        if old is None:
+            return 0, {}
+        self.course_id, self.rating = old['course_id'], old['rating']
+        return super().delete(*args, **kwargs)
+
+    def stored_state(self):
+        # Locked so two concurrent edits cannot both subtract the same rating.
+        return Comment.objects.select_for_update().filter(pk=self.pk).values('course_id', 'rating').first()
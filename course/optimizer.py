@@ -0,0 +1,94 @@
+"""Derive select_related/prefetch_related/only from a serializer.
+
+The serializer's field tree says which relations it will walk for every
+row. Joining or prefetching those up front keeps a list endpoint at a
+constant number of queries whatever the page size.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+class QueryPlan:
+    def __init__(self):
+        self.select = set()
+        self.prefetch = set()
+        # None once a field reads something .only() cannot express.
+        self.columns = set()
+
+    def apply(self, queryset, ordering=()):
+        if self.select:
+            queryset = queryset.select_related(*sorted(self.select))
+        if self.prefetch:
+            queryset = queryset.prefetch_related(*sorted(self.prefetch))
+        if self.columns is not None:
+            concrete = {field.name for field in queryset.model._meta.concrete_fields}
+            if not self.columns >= concrete:
+                queryset = queryset.only('pk', *self.columns, *ordering)
+        return queryset
+
+
+def reads_pk_only(field):
+    if isinstance(field, serializers.ManyRelatedField):
+        return False
+    return isinstance(field, serializers.RelatedField) and field.use_pk_only_optimization()
+
+
+def nested_fields(field):
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    if isinstance(field, serializers.ManyRelatedField):
+        return None
+    return field.fields.values() if isinstance(field, serializers.Serializer) else None
+
+
+def plan(fields, model, query_plan=None, prefix='', many=False):
+    """Walk ``fields`` against ``model``. Under a to-many relation every
+    further hop is prefetched too, so each level costs one query."""
+    query_plan = query_plan or QueryPlan()
+    top = not prefix
+    for field in fields:
+        if field.source == '*' or isinstance(field, serializers.SerializerMethodField):
+            if top:
+                query_plan.columns = None
+            continue
+
+        attrs = field.source.split('.')
+        current, path, to_many = model, [], many
+        for attr in attrs:
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                if top and not path:
+                    query_plan.columns = None  # a property or method
+                break
+            if top and not path and model_field.concrete and query_plan.columns is not None:
+                query_plan.columns.add(model_field.name)
+            if not model_field.is_relation:
+                break
+
+            path.append(attr)
+            last = len(path) == len(attrs)
+            if last and reads_pk_only(field):
+                break
+            lookup = prefix + '__'.join(path)
+            to_many = to_many or model_field.many_to_many or model_field.one_to_many
+            (query_plan.prefetch if to_many else query_plan.select).add(lookup)
+            if last:
+                children = nested_fields(field)
+                if children is not None:
+                    plan(children, model_field.related_model, query_plan, lookup + '__', to_many)
+            current = model_field.related_model
+    return query_plan
+
+
+class QuerysetOptimizerMixin:
+    """Apply the serializer's query plan to read requests."""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        # The keyset paginator reads the ordering columns off each row.
+        ordering = [name.lstrip('-') for name in getattr(self, 'cursor_ordering', ('id',))]
+        return plan(self.get_serializer().fields.values(), queryset.model).apply(queryset, ordering)
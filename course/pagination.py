@@ -0,0 +1,130 @@
+"""Keyset pagination for the list APIs.
+
+Unlike DRF's CursorPagination, which only seeks on the first ordering field
+and falls back to OFFSET inside runs of equal values, the cursor here holds
+the value of *every* ordering field of the boundary row. Each page is a
+single ``WHERE a >= x AND (a > x OR a = x AND b > y) ORDER BY a, b LIMIT n``
+walk along an index, so page 1000 costs the same as page 1 even when the
+leading field (a course's score, say) has lots of ties. The OR expansion
+stands in for a ``(a, b) > (x, y)`` row comparison, which cannot express
+mixed directions such as ``-score, id``; the redundant bound on ``a`` is
+what lets the planner start an index range scan at the cursor. Orderings
+must end in a unique field.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    ordering = ('id',)
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return settings.API_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(getattr(view, 'cursor_ordering', None) or self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = [queryset.model._meta.get_field(order.lstrip('-')) for order in self.ordering]
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor['reverse'])
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor:
+            queryset = queryset.filter(seek(ordering, self.cursor['position']))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor({'position': self.position(self.page[-1]), 'reverse': False})
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor({'position': self.position(self.page[0]), 'reverse': True})
+
+    def position(self, instance):
+        return [getattr(instance, field.attname) for field in self.fields]
+
+    def encode_cursor(self, cursor):
+        encoded = encode_position(cursor['position'], cursor['reverse'])
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position, reverse = decode_position(encoded, self.fields)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        return {'position': position, 'reverse': reverse}
+
+
+def seek(ordering, position):
+    """Filter for the rows that come after ``position`` in ``ordering``."""
+    # (a, b, c) after (x, y, z)  ==  a > x  OR  a = x AND b > y  OR ...
+    condition = Q()
+    equal = {}
+    for order, value in zip(ordering, position):
+        name = order.lstrip('-')
+        lookup = 'lt' if order.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    first = ordering[0]
+    bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": position[0]})
+    return bound & condition
+
+
+def encode_position(values, reverse=False):
+    """Opaque URL-safe token for the ordering values of a boundary row."""
+    position = []
+    for value in values:
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        position.append(value)
+    payload = json.dumps([position, int(reverse)], separators=(',', ':'))
+    return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_position(encoded, fields):
+    """Inverse of ``encode_position``; raises ValueError on any tampering."""
+    try:
+        position, reverse = json.loads(urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+        if len(position) != len(fields) or None in position:
+            raise ValueError
+        return [field.to_python(value) for field, value in zip(fields, position)], bool(reverse)
+    except (TypeError, ValueError, ValidationError):
+        raise ValueError(f"invalid cursor {encoded!r}")
@@ -0,0 +1,120 @@
+import logging
+import re
+import shutil
+import struct
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .instrumentation import section
+from .media_info import UnsupportedFormat, read_duration
+from .models import VideoProbeJob
+
+logger = logging.getLogger(__name__)
+
+DURATION_RE = re.compile(rb"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+
+
+class ProbeError(Exception):
+    pass
+
+
+def probe_duration(path, timeout=None):
+    """Return a video's duration as a whole-second timedelta.
+
+    MP4/MOV and WebM are answered from their headers. Anything else goes to
+    ffprobe (or ``ffmpeg -i`` when ffprobe is not installed) in a child
+    process that is killed if it runs past ``timeout`` seconds, so a stalled
+    decoder can never hold a worker forever.
+    """
+    with section('video_probe'):
+        try:
+            seconds = read_duration(path)
+        except (UnsupportedFormat, OSError, struct.error, IndexError):
+            seconds = _subprocess_duration(path, timeout or settings.VIDEO_PROBE_TIMEOUT)
+    return timedelta(seconds=int(seconds))
+
+
+def _subprocess_duration(path, timeout):
+    ffprobe = shutil.which('ffprobe')
+    if ffprobe:
+        command = [ffprobe, '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', path]
+    else:
+        import imageio_ffmpeg
+        command = [imageio_ffmpeg.get_ffmpeg_exe(), '-hide_banner', '-nostdin', '-i', path]
+
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise ProbeError(f"{command[0]} did not finish within {timeout}s")
+
+    if ffprobe:
+        try:
+            return float(result.stdout.strip())
+        except ValueError:
+            raise ProbeError(result.stderr.decode(errors='replace').strip() or "ffprobe reported no duration")
+
+    match = DURATION_RE.search(result.stderr)
+    if not match:
+        lines = result.stderr.decode(errors='replace').strip().splitlines()
+        raise ProbeError(lines[-1] if lines else "ffmpeg reported no duration")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def run_job(job_id):
+    job = VideoProbeJob.objects.select_related('lesson').filter(pk=job_id).first()
+    if job is None or not job.claim():
+        return
+
+    try:
+        duration = probe_duration(job.lesson.video.path)
+    except Exception as e:
+        logger.warning("Video probe failed for lesson %s: %s", job.lesson_id, e)
+        job.finish(error=str(e))
+        return
+
+    job.lesson.set_duration(duration)
+    job.finish()
+
+
+def submit(job_id):
+    """Hand a job to the bounded worker pool.
+
+    When every slot is taken the job simply stays pending in the table and
+    `manage.py run_video_probes` picks it up later.
+    """
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        return False
+    executor.submit(_run_in_worker, job_id, slots)
+    return True
+
+
+def _run_in_worker(job_id, slots):
+    close_old_connections()
+    try:
+        run_job(job_id)
+    except Exception:
+        logger.exception("Video probe job %s crashed", job_id)
+    finally:
+        close_old_connections()
+        slots.release()
+
+
+def _get_executor():
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            workers = settings.VIDEO_PROBE_WORKERS
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='video-probe')
+            _slots = threading.BoundedSemaphore(workers + settings.VIDEO_PROBE_QUEUE_SIZE)
+        return _executor, _slots
@@ -0,0 +1,188 @@
+"""Full-text course search over title, category, lesson titles and
+description, in that order of weight.
+
+Postgres keeps a tsvector per course in ``CourseSearch`` (GIN-indexed)
+and ranks with ts_rank. SQLite keeps an FTS5 table, ``course_search``,
+keyed by course id and ranked with bm25. Other databases fall back to an
+unranked ``icontains`` scan.
+
+Documents are refreshed per course once the writing transaction commits,
+so a burst of lesson saves costs one refresh.
+"""
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, TextField, Value, When
+from django.db.models.functions import Coalesce
+
+FTS_TABLE = 'course_search'
+# bm25 weights, in FTS_TABLE column order.
+FTS_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+TOKEN_RE = re.compile(r'\w+')
+CHUNK_SIZE = 500
+
+_local = threading.local()
+
+
+def tokens(query):
+    return TOKEN_RE.findall(query.lower())[:16]
+
+
+def search(query, limit=None):
+    """Courses matching every word of ``query`` (as a prefix), best first."""
+    from .models import Course
+
+    limit = limit or settings.SEARCH_MAX_RESULTS
+    words = tokens(query)
+    if not words:
+        return Course.objects.none()
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        ts_query = SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw', config=settings.SEARCH_CONFIG)
+        return (
+            Course.objects.filter(search__vector=ts_query)
+            .annotate(rank=SearchRank(F('search__vector'), ts_query))
+            .order_by('-rank', '-score', 'id')[:limit]
+        )
+
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{word}"*' for word in words)
+        weights = ', '.join(map(str, FTS_WEIGHTS))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s',
+                [match, limit],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return Course.objects.none()
+        order = Case(*(When(pk=pk, then=Value(i)) for i, pk in enumerate(ids)), output_field=IntegerField())
+        return Course.objects.filter(pk__in=ids).order_by(order)
+
+    matches = Q()
+    for word in words:
+        matches &= (
+            Q(title__icontains=word) | Q(category__name__icontains=word)
+            | Q(description__icontains=word) | Q(modules__lessons__title__icontains=word)
+        )
+    ids = Course.objects.filter(matches).values('pk')
+    return Course.objects.filter(pk__in=ids).order_by('-score', 'id')[:limit]
+
+
+def schedule(course_ids=(), module_ids=()):
+    """Refresh these courses' documents when the current transaction
+    commits. Ids pile up per thread, and the first commit hook to run
+    takes them all."""
+    if not hasattr(_local, 'courses'):
+        _local.courses, _local.modules = set(), set()
+    _local.courses.update(course_ids)
+    _local.modules.update(module_ids)
+    transaction.on_commit(flush)
+
+
+def flush():
+    courses, modules = getattr(_local, 'courses', set()), getattr(_local, 'modules', set())
+    if not courses and not modules:
+        return
+    _local.courses, _local.modules = set(), set()
+    if modules:
+        from .models import Module
+
+        courses |= set(Module.objects.filter(pk__in=modules).values_list('course_id', flat=True))
+    index_courses(courses)
+
+
+def index_courses(course_ids, models=None):
+    """Rebuild the search documents of ``course_ids``; ids of deleted
+    courses drop out. ``models`` lets migrations pass historical models."""
+    if models is None:
+        from .models import Course, CourseSearch, Lesson
+        models = {'Course': Course, 'CourseSearch': CourseSearch, 'Lesson': Lesson}
+    course_ids = sorted(set(course_ids))
+    for start in range(0, len(course_ids), CHUNK_SIZE):
+        chunk = course_ids[start:start + CHUNK_SIZE]
+        if connection.vendor == 'postgresql':
+            _index_postgres(chunk, models)
+        elif connection.vendor == 'sqlite':
+            _index_fts(chunk, models)
+
+
+def rebuild():
+    """Drop every search document and index all courses again."""
+    from .models import Course, CourseSearch
+
+    with transaction.atomic():
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        else:
+            CourseSearch.objects.all().delete()
+        ids = list(Course.objects.values_list('pk', flat=True))
+        index_courses(ids)
+    return len(ids)
+
+
+def _index_postgres(course_ids, models):
+    from django.contrib.postgres.aggregates import StringAgg
+    from django.contrib.postgres.search import SearchVector
+
+    Course, CourseSearch, Lesson = models['Course'], models['CourseSearch'], models['Lesson']
+    existing = list(Course.objects.filter(pk__in=course_ids).values_list('pk', flat=True))
+    CourseSearch.objects.filter(course_id__in=course_ids).exclude(course_id__in=existing).delete()
+    CourseSearch.objects.bulk_create([CourseSearch(course_id=pk) for pk in existing], ignore_conflicts=True)
+
+    course = Course.objects.filter(pk=OuterRef('course_id'))
+    lessons = (
+        Lesson.objects.filter(module__course=OuterRef('course_id')).order_by()
+        .values('module__course').annotate(text=StringAgg('title', ' ')).values('text')
+    )
+    config = settings.SEARCH_CONFIG
+
+    def weighted(expression, weight):
+        text = Coalesce(Subquery(expression, output_field=TextField()), Value(''))
+        return SearchVector(text, weight=weight, config=config)
+
+    CourseSearch.objects.filter(course_id__in=existing).update(vector=(
+        weighted(course.values('title'), 'A')
+        + weighted(course.values('category__name'), 'B')
+        + weighted(lessons, 'C')
+        + weighted(course.values('description'), 'D')
+    ))
+
+
+def _index_fts(course_ids, models):
+    Course, Lesson = models['Course'], models['Lesson']
+    lessons = defaultdict(list)
+    for course_id, title in Lesson.objects.filter(module__course__in=course_ids).values_list('module__course_id', 'title'):
+        lessons[course_id].append(title)
+    rows = [
+        (pk, title, category or '', ' '.join(lessons[pk]), description or '')
+        for pk, title, category, description in Course.objects.filter(pk__in=course_ids).values_list(
+            'pk', 'title', 'category__name', 'description',
+        )
+    ]
+    placeholders = ', '.join(['%s'] * len(course_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', course_ids)
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, category, lessons, description) VALUES (%s, %s, %s, %s, %s)', rows,
+        )
+
+
+def create_fts_table(schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(title, category, lessons, description, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_fts_table(schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
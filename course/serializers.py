@@ -1,46 +1,97 @@
+import os
+
+from django.urls import reverse
 from rest_framework import serializers
+from .fieldsets import SparseFieldsMixin
 from .models import Course, Teachers, Category, Lesson, CourseView, Comment, Module
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
 
 
-class CourseSerializer(serializers.ModelSerializer):
-    average_rating = serializers.FloatField(read_only=True)
+class CourseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    average_rating = serializers.FloatField(source='rating', read_only=True)
 
     class Meta:
         model = Course
         fields = '__all__'
+        read_only_fields = Course.AGGREGATE_FIELDS
+
+
+class CourseListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """What a catalog card needs; `CourseSerializer` has the rest."""
+
+    class Meta:
+        model = Course
+        fields = [
+            'id', 'slug', 'title', 'image', 'category', 'price', 'rating', 'num_reviews', 'score',
+            'students', 'lesson_count', 'duration',
+        ]
 
 
-class TeacherSerializer(serializers.ModelSerializer):
+class TeacherSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Teachers
         fields = '__all__'
 
 
-class ModuleSerializer(serializers.ModelSerializer):
+class ModuleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Module
         fields = '__all__'
 
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Lesson
         fields = '__all__'
 
 
-class CourseViewSerializer(serializers.ModelSerializer):
+class CurriculumLessonSerializer(serializers.ModelSerializer):
+    # Relative URLs only: the rendered curriculum is cached and shared
+    # between requests.
+    video_url = serializers.SerializerMethodField()
+    hls_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Lesson
+        fields = ['id', 'title', 'position', 'duration', 'video_url', 'hls_url']
+
+    def get_video_url(self, lesson):
+        return reverse('course:lesson_video', args=[self.context['slug'], lesson.pk])
+
+    def get_hls_url(self, lesson):
+        if not lesson.hls_playlist:
+            return None
+        return reverse('course:lesson_hls', args=[self.context['slug'], lesson.pk, os.path.basename(lesson.hls_playlist)])
+
+
+class CurriculumModuleSerializer(serializers.ModelSerializer):
+    lessons = CurriculumLessonSerializer(many=True)
+
+    class Meta:
+        model = Module
+        fields = ['id', 'title', 'position', 'lessons']
+
+
+class CurriculumSerializer(serializers.ModelSerializer):
+    modules = CurriculumModuleSerializer(many=True)
+
+    class Meta:
+        model = Course
+        fields = ['id', 'slug', 'title', 'duration', 'module_count', 'lesson_count', 'modules']
+
+
+class CourseViewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = CourseView
         fields = '__all__'
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
 
     class Meta:
@@ -0,0 +1,74 @@
+from django.db.models.signals import post_delete, post_save
+
+from . import search
+from .caching import ENROLLMENT, bump_on_commit, course_namespace
+from .models import Category, Comment, Course, CourseView, Lesson, Module, Teachers
+
+# Modules and lessons feed the course counters and duration shown on cards.
+NAMESPACE_BY_MODEL = {
+    Course: 'course',
+    Module: 'course',
+    Lesson: 'course',
+    Category: 'category',
+    Comment: 'comment',
+    Teachers: 'teacher',
+    CourseView: ENROLLMENT,
+}
+
+
+def reindex_course(sender, instance, **kwargs):
+    search.schedule(course_ids=[instance.pk])
+
+
+def reindex_category(sender, instance, **kwargs):
+    search.schedule(course_ids=instance.courses.values_list('pk', flat=True))
+
+
+def reindex_module(sender, instance, **kwargs):
+    search.schedule(course_ids=[instance.course_id])
+
+
+def reindex_lesson(sender, instance, **kwargs):
+    search.schedule(module_ids=[instance.module_id])
+
+
+def remove_rating(sender, instance, **kwargs):
+    Course.apply_rating_delta(instance.course_id, int(instance.rating), -1)
+
+
+def remove_student(sender, instance, **kwargs):
+    Course.apply_delta(instance.course_id, students=-1)
+
+
+def bump_cache_version(sender, **kwargs):
+    bump_on_commit(NAMESPACE_BY_MODEL[sender])
+
+
+def bump_course_version(sender, instance, **kwargs):
+    # Modules and lessons bump their course's counter from their own
+    # save()/delete(), where a move's old course is known.
+    bump_on_commit(course_namespace(instance.pk))
+
+
+# Connected ahead of the version bumps so the search index is refreshed
+# before cached search results are invalidated.
+post_save.connect(reindex_course, sender=Course)
+post_delete.connect(reindex_course, sender=Course)
+post_save.connect(bump_course_version, sender=Course)
+post_delete.connect(bump_course_version, sender=Course)
+post_save.connect(reindex_category, sender=Category)
+post_save.connect(reindex_module, sender=Module)
+post_delete.connect(reindex_module, sender=Module)
+post_save.connect(reindex_lesson, sender=Lesson)
+post_delete.connect(reindex_lesson, sender=Lesson)
+
+# Receivers rather than delete() overrides, so cascades (deleting a user)
+# and queryset deletes keep the course counters right as well.
+post_delete.connect(remove_rating, sender=Comment)
+post_delete.connect(remove_student, sender=CourseView)
+
+# Connected per model: a catch-all receiver would disable fast deletes for
+# every model in the project.
+for model in NAMESPACE_BY_MODEL:
+    post_save.connect(bump_cache_version, sender=model)
+    post_delete.connect(bump_cache_version, sender=model)
@@ -0,0 +1,122 @@
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.urls import re_path
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+BLOCK_SIZE = 256 * 1024
+
+
+class FileRange:
+    """A read-only view of ``file[start:end]`` that FileResponse can stream.
+
+    ``fileno()`` and ``tell()`` expose the real descriptor and offset, so a
+    WSGI server with a sendfile-capable ``wsgi.file_wrapper`` (gunicorn)
+    hands the slice to ``os.sendfile`` and the bytes never enter Python.
+    """
+
+    def __init__(self, file, start, end):
+        self.file = file
+        self.name = file.name
+        self.end = end
+        file.seek(start)
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def seekable(self):
+        return False
+
+    def read(self, size=-1):
+        remaining = self.end - self.file.tell()
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        return self.file.read(size) if size > 0 else b''
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Return ``(start, end)`` with ``end`` exclusive, ``None`` to ignore the
+    header and send the whole file, or ``False`` if it cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        # Malformed or multi-range requests: a full 200 is always allowed.
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        return (max(size - length, 0), size) if length else False
+    start = int(first)
+    end = min(int(last) + 1, size) if last else size
+    if start >= size or start >= end:
+        return False
+    return start, end
+
+
+def public_media_urlpatterns():
+    """Serve the public image directories under MEDIA_URL in DEBUG only.
+
+    Videos and HLS segments are never exposed this way: they go through
+    the enrollment-checked lesson views. Production serves the same image
+    directories from the web server.
+    """
+    if not settings.DEBUG:
+        return []
+    from django.views.static import serve
+
+    prefix = re.escape(settings.MEDIA_URL.lstrip('/'))
+    dirs = '|'.join(re.escape(directory) for directory in settings.IMAGE_SOURCE_DIRS)
+    # serve() normalizes the path, so ``images/../videos/`` must not match.
+    path = rf'(?P<path>(?:{dirs})(?!(?:.*/)?\.\.(?:/|$)).+)'
+    return [re_path(rf'^{prefix}{path}$', serve, {'document_root': settings.MEDIA_ROOT})]
+
+
+def file_response(request, path, content_type=None):
+    """Serve ``path`` with ETag/Last-Modified validators and byte ranges."""
+    stat = os.stat(path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    last_modified = int(stat.st_mtime)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and _if_range_matches(request.headers.get('If-Range'), etag, last_modified):
+        byte_range = parse_range(range_header, stat.st_size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{stat.st_size}"
+    else:
+        start, end = byte_range or (0, stat.st_size)
+        response = FileResponse(FileRange(open(path, 'rb'), start, end), content_type=content_type)
+        response.block_size = BLOCK_SIZE
+        response['Content-Length'] = end - start
+        if byte_range:
+            response.status_code = 206
+            response['Content-Range'] = f"bytes {start}-{end - 1}/{stat.st_size}"
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _if_range_matches(if_range, etag, last_modified):
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
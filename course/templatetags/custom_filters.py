@@ -1,5 +1,7 @@
 from django import template
 
+from course.images import build_srcset
+
 register = template.Library()
 
 @register.filter
@@ -9,3 +11,10 @@ def split(value, arg):
 @register.filter(name='add_class')
 def add_class(field, css_class):
     return field.as_widget(attrs={"class": css_class})
+
+
+@register.filter
+def srcset(image, arg):
+    """``{{ course.image|srcset:"card" }}`` or ``"card:avif"``; empty if unavailable."""
+    preset, _, fmt = arg.partition(':')
+    return build_srcset(image, preset, fmt or 'webp')
@@ -0,0 +1,163 @@
+"""Seed data and query-budget assertions shared by the app test suites."""
+import io
+import os
+import re
+from collections import Counter
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.test import APIClient
+
+from . import search
+from .models import Category, Comment, Course, CourseView, Lesson, Module, Teachers
+
+# Any statement shape run this many times in one request is treated as an
+# N+1: seed sizes below keep every list well above it.
+N_PLUS_ONE_THRESHOLD = 5
+
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r"\bIN \((?:\s*%s\s*,?)+\)")
+
+
+def query_shape(sql):
+    shape = LITERAL_RE.sub('%s', sql)
+    return IN_LIST_RE.sub('IN (...)', shape)
+
+
+def url_names(urlconf, namespace):
+    names = set()
+    for pattern in get_resolver(urlconf).url_patterns:
+        if isinstance(pattern, URLPattern) and pattern.name:
+            names.add(f'{namespace}:{pattern.name}')
+        elif isinstance(pattern, URLResolver):
+            names.update(url_names(pattern.urlconf_name, namespace))
+    return names
+
+
+class QueryBudgetMixin:
+    """Runs every entry of ``cases`` against a cold cache and checks it
+    against its query budget, and that every named URL in ``urlconf`` has
+    at least one entry.
+
+    A case is ``(url name, budget, who, method, path, data, status)``:
+    ``who`` names a user attribute to log in as, ``path`` a method that
+    returns the URL, and ``data`` the request body or the name of a
+    method that builds it.
+    """
+    cases = []
+    urlconf = None
+    namespace = None
+
+    def test_every_url_has_a_budget(self):
+        covered = {case[0] for case in self.cases}
+        missing = url_names(self.urlconf, self.namespace) - covered
+        self.assertFalse(missing, f"URLs without a query budget: {', '.join(sorted(missing))}")
+
+    def test_query_budgets(self):
+        for name, budget, who, method, path, data, expected_status in self.cases:
+            with self.subTest(name, who=who, method=method):
+                cache.clear()
+                client = self.client_for(who)
+                url = getattr(self, path)()
+                if isinstance(data, str):
+                    data = getattr(self, data)()
+                response = self.assertQueryBudget(budget, self.request, client, method, url, data)
+                self.assertEqual(response.status_code, expected_status)
+
+    def client_for(self, who):
+        client = APIClient()
+        if who:
+            user = getattr(self, who)
+            client.force_login(user)
+            client.force_authenticate(user)
+        return client
+
+    def request(self, client, method, path, data):
+        response = getattr(client, method)(path, data, format='json' if '/api/' in path else None)
+        response.close()
+        return response
+
+    def assertQueryBudget(self, budget, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as captured:
+            result = func(*args, **kwargs)
+        queries = [query['sql'] for query in captured.captured_queries]
+        shapes = Counter(query_shape(sql) for sql in queries)
+        repeated = [(count, shape) for shape, count in shapes.most_common() if count >= N_PLUS_ONE_THRESHOLD]
+        if repeated:
+            self.fail("Possible N+1, repeated query shapes:\n" + '\n'.join(
+                f"  {count}x {shape}" for count, shape in repeated
+            ))
+        if len(queries) > budget:
+            self.fail(f"{len(queries)} queries over a budget of {budget}:\n" + '\n'.join(
+                f"  {i}. {sql}" for i, sql in enumerate(queries, 1)
+            ))
+        return result
+
+
+def write_media(media_root, name, content):
+    path = os.path.join(media_root, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return name
+
+
+def sample_image():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (800, 450), (40, 120, 200)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def seed_catalog(media_root, users, categories=4, courses_per_category=6, modules_per_course=3,
+                 lessons_per_module=4, teachers=8, comments_per_course=5, enrollments_per_user=3):
+    """Populate a catalog about the size of a small production one.
+
+    Rows are bulk-inserted and the stored aggregates rebuilt in one pass,
+    the same way `manage.py recompute_courses` / `reconcile_ratings` /
+    `rebuild_search_index` do.
+    """
+    image = write_media(media_root, 'images/seed.jpg', sample_image())
+    video = write_media(media_root, 'videos/seed.mp4', b'\0' * 4096)
+
+    Category.objects.bulk_create(
+        Category(name=f"Kategoriya {i}", slug=f'kategoriya-{i}', image=image) for i in range(categories)
+    )
+    Teachers.objects.bulk_create(
+        Teachers(name=f"O'qituvchi {i}", position="Mentor", image=image) for i in range(teachers)
+    )
+    Course.objects.bulk_create(
+        Course(
+            title=f"Kurs {c}-{i}", slug=f'kurs-{c}-{i}', price=100, image=image,
+            description="Kurs haqida", category=category,
+        )
+        for c, category in enumerate(Category.objects.order_by('pk'))
+        for i in range(courses_per_category)
+    )
+    courses = list(Course.objects.order_by('pk'))
+    Module.objects.bulk_create(
+        Module(course=course, title=f"Modul {i}") for course in courses for i in range(modules_per_course)
+    )
+    Lesson.objects.bulk_create(
+        Lesson(module=module, title=f"Dars {i}", video=video, duration=timedelta(minutes=10))
+        for module in Module.objects.order_by('pk') for i in range(lessons_per_module)
+    )
+    Comment.objects.bulk_create(
+        Comment(course=course, user=users[(c + i) % len(users)], text="Zo'r kurs", rating=i % 5 + 1)
+        for c, course in enumerate(courses) for i in range(comments_per_course)
+    )
+    CourseView.objects.bulk_create(
+        CourseView(user=user, course=courses[(u + i) % len(courses)])
+        for u, user in enumerate(users) for i in range(enrollments_per_user)
+    )
+    Course.recompute()
+    Course.recompute_ratings()
+    search.index_courses(course.pk for course in courses)
+    return courses
@@ -1,3 +1,1152 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import CustomUser
+
+from . import autocomplete, caching, hls, media_info, probe
+from .aggregates import mark_stale, recompute_stale
+from .cache_backends import FallbackRedisCache
+from .pagination import encode_position
+from .models import Category, Comment, Course, CourseView, Lesson, Module, VideoProbeJob
+from .streaming import public_media_urlpatterns
+from .testing import FAST_HASHERS, TEST_CACHES, QueryBudgetMixin, sample_image, seed_catalog, write_media
+
+# Budgets are for a cold cache; the anonymous catalog pages cost nothing
+# once warm.
+COURSE_CASES = [
+    ('course:index', 7, None, 'get', 'index_url', None, 200),
+    ('course:index', 9, 'student', 'get', 'index_url', None, 200),
+    ('course:category_list', 1, None, 'get', 'category_list_url', None, 200),
+    ('course:category_detail', 3, None, 'get', 'category_detail_url', None, 200),
+    ('course:course_detail', 4, 'student', 'get', 'course_detail_url', None, 200),
+    ('course:course_detail', 7, 'student', 'post', 'course_detail_url', {'text': "Yaxshi", 'rating': 4}, 302),
+    ('course:course_comments', 2, None, 'get', 'course_comments_url', None, 200),
+    ('course:buy_course', 8, 'newcomer', 'post', 'buy_course_url', None, 302),
+    ('course:course_video', 5, 'student', 'get', 'course_video_url', None, 200),
+    ('course:lesson_video', 4, 'student', 'get', 'lesson_video_url', None, 200),
+    ('course:lesson_hls', 4, 'student', 'get', 'lesson_hls_url', None, 200),
+    ('course:course_list', 6, None, 'get', 'course_list_url', None, 200),
+    ('course:about', 2, None, 'get', 'about_url', None, 200),
+    ('course:image_derivative', 0, None, 'get', 'image_derivative_url', None, 200),
+    ('course:token_obtain_pair', 1, None, 'post', 'token_obtain_pair_url', 'credentials', 200),
+    ('course:token_refresh', 1, None, 'post', 'token_refresh_url', 'refresh_token', 200),
+    ('course:category-list', 1, None, 'get', 'category_api_url', None, 200),
+    ('course:category-detail', 1, None, 'get', 'category_api_detail_url', None, 200),
+    ('course:course-list', 1, None, 'get', 'course_api_url', None, 200),
+    ('course:course-detail', 1, None, 'get', 'course_api_detail_url', None, 200),
+    ('course:course-leaderboard', 1, None, 'get', 'leaderboard_url', None, 200),
+    ('course:course-search', 2, None, 'get', 'search_url', None, 200),
+    ('course:course-autocomplete', 1, None, 'get', 'autocomplete_url', None, 200),
+    ('course:course-curriculum', 4, None, 'get', 'curriculum_url', None, 200),
+    ('course:teacher-list', 1, None, 'get', 'teacher_api_url', None, 200),
+    ('course:module-list', 1, None, 'get', 'module_api_url', None, 200),
+    ('course:lesson-list', 1, None, 'get', 'lesson_api_url', None, 200),
+    ('course:module-batch', 8, 'staff', 'post', 'module_batch_url', 'module_batch', 200),
+    ('course:lesson-batch', 11, 'staff', 'post', 'lesson_batch_url', 'lesson_batch', 200),
+    ('course:comment-list-create', 1, None, 'get', 'comment_api_url', None, 200),
+    ('course:comment-detail', 1, None, 'get', 'comment_api_detail_url', None, 200),
+    ('course:cache-stats', 0, 'staff', 'get', 'cache_stats_url', None, 200),
+]
+
+
+@override_settings(CACHES=TEST_CACHES, PASSWORD_HASHERS=FAST_HASHERS, PERF_INSTRUMENTATION=False)
+class ViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    cases = COURSE_CASES
+    urlconf = 'course.urls'
+    namespace = 'course'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(
+            MEDIA_ROOT=cls.media_root, IMAGE_CACHE_ROOT=os.path.join(cls.media_root, 'cache'),
+        )
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [
+            CustomUser.objects.create_user(email=f'talaba{i}@example.com', password='parol123')
+            for i in range(30)
+        ]
+        cls.courses = seed_catalog(cls.media_root, users)
+        cls.course = cls.courses[0]
+        cls.student = users[0]
+        cls.newcomer = CustomUser.objects.create_user(email='yangi@example.com', password='parol123')
+        cls.staff = CustomUser.objects.create_superuser(email='admin@example.com', password='parol123')
+
+        cls.lesson = Lesson.objects.filter(module__course=cls.course).first()
+        cls.lesson.hls_playlist = write_media(cls.media_root, f'hls/{cls.lesson.pk}/master.m3u8', b'#EXTM3U\n')
+        cls.lesson.save(update_fields=['hls_playlist'])
+
+    def test_curriculum_is_served_from_cache_until_a_lesson_changes(self):
+        cache.clear()
+        url = self.curriculum_url()
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.title = "Yangilangan dars"
+            self.lesson.save()
+        titles = [lesson['title'] for module in self.client.get(url).json()['modules'] for lesson in module['lessons']]
+        self.assertIn("Yangilangan dars", titles)
+
+    def test_curriculum_cache_is_per_course(self):
+        cache.clear()
+        other = self.courses[1]
+        urls = [self.curriculum_url(), reverse('course:course-curriculum', args=[other.slug])]
+        for url in urls:
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.title = "Yangi nom"
+            self.course.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(urls[1]).json()['title'], other.title)
+        self.assertEqual(self.client.get(urls[0]).json()['title'], "Yangi nom")
+
+        # A lesson moved from another course changes both curricula.
+        moved = Lesson.objects.filter(module__course=other).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            moved.module = self.course.modules.first()
+            moved.save()
+        self.assertIn(moved.pk, [
+            lesson['id'] for module in self.client.get(urls[0]).json()['modules'] for lesson in module['lessons']
+        ])
+        self.assertNotIn(moved.pk, [
+            lesson['id'] for module in self.client.get(urls[1]).json()['modules'] for lesson in module['lessons']
+        ])
+
+        # Bulk writes reach the cache through Course.recompute().
+        for url in urls:
+            self.client.get(url)
+        Module.objects.filter(course=other).update(title="Ommaviy")
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.recompute(pk__in=[other.pk])
+        self.assertEqual({module['title'] for module in self.client.get(urls[1]).json()['modules']}, {"Ommaviy"})
+        with self.assertNumQueries(0):
+            self.client.get(urls[0])
+
+    def test_curriculum_of_a_renamed_course_is_gone(self):
+        cache.clear()
+        url = self.curriculum_url()
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            course = Course.objects.get(pk=self.course.pk)
+            course.slug = 'boshqa-kurs'
+            course.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_a_slug_taken_over_by_another_course_serves_that_course(self):
+        cache.clear()
+        url = self.curriculum_url()
+        self.client.get(url)
+        course, other = Course.objects.get(pk=self.course.pk), self.courses[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            course.slug = 'boshqa-kurs'
+            course.save()
+        # Warm the renamed course under its new versions.
+        self.client.get(reverse('course:course-curriculum', args=[course.slug]))
+        with self.captureOnCommitCallbacks(execute=True):
+            other.slug = self.course.slug
+            other.save()
+        self.assertEqual(self.client.get(url).json()['title'], other.title)
+
+    def test_conditional_get_answers_304_without_queries_until_a_write(self):
+        cache.clear()
+        for url in (self.index_url(), self.course_api_url(), self.curriculum_url()):
+            with self.subTest(url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.lesson.save()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_sparse_fieldsets_narrow_payload_and_columns(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(self.course_api_url(), {'fields': 'id,title'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'title'})
+        self.assertNotIn('description', captured.captured_queries[-1]['sql'])
+
+        card = self.client.get(self.course_api_url()).json()['results'][0]
+        self.assertNotIn('description', card)
+        detail = self.client.get(self.course_api_detail_url(), {'exclude': 'description'}).json()
+        self.assertNotIn('description', detail)
+        self.assertIn('average_rating', detail)
+
+    def test_list_endpoints_run_constant_queries(self):
+        for url in (self.category_api_url(), self.course_api_url(), self.teacher_api_url(), self.module_api_url(),
+                    self.lesson_api_url(), self.comment_api_url()):
+            with self.subTest(url):
+                counts = []
+                for page_size in (1, 20):
+                    with CaptureQueriesContext(connection) as captured:
+                        self.client.get(url, {'page_size': page_size})
+                    counts.append(len(captured))
+                self.assertEqual(counts[0], counts[1])
+
+    def test_search_ranks_and_follows_lesson_edits(self):
+        other = self.courses[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            other.title = "Django asoslari"
+            other.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.description = "Django bilan ishlash"
+            self.course.save()
+
+        # A title hit outranks a description hit.
+        slugs = [course['slug'] for course in self.client.get(self.search_url(), {'q': 'djan'}).json()]
+        self.assertEqual(slugs, [other.slug, self.course.slug])
+
+        self.assertEqual(self.client.get(self.search_url(), {'q': 'kubernetes'}).json(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.title = "Kubernetes bilan tanishuv"
+            self.lesson.save()
+        slugs = [course['slug'] for course in self.client.get(self.search_url(), {'q': 'kubernetes'}).json()]
+        self.assertEqual(slugs, [self.course.slug])
+
+        response = self.client.get(self.course_list_url(), {'q': 'kubernetes'})
+        self.assertEqual(list(response.context['courses']), [self.course])
+
+    def fetch(self, url, **headers):
+        response = self.client.get(url, **headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, content
+
+    def test_lesson_video_serves_byte_ranges(self):
+        self.client.force_login(self.student)
+        url = self.lesson_video_url()
+        size = os.path.getsize(os.path.join(self.media_root, self.lesson.video.name))
+
+        response, content = self.fetch(url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{size}')
+        self.assertEqual(len(content), 100)
+
+        response, content = self.fetch(url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(response['Content-Range'], f'bytes {size - 10}-{size - 1}/{size}')
+        self.assertEqual(len(content), 10)
+
+        response, _ = self.fetch(url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+        etag = response['ETag']
+        response, content = self.fetch(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"eski"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(content), size)
+        response, _ = self.fetch(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+    def test_lesson_media_requires_enrollment(self):
+        self.client.force_login(self.newcomer)
+        for url in (self.lesson_video_url(), self.lesson_hls_url()):
+            with self.subTest(url):
+                self.assertEqual(self.fetch(url)[0].status_code, 403)
+
+    def test_lesson_hls_stays_inside_the_lesson_directory(self):
+        other = Lesson.objects.exclude(pk=self.lesson.pk).filter(module__course=self.course).first()
+        write_media(self.media_root, f'hls/{other.pk}/master.m3u8', b'#EXTM3U\n')
+        self.client.force_login(self.student)
+        for name in ('../../videos/seed.mp4', f'../{other.pk}/master.m3u8', '/etc/passwd'):
+            with self.subTest(name):
+                url = reverse('course:lesson_hls', args=[self.course.slug, self.lesson.pk, name])
+                self.assertEqual(self.fetch(url)[0].status_code, 404)
+
+    def walk(self, url, direction):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([course['id'] for course in response.json()['results']])
+            url = response.json()[direction]
+        return pages, response.json()
+
+    def test_course_list_cursor_walks_ties_in_order(self):
+        # Two runs of equal scores, so most page boundaries fall inside a tie.
+        Course.objects.filter(pk__in=[course.pk for course in self.courses[::2]]).update(score=4.0)
+        Course.objects.exclude(score=4.0).update(score=3.0)
+        expected = list(Course.objects.order_by('-score', 'id').values_list('pk', flat=True))
+
+        pages, last = self.walk(f'{self.course_api_url()}?page_size=5', 'next')
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual(len(pages), -(-len(expected) // 5))
+
+        # Back from the last page, each cursor seeks the other way.
+        back, _ = self.walk(last['previous'], 'previous')
+        self.assertEqual(back, pages[-2::-1])
+
+    def test_tampered_cursors_are_rejected(self):
+        url = self.course_api_url()
+        valid = encode_position([4.0, self.course.pk])
+        for cursor in (
+            'not-base64!', valid[:-3], encode_position([4.0]), encode_position([None, self.course.pk]),
+            encode_position(['yuqori', self.course.pk]), encode_position([4.0, self.course.pk, 1]),
+        ):
+            with self.subTest(cursor):
+                self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'cursor': valid}).status_code, 200)
+
+    def test_course_aggregates_are_read_only_in_the_api(self):
+        client = self.client_for('student')
+        before = Course.objects.filter(pk=self.course.pk).values(*Course.AGGREGATE_FIELDS).get()
+        response = client.patch(self.course_api_detail_url(), {
+            'title': "Yangi nom", 'score': 99.0, 'rating_sum': 1000, 'stars_5': 200, 'num_reviews': 200,
+            'students': 10 ** 6, 'lesson_count': 0, 'aggregates_stale': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Course.objects.filter(pk=self.course.pk).values(*Course.AGGREGATE_FIELDS).get(), before)
+        self.assertEqual(Course.objects.get(pk=self.course.pk).title, "Yangi nom")
+
+    def test_a_broken_image_has_no_derivative(self):
+        width = settings.IMAGE_PRESETS['card'][0]
+        image = sample_image()
+        for name, content in (('images/buzilgan.jpg', image[:len(image) // 2]), ('images/matn.jpg', b'rasm emas')):
+            with self.subTest(name):
+                write_media(self.media_root, name, content)
+                response = self.client.get(reverse('course:image_derivative', args=[width, 'jpeg', name]))
+                self.assertEqual(response.status_code, 404)
+
+    def test_media_url_serves_images_only(self):
+        with override_settings(DEBUG=True):
+            pattern, = public_media_urlpatterns()
+        self.assertIsNotNone(pattern.resolve('media/images/seed.jpg'))
+        for path in ('media/videos/seed.mp4', 'media/hls/1/master.m3u8', 'media/images/../videos/seed.mp4'):
+            with self.subTest(path):
+                self.assertIsNone(pattern.resolve(path))
+        with override_settings(DEBUG=False):
+            self.assertEqual(public_media_urlpatterns(), [])
+
+    @override_settings(AUTOCOMPLETE_REFRESH_SECONDS=0)
+    def test_autocomplete_serves_from_memory_and_reloads_on_version_change(self):
+        autocomplete.index.clear()
+        # Older than the watermark overlap, so only edited rows are read again.
+        Course.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        url = reverse('course:course-autocomplete')
+        self.client.get(url, {'q': 'kur'})
+        with self.assertNumQueries(0):
+            suggestions = self.client.get(url, {'q': 'KURS 3 5'}).json()
+        self.assertEqual([item['slug'] for item in suggestions], ['kurs-3-5'])
+
+        category = self.course.category
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.title = "Ma'lumotlar bazasi"
+            self.course.save()
+        # Only the courses updated since the last load, plus a row count.
+        with CaptureQueriesContext(connection) as queries:
+            suggestions = self.client.get(url, {'q': 'mal'}).json()
+        self.assertEqual(len(queries), 2)
+        self.assertIn('"updated_at" >=', queries[0]['sql'])
+        self.assertEqual([item['slug'] for item in suggestions], [self.course.slug])
+        self.assertEqual(self.client.get(url, {'q': category.name}).json()[0]['id'], category.pk)
+        self.assertNotIn(self.course.pk, [entry.pk for entry in autocomplete.index.lookup('kurs', limit=100)])
+
+        # A delete is caught by the row count and reloads the courses in full.
+        deleted = self.courses[-1]
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.get(pk=deleted.pk).delete()
+        self.assertEqual(self.client.get(url, {'q': deleted.title}).json(), [])
+
+    @override_settings(AUTOCOMPLETE_REFRESH_SECONDS=0)
+    def test_autocomplete_keeps_serving_while_another_thread_refreshes(self):
+        autocomplete.index.clear()
+        self.assertEqual(autocomplete.index.lookup('malumot'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.title = "Ma'lumotlar bazasi"
+            self.course.save()
+        with autocomplete.index.lock, self.assertNumQueries(0):
+            self.assertEqual(autocomplete.index.lookup('malumot'), [])
+        self.assertEqual([entry.pk for entry in autocomplete.index.lookup('malumot')], [self.course.pk])
+
+    # URLs
+    def index_url(self):
+        return reverse('course:index')
+
+    def category_list_url(self):
+        return reverse('course:category_list')
+
+    def category_detail_url(self):
+        return reverse('course:category_detail', args=[self.course.category.slug])
+
+    def course_detail_url(self):
+        return reverse('course:course_detail', args=[self.course.slug])
+
+    def course_comments_url(self):
+        return reverse('course:course_comments', args=[self.course.slug])
+
+    def buy_course_url(self):
+        return reverse('course:buy_course', args=[self.course.slug])
+
+    def course_video_url(self):
+        return reverse('course:course_video', args=[self.course.slug])
+
+    def lesson_video_url(self):
+        return reverse('course:lesson_video', args=[self.course.slug, self.lesson.pk])
+
+    def lesson_hls_url(self):
+        return reverse('course:lesson_hls', args=[self.course.slug, self.lesson.pk, 'master.m3u8'])
+
+    def course_list_url(self):
+        return reverse('course:course_list')
+
+    def about_url(self):
+        return reverse('course:about')
+
+    def image_derivative_url(self):
+        width = settings.IMAGE_PRESETS['card'][0]
+        return reverse('course:image_derivative', args=[width, 'jpeg', self.course.image.name])
+
+    def token_obtain_pair_url(self):
+        return reverse('course:token_obtain_pair')
+
+    def token_refresh_url(self):
+        return reverse('course:token_refresh')
+
+    def category_api_url(self):
+        return reverse('course:category-list')
+
+    def category_api_detail_url(self):
+        return reverse('course:category-detail', args=[self.course.category_id])
+
+    def course_api_url(self):
+        return reverse('course:course-list')
+
+    def course_api_detail_url(self):
+        return reverse('course:course-detail', args=[self.course.pk])
+
+    def leaderboard_url(self):
+        return reverse('course:course-leaderboard')
+
+    def search_url(self):
+        return reverse('course:course-search') + '?q=kurs'
+
+    def autocomplete_url(self):
+        return reverse('course:course-autocomplete') + '?q=kur'
+
+    def curriculum_url(self):
+        return reverse('course:course-curriculum', args=[self.course.slug])
+
+    def teacher_api_url(self):
+        return reverse('course:teacher-list')
+
+    def module_api_url(self):
+        return reverse('course:module-list')
+
+    def lesson_api_url(self):
+        return reverse('course:lesson-list')
+
+    def module_batch_url(self):
+        return reverse('course:module-batch')
+
+    def lesson_batch_url(self):
+        return reverse('course:lesson-batch')
+
+    def comment_api_url(self):
+        return reverse('course:comment-list-create')
+
+    def comment_api_detail_url(self):
+        return reverse('course:comment-detail', args=[self.course.comments.first().pk])
+
+    def cache_stats_url(self):
+        return reverse('course:cache-stats')
+
+    # Request bodies
+    def credentials(self):
+        return {'email': self.student.email, 'password': 'parol123'}
+
+    def refresh_token(self):
+        return {'refresh': str(RefreshToken.for_user(self.student))}
+
+    def module_batch(self):
+        modules = list(self.course.modules.all())
+        return {'operations': [
+            *({'op': 'create', 'data': {'course': self.course.pk, 'title': f"Yangi modul {i}"}} for i in range(10)),
+            {'op': 'update', 'id': modules[0].pk, 'data': {'title': "Kirish"}},
+            {'op': 'reorder', 'ids': [module.pk for module in reversed(modules[1:])]},
+        ]}
+
+    def lesson_batch(self):
+        lessons = list(Lesson.objects.filter(module__course=self.course))
+        module = lessons[0].module_id
+        return {'operations': [
+            *({'op': 'create', 'data': {'module': module, 'title': f"Dars {i}", 'video': self.lesson.video.name,
+                                        'duration': '00:05:00'}} for i in range(10)),
+            {'op': 'update', 'id': lessons[1].pk, 'data': {'title': "Takrorlash"}},
+            {'op': 'reorder', 'ids': [lesson.pk for lesson in lessons[2:-1]]},
+            {'op': 'delete', 'id': lessons[-1].pk},
+        ]}
+
+
+AGGREGATE_FIELDS = ('lesson_count', 'module_count', 'duration', 'students')
+
+
+RATING_FIELDS = ('rating_sum', 'num_reviews', 'rating', 'score', *(f'stars_{n}' for n in range(1, 6)))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Kategoriya", slug='kategoriya')
+        cls.first, cls.second = (
+            Course.objects.create(title=f"Kurs {i}", slug=f'kurs-{i}', price=0, category=category) for i in range(2)
+        )
+        cls.users = [
+            CustomUser.objects.create_user(email=f'talaba{i}@example.com', password='parol123') for i in range(3)
+        ]
+
+    def comment(self, course, user, rating):
+        return Comment.objects.create(course=course, user=user, text="Yaxshi", rating=rating)
+
+    def assertMatchesRecompute(self):
+        courses = Course.objects.filter(pk__in=[self.first.pk, self.second.pk]).order_by('pk')
+        stored = list(courses.values(*RATING_FIELDS))
+        Course.recompute_ratings(pk__in=[self.first.pk, self.second.pk])
+        for before, after in zip(stored, courses.values(*RATING_FIELDS)):
+            for name in RATING_FIELDS:
+                self.assertAlmostEqual(before[name], after[name], msg=name)
+
+    def test_create_update_and_delete_keep_aggregates(self):
+        comments = [self.comment(self.first, user, rating) for user, rating in zip(self.users, (5, 4, 4))]
+        self.comment(self.second, self.users[0], 2)
+        self.assertMatchesRecompute()
+        self.assertEqual(Course.objects.get(pk=self.first.pk).rating_histogram(), {1: 0, 2: 0, 3: 0, 4: 2, 5: 1})
+
+        comments[0].rating = 1
+        comments[0].save()
+        self.assertMatchesRecompute()
+
+        comments[1].course = self.second
+        comments[1].save()
+        self.assertMatchesRecompute()
+
+        comments[2].delete()
+        self.assertMatchesRecompute()
+        self.assertEqual(Course.objects.get(pk=self.first.pk).rating_histogram(), {1: 1, 2: 0, 3: 0, 4: 0, 5: 0})
+
+    def test_cascade_and_queryset_deletes_keep_aggregates(self):
+        self.comment(self.first, self.users[0], 5)
+        self.comment(self.first, self.users[1], 3)
+        self.comment(self.second, self.users[1], 4)
+        self.users[0].delete()
+        self.assertMatchesRecompute()
+        course = Course.objects.get(pk=self.first.pk)
+        self.assertEqual((course.num_reviews, course.rating_sum, course.stars_5), (1, 3, 0))
+
+        Comment.objects.filter(course=self.second).delete()
+        self.assertMatchesRecompute()
+        self.assertEqual(Course.objects.get(pk=self.second.pk).num_reviews, 0)
+
+    def test_deleting_a_stale_instance_removes_the_stored_rating(self):
+        comment = self.comment(self.first, self.users[0], 5)
+        stale = Comment.objects.get(pk=comment.pk)
+        comment.rating = 2
+        comment.save()
+        stale.delete()
+        stale.delete()  # already gone: nothing left to subtract
+        self.assertMatchesRecompute()
+        self.assertEqual(Course.objects.get(pk=self.first.pk).rating_histogram(), {n: 0 for n in range(1, 6)})
+
+    def test_reconcile_reports_and_repairs_drift(self):
+        self.comment(self.first, self.users[0], 5)
+        self.comment(self.second, self.users[0], 3)
+        Course.objects.filter(pk=self.first.pk).update(stars_5=0, score=1.0)
+
+        out = StringIO()
+        call_command('reconcile_ratings', dry_run=True, stdout=out)
+        self.assertIn(f"Course {self.first.pk} (Kurs 0): stars_5 0 -> 1, score 1.0000 -> ", out.getvalue())
+        self.assertIn("1 course(s) drifted.", out.getvalue())
+        self.assertEqual(Course.objects.get(pk=self.first.pk).stars_5, 0)
+
+        call_command('reconcile_ratings', stdout=out)
+        self.assertEqual(Course.objects.get(pk=self.first.pk).stars_5, 1)
+        self.assertMatchesRecompute()
+        out = StringIO()
+        call_command('reconcile_ratings', dry_run=True, stdout=out)
+        self.assertEqual(out.getvalue(), "0 course(s) drifted.\n")
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AggregateDeltaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Kategoriya", slug='kategoriya')
+        cls.first, cls.second = (
+            Course.objects.create(title=f"Kurs {i}", slug=f'kurs-{i}', price=0, category=category) for i in range(2)
+        )
+        for course in (cls.first, cls.second):
+            for m in range(2):
+                module = Module.objects.create(course=course, title=f"Modul {m}")
+                for minutes in (5, 7):
+                    Lesson.objects.create(
+                        module=module, title="Dars", video='videos/dars.mp4', duration=timedelta(minutes=minutes),
+                    )
+
+    def assertMatchesRecompute(self):
+        courses = Course.objects.filter(pk__in=[self.first.pk, self.second.pk]).order_by('pk')
+        stored = list(courses.values(*AGGREGATE_FIELDS))
+        Course.recompute(pk__in=[self.first.pk, self.second.pk])
+        self.assertEqual(stored, list(courses.values(*AGGREGATE_FIELDS)))
+
+    def test_deltas_after_creates(self):
+        self.assertMatchesRecompute()
+        self.assertEqual(Course.objects.get(pk=self.first.pk).duration, timedelta(minutes=24))
+
+    def test_moving_a_lesson_between_courses(self):
+        lesson = Lesson.objects.filter(module__course=self.first).first()
+        lesson.module = self.second.modules.first()
+        lesson.save()
+        self.assertMatchesRecompute()
+
+    def test_moving_a_module_between_courses(self):
+        module = self.first.modules.first()
+        module.course = self.second
+        module.save()
+        self.assertMatchesRecompute()
+
+    def test_deletes(self):
+        Lesson.objects.filter(module__course=self.first).first().delete()
+        self.second.modules.first().delete()
+        self.assertMatchesRecompute()
+
+    def test_deleting_a_stale_module_twice(self):
+        module = self.second.modules.first()
+        Module.objects.get(pk=module.pk).delete()
+        self.assertEqual(module.delete(), (0, {}))
+        self.assertMatchesRecompute()
+
+    def test_changing_the_duration(self):
+        lesson = Lesson.objects.filter(module__course=self.first).first()
+        lesson.duration = timedelta(minutes=30)
+        lesson.save()
+        self.assertMatchesRecompute()
+
+    def test_partial_save_leaves_the_duration_alone(self):
+        lesson = Lesson.objects.filter(module__course=self.first).first()
+        lesson.duration = timedelta(hours=5)  # not written below
+        lesson.hls_playlist = 'hls/1/master.m3u8'
+        lesson.save(update_fields=['hls_playlist'])
+        self.assertMatchesRecompute()
+
+    @override_settings(COURSE_AGGREGATE_RECOMPUTE_DELAY=0)
+    def test_stale_courses_are_recomputed_after_commit(self):
+        lessons = Lesson.objects.filter(module__course=self.first)
+        with self.captureOnCommitCallbacks(execute=True):
+            lessons.filter(pk=lessons.first().pk).delete()  # a bulk delete: no deltas
+            mark_stale([self.first.pk])
+            self.assertTrue(Course.objects.get(pk=self.first.pk).aggregates_stale)
+
+        course = Course.objects.get(pk=self.first.pk)
+        self.assertFalse(course.aggregates_stale)
+        self.assertEqual(course.lesson_count, 3)
+        self.assertMatchesRecompute()
+
+    def test_enrollments_removed_by_cascades_and_queryset_deletes(self):
+        users = [CustomUser.objects.create_user(email=f'talaba{i}@example.com', password='parol123') for i in range(3)]
+        for user in users:
+            CourseView.objects.create(user=user, course=self.first)
+        CourseView.objects.create(user=users[0], course=self.second)
+        self.assertEqual(Course.objects.get(pk=self.first.pk).students, 3)
+
+        users[0].delete()
+        self.assertMatchesRecompute()
+        self.assertEqual(Course.objects.get(pk=self.second.pk).students, 0)
+        CourseView.objects.filter(user=users[1]).delete()
+        self.assertMatchesRecompute()
+        self.assertEqual(Course.objects.get(pk=self.first.pk).students, 1)
+
+    def test_recompute_stale_skips_fresh_courses(self):
+        Course.objects.filter(pk=self.second.pk).update(lesson_count=99)
+        self.assertEqual(recompute_stale([self.second.pk]), 0)
+        self.assertEqual(Course.objects.get(pk=self.second.pk).lesson_count, 99)
+
+    def test_stale_instance_keeps_the_probed_duration(self):
+        lesson = Lesson.objects.filter(module__course=self.first).first()
+        Lesson.objects.filter(pk=lesson.pk).update(duration=None)
+        Course.recompute(pk=self.first.pk)
+        stale = Lesson.objects.get(pk=lesson.pk)
+        lesson.set_duration(timedelta(minutes=9))  # the probe finishes
+
+        stale.title = "Tahrirlangan"
+        stale.save()
+        self.assertEqual(Lesson.objects.get(pk=lesson.pk).duration, timedelta(minutes=9))
+        self.assertFalse(VideoProbeJob.objects.filter(lesson=lesson).exists())
+        self.assertMatchesRecompute()
+
+
+@override_settings(CACHES=TEST_CACHES, PASSWORD_HASHERS=FAST_HASHERS, PERF_INSTRUMENTATION=False)
+class BatchWriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Kategoriya", slug='kategoriya')
+        cls.first, cls.second = (
+            Course.objects.create(title=f"Kurs {i}", slug=f'kurs-{i}', price=0, category=category) for i in range(2)
+        )
+        for course in (cls.first, cls.second):
+            module = Module.objects.create(course=course, title="Modul")
+            for position, minutes in enumerate((5, 7, 9)):
+                Lesson.objects.create(
+                    module=module, title=f"Dars {position}", video='videos/dars.mp4',
+                    duration=timedelta(minutes=minutes), position=position,
+                )
+        cls.staff = CustomUser.objects.create_superuser(email='admin@example.com', password='parol123')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        self.lessons = list(Lesson.objects.filter(module__course=self.first))
+
+    def post(self, operations):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('course:lesson-batch'), {'operations': operations}, format='json')
+
+    def statuses(self, response):
+        return [result['status'] for result in response.json()['results']]
+
+    def test_one_invalid_operation_writes_nothing(self):
+        response = self.post([
+            {'op': 'update', 'id': self.lessons[0].pk, 'data': {'title': "Yangi"}},
+            {'op': 'delete', 'id': self.lessons[1].pk},
+            {'op': 'update', 'id': self.lessons[2].pk, 'data': {'module': 0}},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.statuses(response), ['skipped', 'skipped', 'error'])
+        self.assertIn('module', response.json()['results'][2]['errors'])
+        self.assertEqual(
+            list(Lesson.objects.filter(module__course=self.first).values_list('title', flat=True)),
+            ["Dars 0", "Dars 1", "Dars 2"],
+        )
+
+    def test_reorder(self):
+        response = self.post([{'op': 'reorder', 'ids': [lesson.pk for lesson in reversed(self.lessons)]}])
+        self.assertEqual(self.statuses(response), ['reordered'])
+        self.assertEqual(list(Lesson.objects.filter(module__course=self.first)), self.lessons[::-1])
+
+    def test_an_object_may_be_claimed_once(self):
+        for operations in (
+            [
+                {'op': 'update', 'id': self.lessons[0].pk, 'data': {'title': "Yangi"}},
+                {'op': 'delete', 'id': self.lessons[0].pk},
+            ],
+            [{'op': 'reorder', 'ids': [self.lessons[1].pk, self.lessons[0].pk]}, {'op': 'delete', 'id': self.lessons[0].pk}],
+            [{'op': 'reorder', 'ids': [self.lessons[0].pk, self.lessons[0].pk]}],
+        ):
+            with self.subTest(operations):
+                response = self.post(operations)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(self.statuses(response)[-1], 'error')
+        self.assertEqual(Lesson.objects.filter(module__course=self.first).count(), 3)
+
+    def test_moving_a_lesson_recomputes_both_courses(self):
+        target = self.second.modules.get()
+        response = self.post([{'op': 'update', 'id': self.lessons[2].pk, 'data': {'module': target.pk}}])
+        self.assertEqual(self.statuses(response), ['updated'])
+        first, second = Course.objects.get(pk=self.first.pk), Course.objects.get(pk=self.second.pk)
+        self.assertEqual((first.lesson_count, first.duration), (2, timedelta(minutes=12)))
+        self.assertEqual((second.lesson_count, second.duration), (4, timedelta(minutes=30)))
+
+    def test_only_new_videos_are_probed(self):
+        # The first lesson is still being probed, so it has no duration yet.
+        Lesson.objects.filter(pk=self.lessons[0].pk).update(duration=None)
+        running = VideoProbeJob.objects.create(lesson=self.lessons[0], status=VideoProbeJob.RUNNING, attempts=1)
+        done = VideoProbeJob.objects.create(lesson=self.lessons[1], status=VideoProbeJob.DONE, attempts=1)
+        with mock.patch('course.batch.default_storage.exists', return_value=True), \
+                mock.patch.object(probe, 'submit') as submit:
+            response = self.post([
+                {'op': 'update', 'id': self.lessons[0].pk, 'data': {'title': "Yangi"}},
+                {'op': 'update', 'id': self.lessons[1].pk, 'data': {'video': 'videos/yangi.mp4'}},
+            ])
+        self.assertEqual(self.statuses(response), ['updated', 'updated'])
+        submit.assert_called_once_with(done.pk)
+        self.assertEqual(VideoProbeJob.objects.count(), 2)
+        running.refresh_from_db()
+        done.refresh_from_db()
+        self.assertEqual((running.status, running.attempts), (VideoProbeJob.RUNNING, 1))
+        self.assertEqual(done.status, VideoProbeJob.PENDING)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class VideoProbeJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Kategoriya", slug='kategoriya')
+        course = Course.objects.create(title="Kurs", slug='kurs', price=0, category=category)
+        module = Module.objects.create(course=course, title="Modul")
+        cls.lesson = Lesson.objects.create(module=module, title="Dars", video='videos/dars.mp4')
+
+    def test_a_job_is_claimed_once(self):
+        job = VideoProbeJob.objects.get(lesson=self.lesson)
+        self.assertTrue(job.claim())
+        self.assertFalse(VideoProbeJob.objects.get(pk=job.pk).claim())
+
+    def test_saving_the_lesson_leaves_a_running_job_alone(self):
+        job = VideoProbeJob.objects.get(lesson=self.lesson)
+        job.claim()
+        self.lesson.title = "Yangi nom"
+        self.lesson.save()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (VideoProbeJob.RUNNING, 1))
+
+    def test_a_failed_job_is_retried_on_the_next_save(self):
+        job = VideoProbeJob.objects.get(lesson=self.lesson)
+        job.claim()
+        job.finish(error="buzilgan fayl")
+        self.lesson.save()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (VideoProbeJob.PENDING, ''))
+        self.assertTrue(job.claim())
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+
+    @override_settings(VIDEO_PROBE_WORKERS=1, VIDEO_PROBE_QUEUE_SIZE=1)
+    def test_the_worker_pool_is_bounded(self):
+        release = threading.Event()
+        self.addCleanup(setattr, probe, '_executor', None)
+        probe._executor = None
+        with mock.patch.object(probe, 'run_job', lambda job_id: release.wait(5)):
+            # One running and one queued; the third stays pending in the table.
+            self.assertEqual([probe.submit(pk) for pk in (1, 2, 3)], [True, True, False])
+            release.set()
+            probe._executor.shutdown(wait=True)
+        # Finished jobs hand their slots back.
+        self.assertTrue(probe._slots.acquire(blocking=False))
+        self.assertTrue(probe._slots.acquire(blocking=False))
+
+
+def mp4_box(kind, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+
+def mvhd(timescale, duration, version=0):
+    if version == 1:
+        header = struct.pack('>B3xQQIQ', 1, 0, 0, timescale, duration)
+    else:
+        header = struct.pack('>B3xIIII', 0, 0, 0, timescale, duration)
+    return mp4_box(b'mvhd', header + bytes(80))
+
+
+def ebml_element(element_id, payload):
+    assert len(payload) < 0x7F
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big') + bytes([0x80 | len(payload)]) + payload
+
+
+def webm(seconds, scale=1000000):
+    info = ebml_element(0x2AD7B1, scale.to_bytes(3, 'big')) + ebml_element(0x4489, struct.pack('>d', seconds * 1e9 / scale))
+    header = ebml_element(0x1A45DFA3, ebml_element(0x4282, b'webm'))
+    # A live-style Segment of unknown size, as muxers stream it.
+    segment = (0x18538067).to_bytes(4, 'big') + b'\x01' + b'\xff' * 7
+    return header + segment + ebml_element(0x1549A966, info) + ebml_element(0x1F43B675, b'\0' * 16)
+
+
+class MediaInfoTests(SimpleTestCase):
+    def read(self, content):
+        with tempfile.NamedTemporaryFile(suffix='.bin') as f:
+            f.write(content)
+            f.flush()
+            return media_info.read_duration(f.name)
+
+    def test_mp4(self):
+        content = mp4_box(b'ftyp', b'isom\0\0\0\0') + mp4_box(b'moov', mvhd(1000, 90500)) + mp4_box(b'mdat', b'\0' * 64)
+        self.assertEqual(self.read(content), 90.5)
+
+    def test_mov(self):
+        content = mp4_box(b'wide') + mp4_box(b'mdat', b'\0' * 64) + mp4_box(b'moov', mvhd(600, 6000))
+        self.assertEqual(self.read(content), 10)
+
+    def test_64_bit_mvhd(self):
+        content = mp4_box(b'ftyp', b'isom\0\0\0\0') + mp4_box(b'moov', mvhd(90000, 90000 * 7200, version=1))
+        self.assertEqual(self.read(content), 7200)
+
+    def test_fragmented_mp4_uses_mehd(self):
+        mehd = mp4_box(b'mehd', struct.pack('>B3xI', 0, 45000))
+        moov = mp4_box(b'moov', mvhd(1000, 0) + mp4_box(b'mvex', mehd))
+        self.assertEqual(self.read(mp4_box(b'ftyp', b'iso6\0\0\0\0') + moov), 45)
+
+    def test_webm(self):
+        self.assertAlmostEqual(self.read(webm(125.25)), 125.25)
+
+    def test_truncated_file(self):
+        content = mp4_box(b'ftyp', b'isom\0\0\0\0') + mp4_box(b'moov', mvhd(1000, 90500))
+        for cut in (content[:30], content[:-60], webm(10)[:30]):
+            with self.subTest(length=len(cut)), self.assertRaises(media_info.UnsupportedFormat):
+                self.read(cut)
+
+    def test_other_formats_are_rejected(self):
+        for content in (b'', b'RIFF\0\0\0\0AVI LIST'):
+            with self.subTest(content=content), self.assertRaises(media_info.UnsupportedFormat):
+                self.read(content)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ImportCoursesTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        media_settings = override_settings(MEDIA_ROOT=os.path.join(self.dir, 'media'))
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        for name, seconds in (('kirish.mp4', 90), ('asoslar.mp4', 300)):
+            with open(os.path.join(self.dir, name), 'wb') as f:
+                f.write(mp4_box(b'ftyp', b'isom\0\0\0\0') + mp4_box(b'moov', mvhd(1000, seconds * 1000)))
+
+    def manifest(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', newline='') as f:
+            f.write(content)
+        return path
+
+    def run_import(self, path):
+        out = StringIO()
+        call_command('import_courses', path, workers=1, chunk_size=1, stdout=out)
+        return out.getvalue()
+
+    def assertImported(self, slug, lessons, duration):
+        course = Course.objects.get(slug=slug)
+        self.assertEqual(
+            (course.module_count, course.lesson_count, course.duration), (len(lessons), sum(lessons), duration),
+        )
+        self.assertEqual([module.lessons.count() for module in course.modules.order_by('position')], lessons)
+
+    def test_json_manifest_resumes_where_it_stopped(self):
+        path = self.manifest('kurslar.json', json.dumps({'courses': [
+            {'slug': 'python', 'title': "Python", 'category': 'dasturlash', 'modules': [
+                {'title': "Kirish", 'lessons': [
+                    {'title': "Salom", 'video': 'kirish.mp4'}, {'title': "Asoslar", 'video': 'asoslar.mp4'},
+                ]},
+            ]},
+            {'slug': 'django', 'title': "Django", 'category': {'slug': 'dasturlash', 'name': "Dasturlash"}, 'modules': [
+                {'title': "Kirish", 'lessons': [{'title': "Salom", 'video': 'kirish.mp4'}]},
+                {'title': "Modellar", 'lessons': [{'title': "Asoslar", 'video': 'asoslar.mp4'}]},
+            ]},
+        ]}))
+        self.assertIn("Imported 2 course(s) and 4 lesson(s).", self.run_import(path))
+        self.assertImported('python', [2], timedelta(seconds=390))
+        self.assertImported('django', [1, 1], timedelta(seconds=390))
+        videos = sorted(os.listdir(os.path.join(settings.MEDIA_ROOT, 'videos', 'django')))
+
+        # As if the run had died after the first chunk.
+        Course.objects.filter(slug='django').delete()
+        output = self.run_import(path)
+        self.assertIn("Skipping 1 course(s) imported earlier.", output)
+        self.assertIn("Imported 1 course(s) and 2 lesson(s).", output)
+        self.assertEqual(Category.objects.count(), 1)
+        self.assertEqual(Lesson.objects.count(), 4)
+        self.assertImported('django', [1, 1], timedelta(seconds=390))
+        self.assertEqual(sorted(os.listdir(os.path.join(settings.MEDIA_ROOT, 'videos', 'django'))), videos)
+
+        self.assertIn("Imported 0 course(s)", self.run_import(path))
+        self.assertEqual(Lesson.objects.count(), 4)
+
+    def test_csv_manifest(self):
+        path = self.manifest('kurslar.csv', (
+            'category_slug,course_slug,course_title,module,lesson,video\n'
+            'dizayn,figma,Figma,Kirish,Salom,kirish.mp4\n'
+            'dizayn,figma,Figma,Kirish,Asoslar,asoslar.mp4\n'
+            'dizayn,figma,Figma,Amaliyot,Loyiha,asoslar.mp4\n'
+            'dizayn,ranglar,Ranglar,Kirish,Salom,kirish.mp4\n'
+        ))
+        self.assertIn("Imported 2 course(s) and 4 lesson(s).", self.run_import(path))
+        self.assertImported('figma', [2, 1], timedelta(seconds=690))
+        self.assertImported('ranglar', [1], timedelta(seconds=90))
+        self.assertIn("Skipping 2 course(s) imported earlier.", self.run_import(path))
+        self.assertEqual(Lesson.objects.count(), 4)
+
+    def test_incomplete_manifest_is_rejected_before_any_work(self):
+        course = {'slug': 'python', 'title': "Python", 'category': 'dasturlash', 'modules': [
+            {'title': "Kirish", 'lessons': [{'title': "Salom", 'video': 'kirish.mp4'}]},
+        ]}
+        other = {**course, 'slug': 'django'}
+        broken = [
+            ({**other, 'title': ''}, "Course #2 is missing title."),
+            ({**other, 'modules': [{'lessons': []}]}, "Course 'django' module #1 is missing title."),
+            ({**other, 'modules': [{'title': "Kirish", 'lessons': [{'video': 'kirish.mp4'}]}]},
+             "Course 'django' module #1 lesson #1 is missing title."),
+            ({**other, 'category': {'name': "Dasturlash"}}, "Course 'django' category is missing slug."),
+            ({**other, 'modules': {'title': "Kirish"}}, "Course 'django': modules must be a list."),
+            (course, "Course 'python' appears twice."),
+            ({**other, 'modules': [
+                {'title': "Kirish", 'lessons': [{'title': "Salom", 'video': 'kirish.mp4'}]},
+                {'title': "Modellar", 'lessons': [{'title': "Salom", 'video': 'modellar/kirish.mp4'}]},
+            ]}, "Course 'django': videos 'kirish.mp4' and 'modellar/kirish.mp4' have the same file name."),
+        ]
+        for entry, message in broken:
+            with self.subTest(message):
+                path = self.manifest('kurslar.json', json.dumps([course, entry]))
+                with self.assertRaisesMessage(CommandError, message):
+                    self.run_import(path)
+                self.assertFalse(Category.objects.exists())
+                self.assertFalse(os.path.exists(settings.MEDIA_ROOT))
+
+
+class HlsPackagingTests(SimpleTestCase):
+
+    def test_level_fits_each_rendition(self):
+        self.assertEqual(hls.h264_level(640, 360, 30), 30)
+        self.assertEqual(hls.h264_level(1280, 720, 30), 31)
+        self.assertEqual(hls.h264_level(1280, 720, 60), 32)
+        self.assertEqual(hls.h264_level(1920, 1080, 30), 40)
+        self.assertEqual(hls.codecs({'level': 31}), 'avc1.4d401f,mp4a.40.2')
+        self.assertEqual(hls.codecs({'level': 40}), 'avc1.4d4028,mp4a.40.2')
+
+    @mock.patch.object(hls, 'ffmpeg_exe', return_value='ffmpeg')
+    def test_probe_timeout_is_a_packaging_error(self, ffmpeg_exe):
+        with mock.patch.object(hls.subprocess, 'run', side_effect=hls.subprocess.TimeoutExpired('ffmpeg', 1)):
+            with self.assertRaises(hls.PackagingError):
+                hls.source_resolution('video.mp4', timeout=1)
+
+    @mock.patch.object(hls, 'ffmpeg_exe', return_value='ffmpeg')
+    def test_source_resolution_reads_the_frame_rate(self, ffmpeg_exe):
+        stderr = b"  Stream #0:0(und): Video: h264 (High), yuv420p, 1920x1080 [SAR 1:1 DAR 16:9], 4000 kb/s, 59.94 fps, 60 tbr\n"
+        with mock.patch.object(hls.subprocess, 'run', return_value=mock.Mock(stderr=stderr)):
+            self.assertEqual(hls.source_resolution('video.mp4', timeout=1), (1920, 1080, 59.94))
+
+
+class HlsOutputTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Kategoriya", slug='kategoriya')
+        course = Course.objects.create(title="Kurs", slug='kurs', price=0, category=category)
+        module = Module.objects.create(course=course, title="Modul")
+        cls.lesson = Lesson.objects.create(
+            module=module, title="Dars", video='videos/dars.mp4', duration=timedelta(minutes=5),
+        )
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.out_dir = os.path.join(self.media_root, 'hls', str(self.lesson.pk))
+        write_media(self.media_root, f'hls/{self.lesson.pk}/{hls.MASTER_PLAYLIST}', b'#EXTM3U\n')
+
+    def package(self, encode):
+        with mock.patch.object(hls, 'source_resolution', return_value=(640, 360, 30.0)), \
+                mock.patch.object(hls, 'encode_rendition', side_effect=encode), \
+                ThreadPoolExecutor(max_workers=1) as executor:
+            return hls.package_lesson(self.lesson, executor)
+
+    def test_a_failed_encode_keeps_the_published_ladder(self):
+        def encode(source, out_dir, rendition, segment_seconds, timeout):
+            os.makedirs(out_dir)
+            raise hls.PackagingError("buzilgan fayl")
+
+        with self.assertRaises(hls.PackagingError):
+            self.package(encode)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'hls')), [str(self.lesson.pk)])
+        self.assertEqual(os.listdir(self.out_dir), [hls.MASTER_PLAYLIST])
+
+    def test_a_new_ladder_replaces_the_old_one(self):
+        def encode(source, out_dir, rendition, segment_seconds, timeout):
+            write_media(out_dir, 'index.m3u8', b'#EXTM3U\n')
+            return rendition['name']
+
+        renditions = self.package(encode)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'hls')), [str(self.lesson.pk)])
+        self.assertEqual(
+            sorted(os.listdir(self.out_dir)), sorted([hls.MASTER_PLAYLIST, *(r['name'] for r in renditions)]),
+        )
+        self.assertEqual(
+            Lesson.objects.get(pk=self.lesson.pk).hls_playlist, f'hls/{self.lesson.pk}/{hls.MASTER_PLAYLIST}',
+        )
+
+    @override_settings(CACHES=TEST_CACHES)
+    def test_packaging_invalidates_the_cached_course(self):
+        def encode(source, out_dir, rendition, segment_seconds, timeout):
+            return rendition['name']
+
+        namespace = caching.course_namespace(self.lesson.module.course_id)
+        before = caching.get_versions('course', namespace)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.package(encode)
+        after = caching.get_versions('course', namespace)
+        self.assertTrue(all(after[name] != before[name] for name in before))
+
+
+class FallbackRedisCacheTests(SimpleTestCase):
+    """Stands a LocMemCache in for the Redis server so it can go down and
+    come back."""
+
+    def setUp(self):
+        from django.core.cache.backends.locmem import LocMemCache
+        from django_redis.cache import RedisCache
+        from redis.exceptions import ConnectionError as RedisConnectionError
+
+        self.server = LocMemCache('redis-server', {})
+        self.server.clear()
+        self.down = False
+
+        def forward(name):
+            def call(backend, *args, **kwargs):
+                if self.down:
+                    raise RedisConnectionError("Connection refused")
+                return getattr(self.server, name)(*args, **kwargs)
+            return call
+
+        for name in ('get', 'get_many', 'set', 'add', 'set_many', 'incr'):
+            patcher = mock.patch.object(RedisCache, name, forward(name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.cache = FallbackRedisCache('redis://127.0.0.1:6379/1', {})
+        patcher = mock.patch.object(caching, 'cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bumps_lost_in_an_outage_are_replayed_on_recovery(self):
+        before = caching.get_versions(*caching.NAMESPACES, caching.ENROLLMENT)
+
+        self.down = True
+        with self.assertLogs('course.cache_backends', 'WARNING'):
+            caching.bump('course')
+        self.assertTrue(self.cache.degraded)
+        self.assertEqual(self.server.get('version:course'), before['course'])
+
+        self.down = False
+        self.cache.redis_down_until = 0.0  # the retry interval has passed
+        after = caching.get_versions(*caching.NAMESPACES, caching.ENROLLMENT)
+        self.assertFalse(self.cache.degraded)
+        for namespace, version in before.items():
+            self.assertNotEqual(after[namespace], version, namespace)
+            self.assertEqual(self.server.get(f'version:{namespace}'), after[namespace])
+
+    def test_failed_recovery_stays_on_local_memory(self):
+        self.down = True
+        with self.assertLogs('course.cache_backends', 'WARNING'):
+            self.cache.set('key', 'local')
+        self.cache.redis_down_until = 0.0
+        with self.assertLogs('course.cache_backends', 'WARNING'):
+            self.assertEqual(self.cache.get('key'), 'local')
+        self.assertTrue(self.cache.degraded)
+        self.assertGreater(self.cache.redis_down_until, 0.0)
@@ -1,18 +1,18 @@
 from django.urls import path
-from django.conf import settings
-from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .views import (
     IndexView, CategoryListView, CategoryDetailView,
-    CourseDetailView, BuyCourseView, CourseVideoView,
-    CourseListView, AboutView,
+    CourseDetailView, CourseCommentsView, BuyCourseView, CourseVideoView, LessonVideoStreamView, LessonHlsView,
+    CourseListView, AboutView, ImageDerivativeView,
     
     # API views
     CategoryListCreateAPIView, CategoryRetrieveUpdateDestroyAPIView,
-    CourseListCreateAPIView, CourseRetrieveUpdateDestroyAPIView,
+    CourseListCreateAPIView, CourseRetrieveUpdateDestroyAPIView, CourseLeaderboardAPIView, CourseSearchAPIView, CourseAutocompleteView,
+    CourseCurriculumAPIView,
     TeacherListCreateAPIView,
-    ModuleListCreateAPIView, LessonListCreateAPIView,
-    CommentListCreateAPIView, CommentRetrieveUpdateDestroyAPIView
+    ModuleListCreateAPIView, LessonListCreateAPIView, ModuleBatchAPIView, LessonBatchAPIView,
+    CommentListCreateAPIView, CommentRetrieveUpdateDestroyAPIView,
+    CacheStatsAPIView,
 )
 
 app_name = 'course'
@@ -23,10 +23,14 @@ urlpatterns = [
     path('categories/', CategoryListView.as_view(), name='category_list'),
     path('categories/<slug:slug>/', CategoryDetailView.as_view(), name='category_detail'),
     path('course/<slug:slug>/', CourseDetailView.as_view(), name='course_detail'),
+    path('course/<slug:slug>/comments/', CourseCommentsView.as_view(), name='course_comments'),
     path('buy/<slug:slug>/', BuyCourseView.as_view(), name='buy_course'),
     path('course/<slug:slug>/video/', CourseVideoView.as_view(), name='course_video'),
+    path('course/<slug:slug>/lessons/<int:pk>/video/', LessonVideoStreamView.as_view(), name='lesson_video'),
+    path('course/<slug:slug>/lessons/<int:pk>/hls/<path:name>', LessonHlsView.as_view(), name='lesson_hls'),
     path('courses/', CourseListView.as_view(), name='course_list'),
     path('about/', AboutView.as_view(), name='about'),
+    path('img/<int:width>/<str:fmt>/<path:name>', ImageDerivativeView.as_view(), name='image_derivative'),
 
     # JWT auth
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -39,6 +43,10 @@ urlpatterns = [
     # Course API
     path('api/courses/', CourseListCreateAPIView.as_view(), name='course-list'),
     path('api/courses/<int:pk>/', CourseRetrieveUpdateDestroyAPIView.as_view(), name='course-detail'),
+    path('api/courses/top/', CourseLeaderboardAPIView.as_view(), name='course-leaderboard'),
+    path('api/courses/search/', CourseSearchAPIView.as_view(), name='course-search'),
+    path('api/courses/autocomplete/', CourseAutocompleteView.as_view(), name='course-autocomplete'),
+    path('api/courses/<slug:slug>/curriculum/', CourseCurriculumAPIView.as_view(), name='course-curriculum'),
 
     # Teacher API
     path('api/teachers/', TeacherListCreateAPIView.as_view(), name='teacher-list'),
@@ -46,10 +54,13 @@ urlpatterns = [
     # Module and Lesson API
     path('api/modules/', ModuleListCreateAPIView.as_view(), name='module-list'),
     path('api/lessons/', LessonListCreateAPIView.as_view(), name='lesson-list'),
+    path('api/modules/batch/', ModuleBatchAPIView.as_view(), name='module-batch'),
+    path('api/lessons/batch/', LessonBatchAPIView.as_view(), name='lesson-batch'),
 
     # Comment API
     path('api/comments/', CommentListCreateAPIView.as_view(), name='comment-list-create'),
     path('api/comments/<int:pk>/', CommentRetrieveUpdateDestroyAPIView.as_view(), name='comment-detail'),
-]
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Cache statistics (this process)
+    path('api/cache-stats/', CacheStatsAPIView.as_view(), name='cache-stats'),
+]
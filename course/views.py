@@ -1,20 +1,42 @@
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.views.generic import TemplateView, ListView, DetailView, View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
-from django.db.models import Avg
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied, SuspiciousFileOperation
+from django.http import Http404, HttpResponse, JsonResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils._os import safe_join
+from PIL import Image
 from rest_framework import generics, permissions, status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from . import autocomplete
+from .batch import BatchRequestSerializer, LessonBatchWriter, ModuleBatchWriter
+from .cache_backends import stats as cache_stats
+from .caching import ENROLLMENT, EPOCH, CachedPageMixin, ConditionalGetMixin, course_namespace, get_versions
+from .optimizer import QuerysetOptimizerMixin
 from .models import Course, Teachers, Category, Lesson, CourseView, Comment, Module
 from .forms import CommentForm
+from .pagination import decode_position, encode_position, seek
+from .search import search
+from .images import FORMATS as IMAGE_FORMATS, allowed_widths, format_supported, get_cache as get_image_cache
+from .streaming import file_response
 from .serializers import (
     CategorySerializer,
     CourseSerializer,
+    CourseListSerializer,
+    CurriculumSerializer,
     TeacherSerializer,
     ModuleSerializer,
     LessonSerializer,
@@ -44,24 +66,24 @@ class LogoutView(APIView):
 # Template-based Views
 
 
-class IndexView(TemplateView):
+class IndexView(ConditionalGetMixin, CachedPageMixin, TemplateView):
     template_name = 'course/index.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['courses'] = Course.objects.annotate(average_rating=Avg('comments__rating')).order_by('-average_rating')[:6]
+        context['courses'] = Course.ranked()[:6]
         context['teachers'] = Teachers.objects.all()
         context['categories'] = Category.objects.all()
         return context
 
 
-class CategoryListView(ListView):
+class CategoryListView(ConditionalGetMixin, ListView):
     model = Category
     template_name = 'course/category_list.html'
     context_object_name = 'categories'
 
 
-class CategoryDetailView(DetailView):
+class CategoryDetailView(ConditionalGetMixin, CachedPageMixin, DetailView):
     model = Category
     template_name = 'course/category_detail.html'
     context_object_name = 'category'
@@ -71,11 +93,11 @@ class CategoryDetailView(DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         category = self.get_object()
-        context['courses'] = category.courses.annotate(average_rating=Avg('comments__rating'))
+        context['courses'] = Course.ranked(category)
         return context
 
 
-class CourseDetailView(LoginRequiredMixin, DetailView):
+class CourseDetailView(LoginRequiredMixin, ConditionalGetMixin, DetailView):
     model = Course
     template_name = 'course/course_detail.html'
     context_object_name = 'course'
@@ -83,20 +105,12 @@ class CourseDetailView(LoginRequiredMixin, DetailView):
     slug_url_kwarg = 'slug'
     login_url = '/users/login/'
 
-    def get_object(self):
-        obj = super().get_object()
-        obj.update_course_info()
-        return obj
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         course = self.object
         context['duration_parts'] = course.get_duration_parts()
         context['form'] = CommentForm()
-        context['comments'] = course.comments.select_related('user').order_by('-created_at')
-        average_rating = course.comments.aggregate(Avg('rating'))['rating__avg'] or 0
-        context['average_rating'] = round(average_rating, 1)
-        context['num_reviews'] = course.comments.count()
+        context['comments'], context['next_cursor'] = comment_page(course)
         return context
 
     def post(self, request, *args, **kwargs):
@@ -110,6 +124,49 @@ class CourseDetailView(LoginRequiredMixin, DetailView):
         return redirect('course:course_detail', slug=self.object.slug)
 
 
+COMMENT_ORDERING = ('-created_at', '-id')
+
+
+def comment_page(course, cursor=None):
+    """Newest-first page of ``course``'s comments after ``cursor``, plus the
+    cursor for the page that follows it (or None)."""
+    comments = course.comments.select_related('user').order_by(*COMMENT_ORDERING)
+    if cursor:
+        fields = [Comment._meta.get_field(order.lstrip('-')) for order in COMMENT_ORDERING]
+        position, _ = decode_position(cursor, fields)
+        comments = comments.filter(seek(COMMENT_ORDERING, position))
+    page_size = settings.COURSE_COMMENTS_PAGE_SIZE
+    comments = list(comments[:page_size + 1])
+    if len(comments) <= page_size:
+        return comments, None
+    last = comments[page_size - 1]
+    return comments[:page_size], encode_position([last.created_at, last.pk])
+
+
+class CourseCommentsView(ConditionalGetMixin, View):
+    """Older comments for the detail page, as an HTML fragment or JSON."""
+    conditional_namespaces = ('comment',)
+
+    def get(self, request, slug):
+        course = get_object_or_404(Course.objects.only('pk', 'slug'), slug=slug)
+        cursor = request.GET.get('cursor')
+        try:
+            comments, next_cursor = comment_page(course, cursor)
+        except ValueError:
+            raise Http404("Invalid cursor")
+
+        if request.GET.get('format') == 'json' or request.accepts('application/json') and not request.accepts('text/html'):
+            next_url = None
+            if next_cursor:
+                next_url = request.build_absolute_uri(f"{request.path}?format=json&cursor={next_cursor}")
+            return JsonResponse({'next': next_url, 'results': CommentSerializer(comments, many=True).data})
+
+        html = render_to_string('course/comment_list.html', {
+            'course': course, 'comments': comments, 'cursor': cursor, 'next_cursor': next_cursor,
+        }, request=request)
+        return HttpResponse(html)
+
+
 class BuyCourseView(LoginRequiredMixin, View):
     login_url = '/users/login/'
 
@@ -121,48 +178,112 @@ class BuyCourseView(LoginRequiredMixin, View):
         return redirect('course:course_video', slug=course.slug)
 
 
-class CourseVideoView(LoginRequiredMixin, DetailView):
+class CourseVideoView(LoginRequiredMixin, ConditionalGetMixin, DetailView):
     model = Course
     template_name = 'course/course_video.html'
     context_object_name = 'course'
     login_url = '/users/login/'
 
-    def get_object(self):
-        obj = super().get_object()
-        obj.update_course_info()
-        return obj
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['modules'] = self.object.modules.prefetch_related('lessons')
         lesson_id = self.request.GET.get('lesson')
         if lesson_id:
-            context['selected_lesson'] = get_object_or_404(Lesson, id=lesson_id)
+            lesson = get_object_or_404(Lesson, id=lesson_id)
+            context['selected_lesson'] = lesson
+            if lesson.hls_playlist:
+                context['hls_url'] = reverse('course:lesson_hls', kwargs={
+                    'slug': self.object.slug, 'pk': lesson.pk, 'name': os.path.basename(lesson.hls_playlist),
+                })
         return context
 
 
-class CourseListView(ListView):
+class LessonVideoStreamView(LoginRequiredMixin, View):
+    login_url = '/users/login/'
+
+    def get_lesson(self, request, slug, pk):
+        lesson = get_object_or_404(Lesson.objects.select_related('module'), pk=pk, module__course__slug=slug)
+        enrolled = CourseView.objects.filter(user=request.user, course_id=lesson.module.course_id).exists()
+        if not (enrolled or request.user.is_superuser):
+            raise PermissionDenied
+        return lesson
+
+    def get(self, request, slug, pk):
+        lesson = self.get_lesson(request, slug, pk)
+        if not lesson.video:
+            raise Http404
+        return file_response(request, lesson.video.path)
+
+
+class LessonHlsView(LessonVideoStreamView):
+    content_types = {
+        '.m3u8': 'application/vnd.apple.mpegurl',
+        '.ts': 'video/mp2t',
+    }
+
+    def get(self, request, slug, pk, name):
+        lesson = self.get_lesson(request, slug, pk)
+        if not lesson.hls_playlist:
+            raise Http404
+        try:
+            # Resolve against this lesson's own directory so ``..`` cannot
+            # reach another lesson's files or the source videos.
+            path = safe_join(safe_join(settings.MEDIA_ROOT, os.path.dirname(lesson.hls_playlist)), name)
+        except SuspiciousFileOperation:
+            raise Http404
+        if not os.path.isfile(path):
+            raise Http404
+        return file_response(request, path, content_type=self.content_types.get(os.path.splitext(path)[1]))
+
+
+class ImageDerivativeView(View):
+
+    def get(self, request, width, fmt, name):
+        if width not in allowed_widths() or not format_supported(fmt) or not name.startswith(settings.IMAGE_SOURCE_DIRS):
+            raise Http404
+        try:
+            source = safe_join(settings.MEDIA_ROOT, name)
+        except SuspiciousFileOperation:
+            raise Http404
+        if not os.path.isfile(source):
+            raise Http404
+        try:
+            path = get_image_cache().get_or_create(source, width, fmt)
+        except (OSError, Image.DecompressionBombError):
+            # Not an image, truncated or too large to decode.
+            raise Http404
+        response = file_response(request, path, content_type=IMAGE_FORMATS[fmt][1])
+        if 'v' in request.GET:
+            # The URL carries the source version, so it never goes stale.
+            response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+
+class CourseListView(ConditionalGetMixin, CachedPageMixin, ListView):
     model = Course
     template_name = 'course/course.html'
     context_object_name = 'courses'
 
     def get_queryset(self):
-        return Course.objects.annotate(average_rating=Avg('comments__rating'))
+        self.q = self.request.GET.get('q', '').strip()
+        if self.q:
+            return search(self.q)
+        return super().get_queryset()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['categories'] = Category.objects.all()
+        # The footer always lists the whole catalog, search or not.
+        context['footer_courses'] = Course.objects.all() if self.q else context['courses']
+        context['q'] = self.q
         return context
 
 
-class AboutView(ListView):
+class AboutView(ConditionalGetMixin, CachedPageMixin, ListView):
     model = Course
     template_name = 'course/about.html'
     context_object_name = 'courses'
 
-    def get_queryset(self):
-        return Course.objects.annotate(average_rating=Avg('comments__rating'))
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['categories'] = Category.objects.all()
@@ -172,69 +293,205 @@ class AboutView(ListView):
 # API Views
 
 
+class CacheStatsAPIView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats.snapshot())
+
+
 # DRY Base Classes
-class BaseListCreateAPIView(generics.ListCreateAPIView):
+class BaseListCreateAPIView(ConditionalGetMixin, QuerysetOptimizerMixin, generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    conditional_per_user = False
 
-class BaseRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class BaseRetrieveUpdateDestroyAPIView(ConditionalGetMixin, QuerysetOptimizerMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    conditional_per_user = False
 
 # Category API
 class CategoryListCreateAPIView(BaseListCreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    conditional_namespaces = ('category',)
 
 class CategoryRetrieveUpdateDestroyAPIView(BaseRetrieveUpdateDestroyAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    conditional_namespaces = ('category',)
 
 # Course API
 class CourseListCreateAPIView(BaseListCreateAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
+    cursor_ordering = ('-score', 'id')
+    conditional_namespaces = ('course', 'comment', ENROLLMENT)
+
+    def get_serializer_class(self):
+        # Listings get the compact card unless specific fields are asked for.
+        if self.request.method == 'GET' and 'fields' not in self.request.query_params:
+            return CourseListSerializer
+        return CourseSerializer
 
 class CourseRetrieveUpdateDestroyAPIView(BaseRetrieveUpdateDestroyAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
+    conditional_namespaces = ('course', 'comment', ENROLLMENT)
+
+class CourseCurriculumAPIView(ConditionalGetMixin, APIView):
+    """Course -> modules -> lessons in one response. The rendered JSON is
+    cached under this course's own version, which its module and lesson
+    writes bump, so editing one course leaves the others warm. The slug's
+    pk is cached too, so a warm hit costs no queries at all."""
+    permission_classes = [permissions.AllowAny]
+    conditional_namespaces = ('course',)
+    conditional_per_user = False
+
+    def get(self, request, slug):
+        # The pk is stored with the versions it was resolved under; renaming
+        # or deleting that course bumps them, so a stale mapping is never used.
+        slug_key = f'curriculum-slug:{slug}'
+        pk, seen = cache.get(slug_key, (None, None))
+        versions = pk and get_versions(EPOCH, course_namespace(pk))
+        if pk is None or list(versions.values()) != seen:
+            pk = get_object_or_404(Course.objects.values_list('pk', flat=True), slug=slug)
+            # Read before the rows: a write landing in between only costs a miss.
+            versions = get_versions(EPOCH, course_namespace(pk))
+            cache.set(slug_key, (pk, list(versions.values())), settings.PAGE_CACHE_TIMEOUT)
+        key = f'curriculum:{pk}:' + ':'.join(map(str, versions.values()))
+        content = cache.get(key)
+        if content is None:
+            course = get_object_or_404(Course.objects.prefetch_related('modules__lessons'), slug=slug)
+            content = JSONRenderer().render(CurriculumSerializer(course, context={'slug': slug}).data)
+            if course.pk == pk:
+                cache.set(key, content, settings.PAGE_CACHE_TIMEOUT)
+            else:
+                # The slug moved to another course; look it up afresh next time.
+                cache.delete(slug_key)
+        return HttpResponse(content, content_type='application/json')
+
+class CourseLeaderboardAPIView(ConditionalGetMixin, QuerysetOptimizerMixin, generics.ListAPIView):
+    serializer_class = CourseListSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
+    conditional_namespaces = ('course', 'comment', 'category', ENROLLMENT)
+    conditional_per_user = False
+
+    def get_queryset(self):
+        try:
+            limit = int(self.request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        limit = max(1, min(limit, settings.LEADERBOARD_MAX_LIMIT))
+
+        category = None
+        slug = self.request.query_params.get('category')
+        if slug:
+            category = get_object_or_404(Category, slug=slug)
+        return Course.ranked(category)[:limit]
+
+class CourseSearchAPIView(ConditionalGetMixin, QuerysetOptimizerMixin, generics.ListAPIView):
+    """Ranked full-text search: ``?q=python django&limit=20``."""
+    serializer_class = CourseListSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
+    conditional_namespaces = ('course', 'comment', 'category', ENROLLMENT)
+    conditional_per_user = False
+
+    def get_queryset(self):
+        try:
+            limit = int(self.request.query_params.get('limit', settings.SEARCH_MAX_RESULTS))
+        except ValueError:
+            limit = settings.SEARCH_MAX_RESULTS
+        limit = max(1, min(limit, settings.SEARCH_MAX_RESULTS))
+        return search(self.request.query_params.get('q', ''), limit)
+
+class CourseAutocompleteView(View):
+    """Search-as-you-type suggestions from the in-process prefix index.
+    A plain view rather than DRF, to keep per-keystroke overhead low."""
+
+    def get(self, request):
+        try:
+            limit = int(request.GET.get('limit', settings.AUTOCOMPLETE_MAX_RESULTS))
+        except ValueError:
+            limit = settings.AUTOCOMPLETE_MAX_RESULTS
+        limit = max(1, min(limit, settings.AUTOCOMPLETE_MAX_RESULTS))
+        suggestions = [
+            {'type': entry.kind, 'id': entry.pk, 'title': entry.title, 'slug': entry.slug}
+            for entry in autocomplete.index.lookup(request.GET.get('q', ''), limit)
+        ]
+        return JsonResponse(suggestions, safe=False)
 
 # Teachers API
 class TeacherListCreateAPIView(BaseListCreateAPIView):
     queryset = Teachers.objects.all()
     serializer_class = TeacherSerializer
+    conditional_namespaces = ('teacher',)
 
 class TeacherRetrieveUpdateDestroyAPIView(BaseRetrieveUpdateDestroyAPIView):
     queryset = Teachers.objects.all()
     serializer_class = TeacherSerializer
+    conditional_namespaces = ('teacher',)
 
 # Module API
 class ModuleListCreateAPIView(BaseListCreateAPIView):
     queryset = Module.objects.all()
     serializer_class = ModuleSerializer
+    conditional_namespaces = ('course',)
 
 class ModuleRetrieveUpdateDestroyAPIView(BaseRetrieveUpdateDestroyAPIView):
     queryset = Module.objects.all()
     serializer_class = ModuleSerializer
+    conditional_namespaces = ('course',)
 
 # Lesson API
 class LessonListCreateAPIView(BaseListCreateAPIView):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
+    conditional_namespaces = ('course',)
 
 class LessonRetrieveUpdateDestroyAPIView(BaseRetrieveUpdateDestroyAPIView):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
+    conditional_namespaces = ('course',)
+
+# Batch writes for modules and lessons
+class BatchWriteAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    writer_class = None
+
+    def post(self, request):
+        serializer = BatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        writer = self.writer_class(serializer.validated_data['operations'])
+        with transaction.atomic():
+            if not writer.validate():
+                return Response({'results': writer.results}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'results': writer.save()})
+
+class ModuleBatchAPIView(BatchWriteAPIView):
+    writer_class = ModuleBatchWriter
+
+class LessonBatchAPIView(BatchWriteAPIView):
+    writer_class = LessonBatchWriter
 
 # CourseView API
 class CourseViewListCreateAPIView(BaseListCreateAPIView):
     queryset = CourseView.objects.all()
     serializer_class = CourseViewSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-viewed_at', '-id')
+    # A 304 would skip the authentication check.
+    conditional_namespaces = ()
 
 # Comment API
 class CommentListCreateAPIView(BaseListCreateAPIView):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    conditional_namespaces = ('comment',)
+    cursor_ordering = ('-created_at', '-id')
 
 class CommentRetrieveUpdateDestroyAPIView(BaseRetrieveUpdateDestroyAPIView):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    conditional_namespaces = ('comment',)
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.models import OutgoingEmail
+from users.outbox import drain, release_stuck
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox; with --loop, keep polling for new and retried ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Run as a long-lived sender.")
+        parser.add_argument('--retry-failed', action='store_true', help="Also retry emails that gave up before.")
+
+    def handle(self, *args, **options):
+        release_stuck()
+        if options['retry_failed']:
+            OutgoingEmail.objects.filter(status=OutgoingEmail.FAILED).update(status=OutgoingEmail.PENDING, attempts=0)
+
+        while True:
+            claimed = drain()
+            if claimed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"Processed {claimed} email(s)."))
+            if not options['loop']:
+                break
+            time.sleep(settings.EMAIL_OUTBOX_POLL_SECONDS)
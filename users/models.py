@@ -1,6 +1,7 @@
 
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 
 
 class CustomUserManager(BaseUserManager):
@@ -33,3 +34,43 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return self.email
+
+
+class OutgoingEmail(models.Model):
+    """Transactional outbox: a row per email, written in the same
+    transaction as whatever caused it and delivered by `users.outbox`."""
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='outgoing_email_due_idx')]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} - {self.status}"
+
+    @classmethod
+    def enqueue(cls, subject, body, to, from_email=''):
+        email = cls.objects.create(subject=subject, body=body, to=list(to), from_email=from_email)
+        from .outbox import wake
+        transaction.on_commit(wake)
+        return email
@@ -0,0 +1,144 @@
+"""Background delivery of the `OutgoingEmail` outbox.
+
+Requests only insert a row; a sender thread in the same process is woken
+once the transaction commits. It sends due emails in batches over a
+single backend connection (one SMTP/TLS handshake per batch, not per
+email) and reschedules failures with exponential backoff.
+`manage.py send_outbox` drains the same queue from outside the web
+process, e.g. after a restart.
+"""
+import logging
+import smtplib
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+# The server answered and refused this one message; the connection is fine.
+REJECTED = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+_sender = None
+_sender_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def queue_verification_email(user):
+    OutgoingEmail.enqueue(
+        'Your Registration Verification Code',
+        f'Hello {user.email},\n\nYour verification code is: {user.verification_code}',
+        [user.email],
+        from_email=settings.EMAIL_HOST_USER,
+    )
+
+
+def claim_batch(batch_size):
+    with transaction.atomic():
+        due = (
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutgoingEmail.PENDING, next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at', 'pk')[:batch_size]
+        )
+        emails = list(due)
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            status=OutgoingEmail.SENDING, attempts=F('attempts') + 1, claimed_at=timezone.now(),
+        )
+    for email in emails:
+        email.attempts += 1
+    return emails
+
+
+def send_batch(batch_size=None):
+    """Send one batch of due emails; return how many were claimed."""
+    emails = claim_batch(batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0
+
+    sent, failed = [], []
+    connection = get_connection()
+    try:
+        connection.open()
+        for email in emails:
+            message = EmailMessage(email.subject, email.body, email.from_email or None, email.to, connection=connection)
+            try:
+                message.send()
+            except Exception as e:
+                failed.append((email, e))
+                if not isinstance(e, REJECTED):
+                    # The server may have dropped us; start the rest afresh.
+                    connection.close()
+                    connection.open()
+            else:
+                sent.append(email.pk)
+    except Exception as e:
+        # Could not (re)connect: everything not yet tried waits for a retry.
+        tried = set(sent) | {email.pk for email, _ in failed}
+        failed.extend((email, e) for email in emails if email.pk not in tried)
+    finally:
+        connection.close()
+
+    if sent:
+        OutgoingEmail.objects.filter(pk__in=sent).update(status=OutgoingEmail.SENT, sent_at=timezone.now(), error='')
+    for email, error in failed:
+        retry(email, error)
+    return len(emails)
+
+
+def retry(email, error):
+    logger.warning("Email %s to %s failed (attempt %s): %s", email.pk, email.to, email.attempts, error)
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = OutgoingEmail.FAILED
+    else:
+        email.status = OutgoingEmail.PENDING
+        delay = settings.EMAIL_OUTBOX_RETRY_SECONDS * 2 ** (email.attempts - 1)
+        email.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    email.error = str(error)
+    email.save(update_fields=['status', 'next_attempt_at', 'error'])
+
+
+def release_stuck():
+    """Return emails left "sending" by a sender that died to the queue."""
+    stuck_before = timezone.now() - timedelta(seconds=settings.EMAIL_OUTBOX_STUCK_SECONDS)
+    return OutgoingEmail.objects.filter(status=OutgoingEmail.SENDING, claimed_at__lt=stuck_before).update(
+        status=OutgoingEmail.PENDING,
+    )
+
+
+def drain():
+    total = 0
+    while True:
+        claimed = send_batch()
+        total += claimed
+        if claimed < settings.EMAIL_OUTBOX_BATCH_SIZE:
+            return total
+
+
+def wake():
+    """Nudge this process's sender thread, starting it on first use."""
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = threading.Thread(target=_run_sender, name='email-outbox', daemon=True)
+            _sender.start()
+    _wakeup.set()
+
+
+def _run_sender():
+    while True:
+        # Also wakes up on its own for retries whose backoff has passed.
+        _wakeup.wait(settings.EMAIL_OUTBOX_POLL_SECONDS)
+        _wakeup.clear()
+        close_old_connections()
+        try:
+            drain()
+        except Exception:
+            logger.exception("Email outbox sender crashed")
+        finally:
+            close_old_connections()
@@ -22,6 +22,7 @@ class RegisterSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         password = validated_data.pop('password')
+        validated_data.pop('password2')
         user = CustomUser(**validated_data)
         user.set_password(password)
         user.is_active = False 
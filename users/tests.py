@@ -1,3 +1,146 @@
-from django.test import TestCase
+import smtplib
 
-# Create your tests here.
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from course.testing import FAST_HASHERS, TEST_CACHES, QueryBudgetMixin
+from users import outbox
+from users.models import CustomUser, OutgoingEmail
+
+PASSWORD = 'Parol-12345'
+
+USERS_CASES = [
+    ('users:login_page', 0, None, 'get', 'login_page_url', None, 200),
+    ('users:login_page', 9, None, 'post', 'login_page_url', 'credentials', 302),
+    ('users:logout_page', 4, 'student', 'get', 'logout_page_url', None, 302),
+    ('users:register_page', 0, None, 'get', 'register_page_url', None, 200),
+    ('users:register_page', 6, None, 'post', 'register_page_url', 'registration_form', 302),
+    ('users:email_page', 0, None, 'get', 'email_page_url', None, 200),
+    ('users:verify_email', 10, None, 'post', 'verify_email_url', {'verification_code': '111111'}, 302),
+    ('users:register', 5, None, 'post', 'register_api_url', 'registration', 201),
+    ('users:login', 9, None, 'post', 'login_api_url', 'credentials', 200),
+    ('users:verify-email', 3, None, 'post', 'verify_email_api_url', {'verification_code': '222222'}, 200),
+    ('users:logout', 2, 'student', 'post', 'logout_api_url', None, 200),
+]
+
+
+@override_settings(CACHES=TEST_CACHES, PASSWORD_HASHERS=FAST_HASHERS, PERF_INSTRUMENTATION=False)
+class UserViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    cases = USERS_CASES
+    urlconf = 'users.urls'
+    namespace = 'users'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = CustomUser.objects.create_user(email='talaba@example.com', password=PASSWORD)
+        CustomUser.objects.create_user(email='kutilmoqda1@example.com', is_active=False, verification_code='111111')
+        CustomUser.objects.create_user(email='kutilmoqda2@example.com', is_active=False, verification_code='222222')
+
+    # URLs
+    def login_page_url(self):
+        return reverse('users:login_page')
+
+    def logout_page_url(self):
+        return reverse('users:logout_page')
+
+    def register_page_url(self):
+        return reverse('users:register_page')
+
+    def email_page_url(self):
+        return reverse('users:email_page')
+
+    def verify_email_url(self):
+        return reverse('users:verify_email')
+
+    def register_api_url(self):
+        return reverse('users:register')
+
+    def login_api_url(self):
+        return reverse('users:login')
+
+    def verify_email_api_url(self):
+        return reverse('users:verify-email')
+
+    def logout_api_url(self):
+        return reverse('users:logout')
+
+    # Request bodies
+    def credentials(self):
+        return {'email': self.student.email, 'password': PASSWORD}
+
+    def registration_form(self):
+        return {'email': 'yangi@example.com', 'password1': PASSWORD, 'password2': PASSWORD}
+
+    def registration(self):
+        return {'email': 'yangi-api@example.com', 'password': PASSWORD, 'password2': PASSWORD}
+
+
+class CountingBackend(locmem.EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return super().open()
+
+
+class FlakyBackend(CountingBackend):
+    """Rejects mail to one address, delivers the rest."""
+
+    def send_messages(self, messages):
+        if any('rad@example.com' in message.to for message in messages):
+            raise smtplib.SMTPRecipientsRefused({'rad@example.com': (550, b'No such user')})
+        return super().send_messages(messages)
+
+
+@override_settings(CACHES=TEST_CACHES, PASSWORD_HASHERS=FAST_HASHERS, PERF_INSTRUMENTATION=False)
+class OutboxTests(TestCase):
+    def setUp(self):
+        CountingBackend.opened = 0
+
+    def test_registration_queues_the_email_instead_of_sending_it(self):
+        response = self.client.post(reverse('users:register'), {
+            'email': 'navbat@example.com', 'password': PASSWORD, 'password2': PASSWORD,
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mail.outbox, [])
+
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.to, ['navbat@example.com'])
+        self.assertIn(CustomUser.objects.get(email='navbat@example.com').verification_code, email.body)
+
+    @override_settings(EMAIL_BACKEND='users.tests.CountingBackend')
+    def test_sender_delivers_a_batch_over_one_connection(self):
+        for i in range(5):
+            OutgoingEmail.enqueue("Salom", "Matn", [f'oluvchi{i}@example.com'])
+        # Claim (in a savepoint here) and one update for the whole batch.
+        with self.assertNumQueries(5):
+            self.assertEqual(outbox.send_batch(), 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.SENT).count(), 5)
+
+    @override_settings(EMAIL_BACKEND='users.tests.FlakyBackend', EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failures_back_off_then_give_up(self):
+        OutgoingEmail.enqueue("Salom", "Matn", ['rad@example.com'])
+        OutgoingEmail.enqueue("Salom", "Matn", ['yaxshi@example.com'])
+        with self.assertLogs('users.outbox', 'WARNING') as logs:
+            outbox.send_batch()
+        self.assertIn("(attempt 1)", logs.output[0])
+        self.assertEqual([message.to for message in mail.outbox], [['yaxshi@example.com']])
+
+        self.assertEqual(CountingBackend.opened, 1)  # a refusal keeps the connection
+
+        failed = OutgoingEmail.objects.get(to=['rad@example.com'])
+        self.assertEqual((failed.status, failed.attempts), (OutgoingEmail.PENDING, 1))
+        self.assertGreater(failed.next_attempt_at, timezone.now())
+        self.assertEqual(outbox.send_batch(), 0)  # not due yet
+
+        OutgoingEmail.objects.filter(pk=failed.pk).update(next_attempt_at=timezone.now())
+        with self.assertLogs('users.outbox', 'WARNING') as logs:
+            outbox.send_batch()
+        self.assertIn("(attempt 2)", logs.output[0])
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.attempts), (OutgoingEmail.FAILED, 2))
@@ -3,8 +3,7 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth import get_user_model
 from django.contrib import messages
-from django.core.mail import EmailMessage
-from django.conf import settings
+from django.db import transaction
 from django.views import View
 from django.views.generic import CreateView, TemplateView
 from rest_framework.views import APIView
@@ -14,6 +13,7 @@ from rest_framework.permissions import AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
 from users.models import CustomUser
 from .forms import CustomUserCreationForm
+from .outbox import queue_verification_email
 from .serializers import RegisterSerializer, LoginSerializer, VerifyEmailSerializer
 from .permissions import IsAuthenticated, IsActiveUser
 from django.urls import reverse_lazy
@@ -48,22 +48,12 @@ def logout_page(request):
 class RegisterAPIView(APIView):
     permission_classes = [AllowAny]
 
+    @transaction.atomic
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-
-            verification_code = user.verification_code
-            mail_subject = 'Your Registration Verification Code'
-            message = f'Hello {user.email},\n\nYour verification code is: {verification_code}'
-
-            email = EmailMessage(
-                mail_subject,
-                message,
-                settings.EMAIL_HOST_USER,
-                [user.email],
-            )
-            email.send()
+            queue_verification_email(user)
 
             return Response({'message': 'User registered successfully. Check your email for verification.'}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -76,7 +66,7 @@ class LoginAPIView(APIView):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data
-            login(request, user)
+            login(request, user, backend='django.contrib.auth.backends.ModelBackend')
 
             refresh = RefreshToken.for_user(user)
             access_token = str(refresh.access_token)
@@ -120,23 +110,13 @@ class RegisterView(CreateView):
     template_name = 'users/register.html'
     success_url = reverse_lazy('users:email_page')
 
+    @transaction.atomic
     def form_valid(self, form):
         user = form.save(commit=False)
         user.is_active = False
         user.verification_code = self.generate_verification_code()
         user.save()
-
-        verification_code = user.verification_code
-        mail_subject = 'Your Registration Verification Code'
-        message = f'Hello {user.email},\n\nYour verification code is: {verification_code}'
-
-        email = EmailMessage(
-            mail_subject,
-            message,
-            settings.EMAIL_HOST_USER,
-            [user.email],
-        )
-        email.send()
+        queue_verification_email(user)
 
         return redirect(self.success_url)
 
@@ -165,7 +145,7 @@ class VerifyEmailView(View):
             user.is_active = True
             user.verification_code = ''
             user.save()
-            login(request, user)
+            login(request, user, backend='django.contrib.auth.backends.ModelBackend')
 
             messages.success(request, "Your email has been successfully verified!")
             return redirect('course:index')